@@ -0,0 +1,139 @@
+import re
+from unidecode import unidecode
+from typing import Any, Dict, List, Optional, Tuple
+
+# Valores canônicos dos atributos e as palavras (ou pares de palavras) que
+# levam a eles. O mesmo mapeamento vale para o valor bruto do feed
+# ("Preto Metálico", "Automático CVT") e para o termo da query.
+SINONIMOS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+    "cor": {
+        "preto": ("preto", "preta", "black"),
+        "branco": ("branco", "branca", "white", "off white", "offwhite"),
+        "prata": ("prata", "prateado", "prateada", "silver"),
+        "cinza": ("cinza", "grafite", "chumbo", "gray", "grey"),
+        "azul": ("azul", "blue"),
+        "vermelho": ("vermelho", "vermelha", "red"),
+        "verde": ("verde", "green"),
+        "amarelo": ("amarelo", "amarela", "yellow"),
+        "dourado": ("dourado", "dourada", "champagne", "gold"),
+        "marrom": ("marrom", "brown"),
+        "bege": ("bege",),
+        "laranja": ("laranja", "orange"),
+        "rosa": ("rosa", "pink"),
+        "roxo": ("roxo", "roxa", "violeta", "lilas"),
+        "turquesa": ("turquesa",),
+        "vinho": ("vinho", "bordo"),
+        "bronze": ("bronze",),
+    },
+    "combustivel": {
+        "flex": ("flex", "bicombustivel", "alcool gasolina", "gasolina alcool", "etanol gasolina", "gasolina etanol"),
+        "hibrido": ("hibrido", "hibrida", "hybrid"),
+        "eletrico": ("eletrico", "eletrica", "electric"),
+        "diesel": ("diesel",),
+        "gnv": ("gnv",),
+        "gasolina": ("gasolina",),
+        "etanol": ("etanol", "alcool"),
+    },
+    "transmissao": {
+        "automatico": ("automatico", "automatica", "automatizado", "automatizada", "cvt", "tiptronic",
+                       "semi automatico", "semi automatica", "semiautomatico", "semiautomatica", "dct"),
+        "manual": ("manual", "mecanico", "mecanica"),
+    },
+    "categoria": {
+        "hatch": ("hatch", "hatchback"),
+        "sedan": ("sedan", "seda"),
+        "suv": ("suv", "utilitario esportivo", "crossover"),
+        "caminhonete": ("caminhonete", "picape", "pickup", "pick up"),
+        "utilitario": ("utilitario",),
+        "furgao": ("furgao", "van"),
+        "coupe": ("coupe", "cupe"),
+        "conversivel": ("conversivel", "cabriolet", "cabrio", "roadster"),
+        "minivan": ("minivan", "monovolume"),
+        "station wagon": ("station wagon", "perua", "wagon", "sw"),
+        "off road": ("off road", "offroad"),
+    },
+}
+
+# Como os valores canônicos aparecem para o usuário (facetas); os ausentes
+# viram "Title Case". Cada rótulo volta para o mesmo canônico em `canonicalizar`,
+# então o valor da faceta pode ser usado como filtro.
+ROTULOS_EXIBICAO: Dict[str, Dict[str, str]] = {
+    "combustivel": {
+        "flex": "Flex", "hibrido": "Híbrido", "eletrico": "Elétrico", "diesel": "Diesel",
+        "gnv": "GNV", "gasolina": "Gasolina", "etanol": "Etanol",
+    },
+    "categoria": {
+        "hatch": "Hatch", "sedan": "Sedan", "suv": "SUV", "caminhonete": "Caminhonete",
+        "utilitario": "Utilitário", "furgao": "Furgão", "coupe": "Coupé", "conversivel": "Conversível",
+        "minivan": "Minivan", "station wagon": "Station Wagon", "off road": "Off Road",
+    },
+}
+
+# Atributos com índice de bitmaps (portas é só o número de portas)
+ATRIBUTOS = ("cor", "combustivel", "transmissao", "portas", "categoria")
+
+# De onde vem cada atributo no veículo (o feed chama a transmissão de "cambio")
+CAMPO_ORIGEM = {"transmissao": "cambio"}
+
+PADRAO_PALAVRA = re.compile(r"[a-z0-9]+")
+PADRAO_PORTAS = re.compile(r"\d+")
+
+
+def _compilar(sinonimos: Dict[str, Tuple[str, ...]]) -> Dict[Tuple[str, ...], str]:
+    return {
+        tuple(PADRAO_PALAVRA.findall(unidecode(palavra).lower())): canonico
+        for canonico, palavras in sinonimos.items()
+        for palavra in palavras
+    }
+
+
+_PALAVRAS = {campo: _compilar(sinonimos) for campo, sinonimos in SINONIMOS.items()}
+
+
+def valor_do_veiculo(veiculo: Dict[str, Any], campo: str) -> Any:
+    origem = CAMPO_ORIGEM.get(campo, campo)
+    valor = veiculo.get(origem)
+    if valor is None and origem != campo:
+        valor = veiculo.get(campo)
+    return valor
+
+
+def rotulo_de_exibicao(campo: str, canonico: str) -> str:
+    return ROTULOS_EXIBICAO.get(campo, {}).get(canonico) or canonico.title()
+
+
+def canonicos_encontrados(campo: str, valor: Any) -> List[str]:
+    """Valores canônicos citados no texto, na ordem em que aparecem"""
+    palavras = PADRAO_PALAVRA.findall(unidecode(str(valor)).lower())
+    tabela = _PALAVRAS[campo]
+    encontrados: List[str] = []
+    i = 0
+    while i < len(palavras):
+        # Pares de palavras têm prioridade ("off road", "station wagon")
+        par = tuple(palavras[i:i + 2])
+        if len(par) == 2 and par in tabela:
+            canonico, i = tabela[par], i + 2
+        else:
+            canonico, i = tabela.get((palavras[i],)), i + 1
+        if canonico is not None and canonico not in encontrados:
+            encontrados.append(canonico)
+    return encontrados
+
+
+def canonicalizar(campo: str, valor: Any) -> Optional[str]:
+    """Valor canônico do atributo, ou None se o texto não cita nenhum conhecido"""
+    if valor is None or valor == "":
+        return None
+    if campo == "portas":
+        numero = PADRAO_PORTAS.search(str(valor))
+        return str(int(numero.group())) if numero else None
+
+    encontrados = canonicos_encontrados(campo, valor)
+    if campo == "combustivel":
+        # "Gasolina e Álcool" é flex; híbrido/elétrico prevalecem sobre o combustível citado junto
+        if "gasolina" in encontrados and "etanol" in encontrados:
+            encontrados.insert(0, "flex")
+        for preferido in ("hibrido", "eletrico", "flex"):
+            if preferido in encontrados:
+                return preferido
+    return encontrados[0] if encontrados else None
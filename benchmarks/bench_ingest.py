@@ -0,0 +1,102 @@
+"""Benchmark da ingestão do feed: pico de RSS e tempo total.
+
+Gera um feed sintético, serve por um servidor HTTP local e roda cada modo
+em um processo separado (o pico de RSS é do processo inteiro).
+
+Uso: python benchmarks/bench_ingest.py [quantidade_de_anuncios]
+
+O modo "xmltodict" (o caminho anterior, para comparação) precisa do pacote
+xmltodict, que não está mais no requirements.txt: `pip install xmltodict`.
+Sem ele, o modo é pulado.
+"""
+import functools, http.server, importlib.util, json, os, resource, subprocess, sys, tempfile, threading, time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from feed_sintetico import escrever_feed
+
+
+def pico_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def ingestao_streaming(url: str) -> int:
+    import xml_fetcher
+    xml_fetcher.XML_URL = url
+    return len(xml_fetcher.fetch_and_convert_xml().get("veiculos", []))
+
+
+def ingestao_xmltodict(url: str) -> int:
+    """Caminho anterior: corpo inteiro em memória + árvore completa do xmltodict"""
+    import requests, xmltodict
+    from inventory import estoque
+    from xml_fetcher import converter_veiculo
+    data_dict = xmltodict.parse(requests.get(url).content)
+    veiculos = [converter_veiculo(v) for v in data_dict["ADS"]["AD"]]
+    with open("data.json", "w", encoding="utf-8") as f:
+        json.dump({"veiculos": veiculos}, f, ensure_ascii=False, indent=2)
+    estoque.publicar(veiculos)
+    return len(veiculos)
+
+
+class HandlerSilencioso(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+MODOS = {"streaming": ingestao_streaming, "xmltodict": ingestao_xmltodict}
+
+
+def executar(modo: str, url: str, diretorio: str):
+    """Roda um modo neste processo e imprime o resultado em JSON"""
+    os.chdir(diretorio)
+    import inventory  # noqa: F401  (conta os imports fora da medição de tempo)
+    rss_inicial = pico_rss_mb()
+    inicio = time.perf_counter()
+    veiculos = MODOS[modo](url)
+    print(json.dumps({
+        "modo": modo,
+        "veiculos": veiculos,
+        "tempo_s": round(time.perf_counter() - inicio, 3),
+        "pico_rss_mb": round(pico_rss_mb(), 1),
+        "rss_apos_imports_mb": round(rss_inicial, 1),
+    }))
+
+
+def main():
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    with tempfile.TemporaryDirectory() as diretorio:
+        escrever_feed(os.path.join(diretorio, "feed.xml"), quantidade)
+        tamanho_mb = os.path.getsize(os.path.join(diretorio, "feed.xml")) / 1024 / 1024
+        print(f"feed: {quantidade} anúncios, {tamanho_mb:.1f} MB")
+
+        handler = functools.partial(HandlerSilencioso, directory=diretorio)
+        servidor = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{servidor.server_address[1]}/feed.xml"
+
+        try:
+            for modo in MODOS:
+                if modo == "xmltodict" and importlib.util.find_spec("xmltodict") is None:
+                    print(f"{modo}: pulado (pip install xmltodict)")
+                    continue
+                saida = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--executar", modo, url, diretorio],
+                    capture_output=True, text=True
+                )
+                linhas = [l for l in saida.stdout.splitlines() if l.startswith("{")]
+                if saida.returncode != 0 or not linhas:
+                    print(f"{modo}: falhou ({saida.stderr.strip().splitlines()[-1:] or saida.stdout.strip()})")
+                    continue
+                print(linhas[-1])
+        finally:
+            servidor.shutdown()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--executar":
+        executar(*sys.argv[2:5])
+    else:
+        main()
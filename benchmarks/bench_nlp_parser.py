@@ -0,0 +1,122 @@
+"""Parser por regex x parser spaCy (QUERY_PARSER=spacy): acerto por campo e latência.
+
+Uso: python benchmarks/bench_nlp_parser.py [repeticoes]
+
+O acerto é medido num corpus rotulado à mão (marca, modelo, preço, km, ano).
+A latência do spaCy é sem o cache de parse: uma query por chamada (`nlp(q)`)
+e em lotes (`nlp.pipe`), como a thread de lotes do parser faz. Sem o modelo
+SPACY_MODELO instalado, o parser usa spacy.blank("pt"), que tem o mesmo
+tokenizador.
+"""
+import os, sys, time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import VOCABULARIO_BASE, extrair_parametros_inteligente
+
+CAMPOS = ("marca", "modelo", "preco", "km", "ano")
+
+# (query, valores esperados; campo ausente = não deve ser extraído)
+CORPUS = [
+    ("hilux até 80 mil km", {"modelo": "hilux", "km": 80000}),
+    ("corolla ate 120 mil", {"modelo": "corolla", "preco": 120000}),
+    ("civic 2019 r$ 90.000", {"modelo": "civic", "ano": 2019, "preco": 90000}),
+    ("onix com 50000 km ano 2020", {"modelo": "onix", "km": 50000, "ano": 2020}),
+    ("t-cross preto automatico até 150k", {"modelo": "t-cross", "preco": 150000}),
+    ("jeep compass 2021 km 30 mil", {"marca": "Jeep", "modelo": "compass", "ano": 2021, "km": 30000}),
+    ("gol 1.0 ate 40 mil", {"modelo": "gol", "preco": 40000}),
+    ("hb20 até 60000 reais", {"modelo": "hb20", "preco": 60000}),
+    ("suv automatico ate 100 mil", {"preco": 100000}),
+    ("quero um onix plus flex ate 80 mil com menos de 50 mil km", {"modelo": "onix plus", "preco": 80000, "km": 50000}),
+    ("jeep compass branco 2021 automatico", {"marca": "Jeep", "modelo": "compass", "ano": 2021}),
+    ("caminhonete diesel ate r$ 200.000", {"preco": 200000}),
+    ("toyota corolla 2018 até 90 mil com 60 mil km", {"marca": "Toyota", "modelo": "corolla", "ano": 2018,
+                                                      "preco": 90000, "km": 60000}),
+    ("fiat strada vermelho 2019", {"marca": "Fiat", "modelo": "strada", "ano": 2019}),
+    ("hilux diesel", {"modelo": "hilux"}),
+    ("renegade máximo 95 mil", {"modelo": "renegade", "preco": 95000}),
+    ("kicks 2022 até 30000 km", {"modelo": "kicks", "ano": 2022, "km": 30000}),
+    ("honda hr-v preço até 130 mil", {"marca": "Honda", "modelo": "hrv", "preco": 130000}),
+    ("sedan prata com ar condicionado", {}),
+    ("volkswagen polo 2020 r$ 85 mil", {"marca": "Volkswagen", "modelo": "polo", "ano": 2020, "preco": 85000}),
+]
+
+
+def acertos(parse) -> dict:
+    """Fração do corpus em que cada campo saiu igual ao esperado (inclusive ausente)"""
+    certos = dict.fromkeys(CAMPOS, 0)
+    for query, esperado in CORPUS:
+        obtido = parse(query)
+        for campo in CAMPOS:
+            valor = obtido.get(campo)
+            if valor is not None and campo in ("preco", "km"):
+                valor = int(valor)
+            certos[campo] += valor == esperado.get(campo)
+    return {campo: certos[campo] / len(CORPUS) for campo in CAMPOS}
+
+
+def percentis(duracoes) -> str:
+    p50, p95, p99 = np.percentile(np.array(duracoes) * 1e6, [50, 95, 99])
+    return f"p50 {p50:8.1f} us  p95 {p95:8.1f} us  p99 {p99:8.1f} us"
+
+
+def latencias(funcao, repeticoes: int):
+    duracoes = []
+    for _ in range(repeticoes):
+        for query, _ in CORPUS:
+            inicio = time.perf_counter()
+            funcao(query)
+            duracoes.append(time.perf_counter() - inicio)
+    return duracoes
+
+
+def imprimir_acertos(nome: str, resultado: dict):
+    print(f"{nome:<7}" + "".join(f"{campo:>8} {resultado[campo]:5.0%}" for campo in CAMPOS))
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    vocabulario = VOCABULARIO_BASE
+
+    def por_regex(query):
+        return extrair_parametros_inteligente(query, vocabulario).model_dump()
+
+    por_regex(CORPUS[0][0])
+    imprimir_acertos("regex", acertos(por_regex))
+    print(f"regex   por query: {percentis(latencias(por_regex, repeticoes))}")
+
+    try:
+        import spacy  # noqa: F401
+    except ImportError:
+        print("[ERRO] spaCy não instalado; só o parser por regex foi medido.")
+        return
+    from nlp_parser import ParserSpacy, entidades_do_doc
+
+    parser = ParserSpacy()
+    parser._preparar(vocabulario)
+    nlp = parser._nlp
+
+    def por_spacy(query):
+        return entidades_do_doc(nlp(query.lower()))
+
+    imprimir_acertos("spacy", acertos(por_spacy))
+    print(f"spacy   por query: {percentis(latencias(por_spacy, repeticoes))}")
+
+    queries = [query.lower() for query, _ in CORPUS]
+    for tamanho in (8, 32, 128):
+        lote = (queries * (tamanho // len(queries) + 1))[:tamanho]
+        duracoes = []
+        for _ in range(max(1, repeticoes * len(CORPUS) // tamanho)):
+            inicio = time.perf_counter()
+            [entidades_do_doc(doc) for doc in nlp.pipe(lote, batch_size=tamanho)]
+            duracoes.append((time.perf_counter() - inicio) / tamanho)
+        print(f"spacy   lote {tamanho:>3}:  {percentis(duracoes)} (por query)")
+
+    # Caminho usado pela API: thread de lotes + cache de parse
+    parser.analisar_lote(queries, vocabulario)
+    print(f"spacy   em cache:  {percentis(latencias(lambda q: parser.analisar(q.lower(), vocabulario), repeticoes))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Microbenchmark do parser de queries: antes (original) x depois (compilado).
+
+Uso: python benchmarks/bench_parser.py [repeticoes]
+
+As diferenças listadas no fim são esperadas só para nomes compostos
+("corolla cross", "land rover", "t-cross"), que o parser original não detectava.
+"""
+import os, re, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import (
+    SearchParams, extrair_parametros_inteligente,
+    MAPEAMENTO_CATEGORIAS, MARCAS_CONHECIDAS, CORES_CONHECIDAS, COMBUSTIVEIS_CONHECIDOS
+)
+
+QUERIES = [
+    "suv automatico ate 100 mil",
+    "hilux diesel",
+    "corolla preto 2020",
+    "corolla cross hibrido branco",
+    "quero um onix plus flex ate 80 mil com menos de 50 mil km",
+    "jeep compass branco 2021 automatico",
+    "hatch manual 4 portas",
+    "volkswagen gol 1.0 motor 1.0",
+    "caminhonete diesel ate r$ 200.000",
+    "sedan prata com ar condicionado e direção elétrica",
+    "fiat strada vermelho fabricação 2019",
+    "grand cherokee preta blindada",
+    "land rover defender diesel",
+    "carro flex econômico",
+    "t-cross highline cinza",
+]
+
+
+def extrair_parametros_original(query: str) -> SearchParams:
+    """Parser anterior (regex sem compilar + varreduras por substring), usado como referência"""
+    query_lower = query.lower()
+    params = SearchParams()
+
+    # Extrair preço/valor
+    padroes_preco = [
+        r'(?:ate|até|max|maximo|máximo|teto|limite)?\s*r?\$?\s*([\d,.]+)\s*(?:mil|k|reais?|r\$)?',
+        r'preco\s*(?:ate|até|max|maximo|máximo)?\s*r?\$?\s*([\d,.]+)',
+        r'valor\s*(?:ate|até|max|maximo|máximo)?\s*r?\$?\s*([\d,.]+)'
+    ]
+
+    for padrao in padroes_preco:
+        matches = re.findall(padrao, query_lower)
+        if matches and any(word in query_lower for word in ['ate', 'até', 'max', 'maximo', 'máximo', 'teto', 'limite', 'preco', 'valor']):
+            try:
+                valor_str = matches[0].replace(',', '').replace('.', '')
+                valor = float(valor_str)
+                if 'mil' in query_lower or 'k' in query_lower:
+                    if valor < 1000:  # Se for menor que 1000, provavelmente já está em milhares
+                        valor *= 1000
+                params.preco = valor
+                params.valor_max = valor  # Adiciona também valor_max
+                break
+            except ValueError:
+                continue
+
+    # Extrair ano - APENAS se explicitamente mencionado
+    if 'ano' in query_lower or re.search(r'\b(20\d{2}|19\d{2})\b', query_lower):
+        anos = re.findall(r'\b(20\d{2}|19\d{2})\b', query_lower)
+        if anos:
+            params.ano = int(anos[0])
+
+    # Extrair ano de fabricação - APENAS se explicitamente mencionado
+    if 'fabricacao' in query_lower or 'fabricação' in query_lower:
+        anos = re.findall(r'fabricac[aã]o\s*(\d{4})', query_lower)
+        if anos:
+            params.ano_fabricacao = int(anos[0])
+
+    # Extrair km - APENAS se explicitamente mencionado
+    if 'km' in query_lower:
+        km_patterns = [
+            r'(\d+)\.?(\d*)\s*k?m?\s*km',
+            r'(\d+)\s*mil\s*km',
+            r'km\s*(\d+)',
+            r'(\d+)\s*k\s*km'
+        ]
+
+        for pattern in km_patterns:
+            matches = re.findall(pattern, query_lower)
+            if matches:
+                try:
+                    if isinstance(matches[0], tuple):
+                        km = float(matches[0][0])
+                    else:
+                        km = float(matches[0])
+                    if km < 1000 and 'mil' in query_lower:
+                        km *= 1000
+                    params.km = km
+                    params.km_max = km  # Adiciona também km_max
+                    break
+                except ValueError:
+                    continue
+
+    # Extrair cor - APENAS se explicitamente mencionada
+    cores_encontradas = []
+    for cor in CORES_CONHECIDAS:
+        if cor in query_lower:
+            cores_encontradas.append(cor)
+
+    if cores_encontradas:
+        # Pega a cor mais específica (mais longa)
+        params.cor = max(cores_encontradas, key=len)
+
+    # Extrair combustível - APENAS se explicitamente mencionado
+    for combustivel in COMBUSTIVEIS_CONHECIDOS:
+        if combustivel in query_lower:
+            params.combustivel = combustivel
+            break
+
+    # Extrair câmbio/transmissão - APENAS se explicitamente mencionado
+    cambios = ['manual', 'automatico', 'automatica', 'cvt', 'semi-automatico', 'semi-automatica', 'tiptronic']
+    for cambio in cambios:
+        if cambio in query_lower:
+            params.cambio = cambio
+            params.transmissao = cambio  # Preenche ambos os campos
+            break
+
+    # Extrair motor - APENAS se explicitamente mencionado
+    if 'motor' in query_lower:
+        motor_patterns = [
+            r'motor\s*(\d+\.?\d*)',
+            r'(\d+\.?\d*)\s*(?:litros?|l)\s*motor',
+            r'(\d+\.?\d*)\s*motor'
+        ]
+
+        for pattern in motor_patterns:
+            matches = re.findall(pattern, query_lower)
+            if matches:
+                params.motor = matches[0]
+                break
+
+    # Extrair portas - APENAS se explicitamente mencionado
+    if 'porta' in query_lower:
+        portas_patterns = [
+            r'(\d+)\s*porta',
+            r'porta\s*(\d+)'
+        ]
+
+        for pattern in portas_patterns:
+            matches = re.findall(pattern, query_lower)
+            if matches:
+                try:
+                    params.portas = int(matches[0])
+                    break
+                except ValueError:
+                    continue
+
+    # Extrair categoria - APENAS se explicitamente mencionada
+    categorias_possiveis = ['hatch', 'sedan', 'suv', 'caminhonete', 'utilitario', 'utilitário', 'furgao', 'furgão',
+                           'coupe', 'coupé', 'conversivel', 'conversível', 'minivan', 'station wagon', 'off-road']
+
+    for categoria in categorias_possiveis:
+        if categoria in query_lower:
+            # Mapear para formato padrão
+            if categoria in ['suv']:
+                params.categoria = 'SUV'
+            elif categoria in ['utilitario', 'utilitário']:
+                params.categoria = 'Utilitário'
+            elif categoria in ['furgao', 'furgão']:
+                params.categoria = 'Furgão'
+            elif categoria in ['coupe', 'coupé']:
+                params.categoria = 'Coupe'
+            elif categoria in ['conversivel', 'conversível']:
+                params.categoria = 'Conversível'
+            else:
+                params.categoria = categoria.title()
+            break
+
+    # Extrair marca - APENAS se explicitamente mencionada
+    # Busca por marcas que aparecem como palavras completas na query
+    palavras_query = query_lower.split()
+    for palavra in palavras_query:
+        palavra_limpa = re.sub(r'[^\w]', '', palavra)
+        for marca in MARCAS_CONHECIDAS:
+            if palavra_limpa == marca.lower():
+                params.marca = marca.title()
+                break
+        if params.marca:
+            break
+
+    # Extrair modelo - APENAS se explicitamente mencionado
+    # Busca por modelos que aparecem como palavras na query
+    modelos_conhecidos = list(MAPEAMENTO_CATEGORIAS.keys())
+    for palavra in palavras_query:
+        palavra_limpa = re.sub(r'[^\w]', '', palavra)
+        for modelo in modelos_conhecidos:
+            if palavra_limpa == modelo.lower():
+                params.modelo = modelo
+                break
+        if params.modelo:
+            break
+
+    # Extrair opcionais - busca por palavras relacionadas
+    opcionais_keywords = ['ar', 'arcondicionado', 'direcao', 'direção', 'eletrica', 'elétrica', 'vidro', 'eletrico', 'elétrico',
+                         'trava', 'alarme', 'airbag', 'abs', 'cd', 'mp3', 'bluetooth', 'gps', 'navegador']
+
+    opcionais_encontrados = []
+    for opcional in opcionais_keywords:
+        if opcional in query_lower:
+            opcionais_encontrados.append(opcional)
+
+    if opcionais_encontrados:
+        params.opcionais = ', '.join(opcionais_encontrados)
+
+    return params
+
+
+def medir(funcao, repeticoes: int) -> float:
+    """Latência média por query em microssegundos"""
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for query in QUERIES:
+            funcao(query)
+    return (time.perf_counter() - inicio) / (repeticoes * len(QUERIES)) * 1e6
+
+
+def main():
+    repeticoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    # Aquecimento (cache interno do `re` para o parser original)
+    for query in QUERIES:
+        extrair_parametros_original(query)
+        extrair_parametros_inteligente(query)
+
+    antes = medir(extrair_parametros_original, repeticoes)
+    depois = medir(extrair_parametros_inteligente, repeticoes)
+    print(f"original:  {antes:8.1f} us/query")
+    print(f"compilado: {depois:8.1f} us/query ({antes / depois:.2f}x)")
+
+    for query in QUERIES:
+        original = extrair_parametros_original(query).dict(exclude_none=True)
+        compilado = extrair_parametros_inteligente(query).dict(exclude_none=True)
+        if original != compilado:
+            print(f"[DIFERENTE] {query!r}: {original} -> {compilado}")
+
+
+if __name__ == "__main__":
+    main()
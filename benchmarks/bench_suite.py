@@ -0,0 +1,247 @@
+"""Suíte de benchmarks do /api/search-smart em estoques de tamanhos diferentes.
+
+Para cada tamanho (padrão 1k, 10k e 100k anúncios) gera um feed sintético
+ADS/AD e mede:
+  ingestao   fetch_and_convert_xml em um processo separado (tempo e pico de RSS)
+  parser     extrair_parametros_inteligente por query (percentis em µs)
+  filtro     filtrar_linhas (só índice) e filtrar_veiculos_inteligente (com os dicts)
+  http       POST /api/search-smart por um cliente ASGI em processo (req/s e
+             percentis), com e sem o cache de buscas
+
+O resultado vai para um JSON (commit, máquina e números) para comparar
+execuções entre commits com --comparar.
+
+Uso:
+  python benchmarks/bench_suite.py [--tamanhos 1000,10000,100000] [--saida bench.json]
+                                   [--repeticoes 5] [--requisicoes 2000] [--concorrencia N]
+                                   [--comparar anterior.json]
+"""
+import argparse, asyncio, functools, http.server, json, os, platform, subprocess, sys, tempfile, threading, time
+from datetime import datetime
+from typing import Optional
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from bench_ingest import HandlerSilencioso
+from consultas import CONSULTAS
+from feed_sintetico import escrever_feed
+
+
+def percentis(amostras_s) -> dict:
+    """Resumo em microssegundos"""
+    amostras = np.asarray(amostras_s) * 1e6
+    return {
+        "media_us": round(float(amostras.mean()), 1),
+        "p50_us": round(float(np.percentile(amostras, 50)), 1),
+        "p90_us": round(float(np.percentile(amostras, 90)), 1),
+        "p99_us": round(float(np.percentile(amostras, 99)), 1),
+        "max_us": round(float(amostras.max()), 1),
+    }
+
+
+def cronometrar(funcao, argumentos, repeticoes: int) -> dict:
+    amostras = []
+    for _ in range(repeticoes):
+        for args in argumentos:
+            inicio = time.perf_counter()
+            funcao(*args)
+            amostras.append(time.perf_counter() - inicio)
+    return percentis(amostras)
+
+
+def medir_ingestao(diretorio: str) -> dict:
+    """fetch_and_convert_xml em um processo novo (o pico de RSS é só dele)"""
+    handler = functools.partial(HandlerSilencioso, directory=diretorio)
+    servidor = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}/feed.xml"
+    try:
+        saida = subprocess.run(
+            [sys.executable, os.path.join(RAIZ, "benchmarks", "bench_ingest.py"), "--executar", "streaming", url, diretorio],
+            capture_output=True, text=True
+        )
+    finally:
+        servidor.shutdown()
+    linhas = [l for l in saida.stdout.splitlines() if l.startswith("{")]
+    if saida.returncode != 0 or not linhas:
+        return {"erro": (saida.stderr.strip().splitlines() or [saida.stdout.strip()])[-1]}
+    resultado = json.loads(linhas[-1])
+    resultado.pop("modo", None)
+    return resultado
+
+
+def carregar_estoque(caminho_feed: str):
+    """Publica o feed no estoque deste processo (veículos em memória, como no líder)"""
+    from inventory import estoque
+    from xml_fetcher import CHUNK_SIZE, converter_veiculo, iterar_anuncios
+
+    def blocos():
+        with open(caminho_feed, "rb") as f:
+            while True:
+                bloco = f.read(CHUNK_SIZE)
+                if not bloco:
+                    return
+                yield bloco
+
+    return estoque.publicar([converter_veiculo(v) for v in iterar_anuncios(blocos())], datetime.now().isoformat())
+
+
+async def carga_http(app, requisicoes: int, concorrencia: int) -> dict:
+    import httpx
+
+    latencias = []
+    status: dict = {}
+    proxima = iter(range(requisicoes))
+
+    async def cliente(http_client):
+        for i in proxima:
+            corpo = {"query": CONSULTAS[i % len(CONSULTAS)], "limit": 20}
+            inicio = time.perf_counter()
+            resposta = await http_client.post("/api/search-smart", json=corpo)
+            latencias.append(time.perf_counter() - inicio)
+            status[resposta.status_code] = status.get(resposta.status_code, 0) + 1
+
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://bench") as http_client:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente(http_client) for _ in range(concorrencia)))
+        duracao = time.perf_counter() - inicio
+
+    return dict(
+        requisicoes=requisicoes,
+        concorrencia=concorrencia,
+        status={str(codigo): n for codigo, n in sorted(status.items())},
+        req_por_s=round(requisicoes / duracao, 1),
+        **percentis(latencias),
+    )
+
+
+def medir_http(requisicoes: int, concorrencia: Optional[int]) -> dict:
+    """Sem --concorrencia, usa SEARCH_MAX_INFLIGHT (acima disso o servidor responde 503)"""
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        return {"erro": "httpx não instalado"}
+
+    import main
+    from query_cache import QueryCache
+
+    concorrencia = concorrencia or main.SEARCH_MAX_INFLIGHT
+    original = main.cache_buscas
+    resultado = {}
+    try:
+        main.cache_buscas = QueryCache()
+        resultado["com_cache"] = asyncio.run(carga_http(main.app, requisicoes, concorrencia))
+        resultado["com_cache"]["cache"] = main.cache_buscas.estatisticas()
+        # max_bytes=1 recusa toda entrada: cada requisição faz parse + filtro
+        main.cache_buscas = QueryCache(max_bytes=1)
+        resultado["sem_cache"] = asyncio.run(carga_http(main.app, requisicoes, concorrencia))
+    finally:
+        main.cache_buscas = original
+    return resultado
+
+
+def medir_tamanho(quantidade: int, args) -> dict:
+    import main
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        caminho_feed = os.path.join(diretorio, "feed.xml")
+        escrever_feed(caminho_feed, quantidade)
+        resultado = {
+            "anuncios": quantidade,
+            "feed_mb": round(os.path.getsize(caminho_feed) / 1024 / 1024, 2),
+            "ingestao": medir_ingestao(diretorio),
+        }
+        snapshot = carregar_estoque(caminho_feed)
+
+    vocabulario = snapshot.vocabulario
+    parametros = [main.extrair_parametros_inteligente(q, vocabulario) for q in CONSULTAS]
+
+    resultado["parser"] = cronometrar(
+        main.extrair_parametros_inteligente, [(q, vocabulario) for q in CONSULTAS], args.repeticoes * 20
+    )
+    # Primeira passada só aquece as pontuações fuzzy memorizadas no índice
+    cronometrar(main.filtrar_linhas, [(p, snapshot.indice) for p in parametros], 1)
+    resultado["filtro_linhas"] = cronometrar(
+        main.filtrar_linhas, [(p, snapshot.indice) for p in parametros], args.repeticoes
+    )
+    resultado["filtro_veiculos"] = cronometrar(
+        main.filtrar_veiculos_inteligente, [(snapshot.veiculos, p, snapshot.indice) for p in parametros],
+        max(1, args.repeticoes // 2)
+    )
+    resultado["http"] = medir_http(args.requisicoes, args.concorrencia)
+    return resultado
+
+
+def commit_atual() -> str:
+    try:
+        return subprocess.run(
+            ["git", "-C", RAIZ, "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+def comparar(atual: dict, anterior: dict):
+    """Razão atual/anterior das métricas principais (< 1 é melhor para latência)"""
+    metricas = [
+        ("parser", "p50_us"), ("filtro_linhas", "p50_us"), ("filtro_linhas", "p99_us"),
+        ("filtro_veiculos", "p50_us"), ("ingestao", "tempo_s"), ("ingestao", "pico_rss_mb"),
+    ]
+    print(f"\ncomparado com {anterior.get('commit')} ({anterior.get('data')}):")
+    for tamanho, dados in atual["tamanhos"].items():
+        antes = anterior.get("tamanhos", {}).get(tamanho)
+        if not antes:
+            continue
+        for secao, chave in metricas:
+            novo, velho = dados.get(secao, {}).get(chave), antes.get(secao, {}).get(chave)
+            if novo is not None and velho:
+                print(f"  {tamanho:>7} {secao}.{chave}: {velho} -> {novo} ({novo / velho:.2f}x)")
+        for modo in ("com_cache", "sem_cache"):
+            novo = dados.get("http", {}).get(modo, {}).get("req_por_s")
+            velho = antes.get("http", {}).get(modo, {}).get("req_por_s")
+            if novo is not None and velho:
+                print(f"  {tamanho:>7} http.{modo}.req_por_s: {velho} -> {novo} ({novo / velho:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanhos", default="1000,10000,100000")
+    parser.add_argument("--saida", default="bench.json")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--requisicoes", type=int, default=2000)
+    parser.add_argument("--concorrencia", type=int)
+    parser.add_argument("--comparar")
+    args = parser.parse_args()
+
+    resultado = {
+        "commit": commit_atual(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "maquina": f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+        "consultas": len(CONSULTAS),
+        "tamanhos": {},
+    }
+    for quantidade in (int(t) for t in args.tamanhos.split(",")):
+        print(f"[..] {quantidade} anúncios")
+        resultado["tamanhos"][str(quantidade)] = dados = medir_tamanho(quantidade, args)
+        http_dados = dados["http"].get("sem_cache", {})
+        print(f"[OK] {quantidade} anúncios: ingestão {dados['ingestao'].get('tempo_s')}s, "
+              f"filtro p50 {dados['filtro_linhas']['p50_us']}us, "
+              f"http sem cache {http_dados.get('req_por_s')} req/s")
+
+    with open(args.saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"[OK] Resultados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultado, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Corpus de queries em português no estilo do que chega ao /api/search-smart."""
+
+CONSULTAS = [
+    # Modelo / marca
+    "hilux diesel",
+    "corolla preto 2020",
+    "corolla cross hibrido branco",
+    "toyota sw4 diesel 2019",
+    "jeep compass branco 2021 automatico",
+    "fiat strada vermelho fabricação 2019",
+    "volkswagen gol 1.0 motor 1.0",
+    "honda civic automatico prata",
+    "hyundai hb20 flex manual",
+    "chevrolet onix plus 2022",
+    "renault kwid até 45 mil",
+    "t-cross highline cinza",
+    "nivus automatico ate 120 mil",
+    "tracker turbo 2021",
+    "s10 diesel 4x4",
+    "amarok v6 preta",
+    "creta automatico ate 110 mil",
+    "hr-v branco 2019",
+    # Preço em "mil", "k" e reais
+    "carro ate 50 mil",
+    "suv automatico ate 100 mil",
+    "hatch até 60 mil",
+    "sedan ate 90k",
+    "caminhonete diesel ate r$ 200.000",
+    "quero um onix plus flex ate 80 mil com menos de 50 mil km",
+    "carro barato valor ate 40 mil",
+    "preco maximo 150 mil suv",
+    # Km e ano
+    "corolla com menos de 30 mil km",
+    "hilux 2018 km 80000",
+    "hb20 2020 100 mil km",
+    "civic 2017",
+    "renegade 2022 flex",
+    "polo 2023 automatico",
+    # Atributos
+    "sedan prata com ar condicionado e direção elétrica",
+    "hatch manual 4 portas",
+    "suv preto automatico",
+    "carro flex econômico",
+    "caminhonete branca diesel",
+    "minivan 7 lugares",
+    "carro eletrico",
+    "hibrido automatico",
+    "picape cabine dupla diesel",
+    "sedan cinza grafite",
+    "hatch vermelho 2 portas",
+    "suv diesel automatico ate 250 mil",
+    # Genéricas / ruído
+    "carro",
+    "quero um carro bom",
+    "seminovo para família",
+    "grand cherokee preta blindada",
+    "land rover defender diesel",
+    "primeiro carro barato manual",
+]
@@ -0,0 +1,67 @@
+"""Gerador de feeds XML sintéticos no formato ADS/AD usado pelo xml_fetcher."""
+import random
+from xml.sax.saxutils import escape
+
+MODELOS = {
+    "Toyota": ["Corolla", "Corolla Cross", "Hilux", "Etios", "Yaris", "SW4"],
+    "Chevrolet": ["Onix", "Onix Plus", "Tracker", "S10", "Cruze", "Spin"],
+    "Volkswagen": ["Gol", "Polo", "T-Cross", "Virtus", "Nivus", "Amarok"],
+    "Fiat": ["Strada", "Argo", "Toro", "Mobi", "Cronos", "Pulse"],
+    "Jeep": ["Compass", "Renegade", "Commander"],
+    "Hyundai": ["HB20", "HB20S", "Creta", "Tucson"],
+    "Honda": ["Civic", "City", "HR-V", "Fit"],
+    "Renault": ["Kwid", "Sandero", "Duster", "Captur"],
+}
+CATEGORIAS = {
+    "Corolla": "Sedan", "Corolla Cross": "SUV", "Hilux": "Caminhonete", "Etios": "Hatch", "Yaris": "Hatch",
+    "SW4": "SUV", "Onix": "Hatch", "Onix Plus": "Sedan", "Tracker": "SUV", "S10": "Caminhonete", "Cruze": "Sedan",
+    "Spin": "Minivan", "Gol": "Hatch", "Polo": "Hatch", "T-Cross": "SUV", "Virtus": "Sedan", "Nivus": "SUV",
+    "Amarok": "Caminhonete", "Strada": "Utilitário", "Argo": "Hatch", "Toro": "Caminhonete", "Mobi": "Hatch",
+    "Cronos": "Sedan", "Pulse": "SUV", "Compass": "SUV", "Renegade": "SUV", "Commander": "SUV", "HB20": "Hatch",
+    "HB20S": "Sedan", "Creta": "SUV", "Tucson": "SUV", "Civic": "Sedan", "City": "Sedan", "HR-V": "SUV",
+    "Fit": "Hatch", "Kwid": "Hatch", "Sandero": "Hatch", "Duster": "SUV", "Captur": "SUV",
+}
+CORES = ["Preto", "Branco", "Prata", "Cinza", "Vermelho", "Azul", "Preto Metálico", "Branco Perolizado"]
+COMBUSTIVEIS = ["Flex", "Gasolina", "Diesel", "Híbrido", "Elétrico"]
+CAMBIOS = ["Manual", "Automático", "Automático CVT", "Automatizado"]
+VERSOES = ["1.0", "1.0 Turbo", "1.6", "2.0 XEI", "LT", "Highline", "Limited", "Sport"]
+OPCIONAIS = ["Ar condicionado", "Direção elétrica", "Vidros elétricos", "Airbag", "ABS", "Bluetooth", "Multimídia"]
+
+
+def gerar_anuncio(i: int, rng: random.Random) -> str:
+    marca = rng.choice(list(MODELOS))
+    modelo = rng.choice(MODELOS[marca])
+    ano = rng.randint(2008, 2025)
+    campos = {
+        "ID": str(100000 + i),
+        "TITLE": f"{marca} {modelo} {rng.choice(VERSOES)} {ano}",
+        "MAKE": marca,
+        "MODEL": modelo,
+        "YEAR": str(ano),
+        "FABRIC_YEAR": str(ano - rng.randint(0, 1)),
+        "MILEAGE": str(rng.randint(0, 250) * 1000),
+        "COLOR": rng.choice(CORES),
+        "FUEL": rng.choice(COMBUSTIVEIS),
+        "GEAR": rng.choice(CAMBIOS),
+        "MOTOR": rng.choice(["1.0", "1.3", "1.6", "2.0", "2.8"]),
+        "DOORS": rng.choice(["2", "4"]),
+        "BODY_TYPE": CATEGORIAS[modelo],
+        "PRICE": f"{rng.randint(25, 350) * 1000}.00",
+        "ACCESSORIES": ", ".join(rng.sample(OPCIONAIS, rng.randint(1, 5))),
+    }
+    linhas = [f"<{tag}>{escape(valor)}</{tag}>" for tag, valor in campos.items()]
+    imagens = "".join(
+        f"<IMAGE_URL>https://fotos.exemplo.com.br/{campos['ID']}/{n}.jpg</IMAGE_URL>"
+        for n in range(rng.randint(1, 12))
+    )
+    return "<AD>" + "".join(linhas) + f"<IMAGES>{imagens}</IMAGES></AD>\n"
+
+
+def escrever_feed(caminho: str, quantidade: int, semente: int = 42):
+    """Grava um feed com `quantidade` anúncios (mesma semente -> mesmo arquivo)"""
+    rng = random.Random(semente)
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<ADS>\n')
+        for i in range(quantidade):
+            f.write(gerar_anuncio(i, rng))
+        f.write("</ADS>\n")
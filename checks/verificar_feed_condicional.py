@@ -0,0 +1,114 @@
+"""Verificação do GET condicional do feed (ETag/Last-Modified) contra um servidor local.
+
+Uso: python checks/verificar_feed_condicional.py
+
+Roteiro: a primeira leitura publica e grava o snapshot; a segunda recebe
+304; o feed muda e a gravação do snapshot falha; a leitura seguinte tem que
+baixar o feed de novo (e não receber 304) e gravar o snapshot e o arquivo de
+versão. Roda com XML_URL e de novo com XML_URLS (um feed só). Termina com
+código 1 se algum passo não sair como esperado.
+"""
+import hashlib, http.server, os, random, sys, tempfile, threading
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+from feed_sintetico import gerar_anuncio
+
+
+def montar_feed(quantidade: int) -> bytes:
+    rng = random.Random(42)
+    anuncios = "".join(gerar_anuncio(i, rng) for i in range(quantidade))
+    return f'<?xml version="1.0" encoding="UTF-8"?>\n<ADS>\n{anuncios}</ADS>\n'.encode("utf-8")
+
+
+class FeedStub(http.server.BaseHTTPRequestHandler):
+    """Serve `corpo` com ETag e responde 304 ao If-None-Match igual; conta os status por caminho"""
+
+    corpo = b""
+    status = []
+
+    def do_GET(self):
+        etag = '"' + hashlib.md5(self.corpo).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            FeedStub.status.append(304)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        FeedStub.status.append(200)
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", "Mon, 01 Jan 2024 00:00:00 GMT")
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(self.corpo)))
+        self.end_headers()
+        self.wfile.write(self.corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+def verificar(condicao: bool, descricao: str) -> bool:
+    print(f"[OK] {descricao}" if condicao else f"[ERRO] {descricao}")
+    return condicao
+
+
+def roteiro(modo: str, url: str, diretorio: str) -> bool:
+    import xml_fetcher
+    from inventory import estoque
+    from snapshot_file import carregar_snapshot, ler_versao
+
+    print(f"--- {modo}")
+    caminho = os.path.join(diretorio, modo + ".snap")
+    xml_fetcher.SNAPSHOT_FILE = caminho
+    xml_fetcher.XML_URL, xml_fetcher.XML_URLS = (url, None) if modo == "XML_URL" else (None, f"loja={url}")
+    ok = True
+
+    FeedStub.corpo = montar_feed(50)
+    xml_fetcher.fetch_and_convert_xml()
+    ok &= verificar(FeedStub.status[-1] == 200 and len(carregar_snapshot(caminho)[0]) == 50,
+                    "primeira leitura: 200 e snapshot gravado com 50 veículos")
+
+    xml_fetcher.fetch_and_convert_xml()
+    ok &= verificar(FeedStub.status[-1] == 304, "feed sem mudança: 304")
+
+    # Feed muda e a gravação falha
+    FeedStub.corpo = montar_feed(60)
+    versao_antes = ler_versao(caminho)
+    salvar = estoque.salvar_snapshot
+
+    def falhar(*args, **kwargs):
+        raise OSError("disco cheio (simulado)")
+
+    estoque.salvar_snapshot = falhar
+    try:
+        xml_fetcher.fetch_and_convert_xml()
+    finally:
+        estoque.salvar_snapshot = salvar
+    ok &= verificar(FeedStub.status[-1] == 200 and ler_versao(caminho) == versao_antes,
+                    "gravação com falha: arquivo de versão não mudou")
+
+    xml_fetcher.fetch_and_convert_xml()
+    ok &= verificar(FeedStub.status[-1] == 200, "depois da falha: feed baixado de novo (sem 304)")
+    ok &= verificar(len(carregar_snapshot(caminho)[0]) == 60 and ler_versao(caminho) != versao_antes,
+                    "depois da falha: snapshot e versão gravados com 60 veículos")
+
+    xml_fetcher.fetch_and_convert_xml()
+    ok &= verificar(FeedStub.status[-1] == 304, "leitura seguinte: 304")
+    return ok
+
+
+def main() -> int:
+    servidor = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FeedStub)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_address[1]}/feed.xml"
+    with tempfile.TemporaryDirectory() as diretorio:
+        ok = all([roteiro("XML_URL", url, diretorio), roteiro("XML_URLS", url, diretorio)])
+    servidor.shutdown()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
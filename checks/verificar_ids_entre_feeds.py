@@ -0,0 +1,73 @@
+"""Verificação de /api/similar/{id} com dois feeds que usam o mesmo id.
+
+Uso: python checks/verificar_ids_entre_feeds.py
+
+O id "100" é uma Hilux cara na loja_a e um Uno barato na loja_b. Com
+origem, a referência tem que ser o veículo daquele feed (o mais parecido é
+o "gêmeo" dele no mesmo feed); sem origem, a API não pode escolher um dos
+dois por conta própria. Termina com código 1 se algum passo não sair como
+esperado.
+"""
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def veiculo(id_veiculo: str, origem: str, marca: str, modelo: str, categoria: str, ano: int, km: int, preco: float):
+    return {
+        "id": id_veiculo, "origem": origem, "titulo": f"{marca} {modelo}", "marca": marca, "modelo": modelo,
+        "categoria": categoria, "ano": str(ano), "km": str(km), "preco": preco,
+        "combustivel": "Diesel" if modelo == "Hilux" else "Flex", "cambio": "Automático" if modelo == "Hilux" else "Manual",
+    }
+
+
+VEICULOS = [
+    veiculo("100", "loja_a", "Toyota", "Hilux", "Caminhonete", 2022, 30000, 250000.0),
+    veiculo("1", "loja_a", "Toyota", "Hilux", "Caminhonete", 2021, 35000, 240000.0),
+    veiculo("2", "loja_a", "Fiat", "Uno", "Hatch", 2012, 120000, 25000.0),
+    veiculo("100", "loja_b", "Fiat", "Uno", "Hatch", 2013, 110000, 28000.0),
+    veiculo("3", "loja_b", "Fiat", "Uno", "Hatch", 2012, 115000, 26000.0),
+    veiculo("4", "loja_b", "Toyota", "Hilux", "Caminhonete", 2022, 28000, 245000.0),
+    veiculo("5", "loja_c", "Fiat", "Uno", "Hatch", 2014, 90000, 30000.0),
+]
+
+
+def verificar(condicao: bool, descricao: str) -> bool:
+    print(f"[OK] {descricao}" if condicao else f"[ERRO] {descricao}")
+    return condicao
+
+
+def main() -> int:
+    from fastapi.testclient import TestClient
+    import main as api
+    from inventory import estoque
+
+    estoque.publicar(VEICULOS, "2024-01-01T00:00:00")
+    cliente = TestClient(api.app)
+    ok = True
+
+    for origem, gemeo in (("loja_a", "1"), ("loja_b", "3")):
+        resposta = cliente.get("/api/similar/100", params={"origem": origem, "k": 2})
+        ids = [r["id"] for r in resposta.json().get("resultados", [])]
+        origens = {r["origem"] for r in resposta.json().get("resultados", [])}
+        ok &= verificar(resposta.status_code == 200 and ids[:1] == [gemeo] and origens == {origem},
+                        f"origem={origem}: referência é o 100 da {origem} (mais parecido: {ids[:1]})")
+
+    resposta = cliente.get("/api/similar/100")
+    ok &= verificar(resposta.status_code == 409 and resposta.json().get("origens") == ["loja_a", "loja_b"],
+                    f"sem origem: 409 com as origens do id ({resposta.status_code})")
+
+    resposta = cliente.get("/api/similar/100", params={"origem": "loja_c"})
+    ok &= verificar(resposta.status_code == 404, f"origem sem o id: 404 ({resposta.status_code})")
+
+    resposta = cliente.get("/api/similar/5")
+    ok &= verificar(resposta.status_code == 200, f"id de um feed só dispensa origem ({resposta.status_code})")
+
+    resposta = cliente.post("/api/search-smart", json={"query": "uno", "origem": 1})
+    ok &= verificar(resposta.status_code == 400 and resposta.json().get("error") == "origem inválida",
+                    "search-smart com origem que não é texto: 400 origem inválida")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import os
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence
+from attributes import rotulo_de_exibicao
+from search_index import SearchIndex
+
+# Limites (R$) das faixas de preço das facetas
+FAIXAS_PRECO = (30000, 50000, 80000, 120000, 200000, 300000)
+
+# Máximo de valores devolvidos por faceta (marca, modelo, ...)
+FACETS_MAX_VALORES = int(os.getenv("FACETS_MAX_VALORES", "20"))
+
+
+def _mil(valor: float) -> str:
+    return f"{valor / 1000:g} mil"
+
+
+def _faixas_preco() -> List[Dict[str, Any]]:
+    limites = (None,) + FAIXAS_PRECO + (None,)
+    faixas = []
+    for minimo, maximo in zip(limites, limites[1:]):
+        if minimo is None:
+            valor = f"até {_mil(maximo)}"
+        elif maximo is None:
+            valor = f"acima de {_mil(minimo)}"
+        else:
+            valor = f"{_mil(minimo)} a {_mil(maximo)}"
+        faixas.append({"valor": valor, "min": minimo, "max": maximo})
+    return faixas
+
+
+class FacetIndex:
+    """Contagens por marca, modelo, categoria, combustível, ano, faixa de preço e origem (feed).
+
+    Cada faceta é um código por linha (-1 sem valor) montado uma vez por
+    snapshot; contar um resultado de busca é um `bincount` sobre as linhas
+    dele, e as contagens do estoque inteiro já ficam prontas.
+    """
+
+    def __init__(self, veiculos: Sequence[Dict[str, Any]], indice: SearchIndex):
+        self.codigos: Dict[str, np.ndarray] = {}
+        self.rotulos: Dict[str, List[Any]] = {}
+
+        # Marca, modelo e origem: o valor como veio no feed (da primeira linha de cada valor normalizado)
+        for campo in ("marca", "modelo", "origem"):
+            ordem, inicio = indice.linhas_por_codigo[campo]
+            rotulos = []
+            for codigo in range(len(indice.distintos[campo])):
+                original = None
+                if inicio[codigo] < inicio[codigo + 1]:
+                    original = veiculos[int(ordem[inicio[codigo]])].get(campo)
+                if original is not None:
+                    original = str(original).strip() or None
+                rotulos.append(original)
+            codigos = np.asarray(indice.codigos[campo], dtype=np.int32).copy()
+            # Linhas sem valor não entram na contagem
+            sem_valor = np.array([rotulo is None for rotulo in rotulos], dtype=bool)
+            codigos[sem_valor[codigos]] = -1
+            self.codigos[campo], self.rotulos[campo] = codigos, rotulos
+
+        # Categoria e combustível: valores canônicos dos bitmaps de atributos, com o rótulo de exibição
+        # ("suv" vira "SUV"), já que o feed escreve o mesmo valor de vários jeitos
+        for campo in ("categoria", "combustivel"):
+            self.codigos[campo] = indice.codigos_atributo[campo]
+            self.rotulos[campo] = [rotulo_de_exibicao(campo, canonico) for canonico in indice.canonicos[campo]]
+
+        anos = indice.colunas["ano"]
+        validos = ~np.isnan(anos)
+        distintos = np.unique(anos[validos])
+        codigos = np.full(indice.total, -1, dtype=np.int32)
+        codigos[validos] = np.searchsorted(distintos, anos[validos])
+        self.codigos["ano"], self.rotulos["ano"] = codigos, [int(ano) for ano in distintos]
+
+        precos = indice.colunas["preco"]
+        validos = ~np.isnan(precos)
+        codigos = np.full(indice.total, -1, dtype=np.int32)
+        codigos[validos] = np.searchsorted(FAIXAS_PRECO, precos[validos], side="right")
+        self.codigos["preco"], self.rotulos["preco"] = codigos, _faixas_preco()
+
+        self._totais = {campo: self._contagens(campo, None) for campo in self.codigos}
+
+    def _contagens(self, campo: str, linhas: Optional[np.ndarray]) -> np.ndarray:
+        codigos = self.codigos[campo]
+        if linhas is not None:
+            codigos = codigos[linhas]
+        return np.bincount(codigos.astype(np.int64) + 1, minlength=len(self.rotulos[campo]) + 1)[1:]
+
+    def contar(self, linhas: Optional[np.ndarray] = None, limite: int = FACETS_MAX_VALORES) -> Dict[str, List[Dict[str, Any]]]:
+        """Facetas das `linhas` (todo o estoque sem elas); zeros são omitidos"""
+        resultado = {}
+        for campo, rotulos in self.rotulos.items():
+            contagens = self._totais[campo] if linhas is None else self._contagens(campo, linhas)
+            presentes = np.flatnonzero(contagens)
+            if campo == "preco":
+                resultado[campo] = [dict(rotulos[c], total=int(contagens[c])) for c in presentes]
+                continue
+            if campo == "ano":
+                ordem = presentes[::-1]
+            else:
+                # Mais frequentes primeiro; empates na ordem do estoque
+                ordem = presentes[np.argsort(-contagens[presentes], kind="stable")][:limite]
+            resultado[campo] = [{"valor": rotulos[c], "total": int(contagens[c])} for c in ordem]
+        return resultado
@@ -0,0 +1,118 @@
+"""Coordenação da ingestão do feed entre processos.
+
+Com `uvicorn --workers N`, só um processo (o líder) baixa o feed e grava o
+snapshot; os demais (seguidores) acompanham o arquivo de versão e recarregam
+o snapshot mapeado quando ele muda, sem buscar nada.
+
+INGESTAO_MODO:
+  auto      o primeiro worker que pegar o lock vira líder; se ele sair, um
+            seguidor assume no próximo ciclo (padrão)
+  lider     sempre baixa o feed (processo único)
+  seguidor  nunca baixa o feed (ingestão num processo dedicado:
+            `python ingestion.py`)
+"""
+import fcntl, os
+from datetime import datetime
+from inventory import estoque
+from metrics import ETAPAS_INGESTAO, etapa
+from snapshot_file import ler_versao
+from xml_fetcher import fetch_and_convert_xml, JSON_FILE, SNAPSHOT_FILE
+
+INGESTAO_MODO = os.getenv("INGESTAO_MODO", "auto")
+
+# Intervalo entre atualizações do feed (líder)
+FEED_REFRESH_MINUTES = int(os.getenv("FEED_REFRESH_MINUTES", "10"))
+
+# Intervalo com que os seguidores olham o arquivo de versão
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "5"))
+
+LOCK_FILE = SNAPSHOT_FILE + ".lock"
+
+estado = {
+    "lider": False,
+    "lock": None,
+    "versao_arquivo": None,
+}
+
+
+def tentar_lideranca(bloquear: bool = False) -> bool:
+    """Pega o lock exclusivo do líder; ele fica preso enquanto o processo viver"""
+    if estado["lider"]:
+        return True
+    arquivo = open(LOCK_FILE, "a+")
+    try:
+        fcntl.flock(arquivo, fcntl.LOCK_EX if bloquear else fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        arquivo.close()
+        return False
+    estado["lock"] = arquivo
+    estado["lider"] = True
+    return True
+
+
+def carregar_inicial():
+    """Estoque salvo na última execução (data.json só se ainda não houver snapshot binário)"""
+    versao_arquivo = ler_versao(SNAPSHOT_FILE)
+    with etapa("carregar_snapshot", ETAPAS_INGESTAO):
+        carregado = estoque.carregar_snapshot(SNAPSHOT_FILE)
+    if carregado is not None:
+        estado["versao_arquivo"] = versao_arquivo
+    else:
+        estoque.carregar_arquivo(JSON_FILE)
+
+
+def recarregar_se_mudou():
+    """Seguidor: remapeia o snapshot quando o líder publica uma versão nova"""
+    versao_arquivo = ler_versao(SNAPSHOT_FILE)
+    if versao_arquivo is None or versao_arquivo == estado["versao_arquivo"]:
+        return
+    with etapa("carregar_snapshot", ETAPAS_INGESTAO):
+        carregado = estoque.carregar_snapshot(SNAPSHOT_FILE)
+    if carregado is not None:
+        estado["versao_arquivo"] = versao_arquivo
+        with etapa("sugestoes", ETAPAS_INGESTAO):
+            carregado.sugestoes
+        with etapa("vocabulario", ETAPAS_INGESTAO):
+            carregado.vocabulario
+        print(f"[OK] Snapshot recarregado (versão {versao_arquivo}).")
+
+
+def agendar_lider(scheduler):
+    scheduler.add_job(
+        fetch_and_convert_xml, "interval", minutes=FEED_REFRESH_MINUTES,
+        next_run_time=datetime.now(scheduler.timezone), id="atualizar_feed"
+    )
+
+
+def acompanhar_snapshot(scheduler):
+    recarregar_se_mudou()
+    if INGESTAO_MODO == "auto" and tentar_lideranca():
+        print("[OK] Líder anterior saiu; este processo assume a ingestão do feed.")
+        scheduler.remove_job("acompanhar_snapshot")
+        agendar_lider(scheduler)
+
+
+def agendar(scheduler) -> bool:
+    """Agenda a ingestão (líder) ou o acompanhamento do snapshot (seguidor)"""
+    lider = INGESTAO_MODO == "lider" or (INGESTAO_MODO == "auto" and tentar_lideranca())
+    if lider:
+        agendar_lider(scheduler)
+    else:
+        scheduler.add_job(
+            acompanhar_snapshot, "interval", seconds=SNAPSHOT_POLL_SECONDS,
+            args=[scheduler], id="acompanhar_snapshot"
+        )
+    print(f"[OK] Ingestão do feed: {'líder' if lider else 'seguidor'} (pid {os.getpid()}).")
+    return lider
+
+
+if __name__ == "__main__":
+    # Processo dedicado de ingestão: espera o lock (nunca dois líderes) e
+    # roda só o agendamento do feed
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    tentar_lideranca(bloquear=True)
+    carregar_inicial()
+    scheduler = BlockingScheduler(timezone="America/Sao_Paulo")
+    agendar_lider(scheduler)
+    scheduler.start()
@@ -0,0 +1,173 @@
+import json, os, threading
+from typing import Any, Dict, List, Optional, Sequence
+from facets import FacetIndex
+from search_index import SearchIndex
+from serialization import codificar
+from similar import SimilarIndex
+from suggest import SuggestIndex
+from snapshot_file import VeiculosMapeados, carregar_snapshot, gravar_versao, salvar_snapshot
+from vehicle import como_veiculo
+from vocabulary import Vocabulario, vocabulario_do_snapshot
+
+
+class Snapshot:
+    """Cópia imutável do estoque publicada a cada atualização do XML"""
+
+    __slots__ = ("veiculos", "updated_at", "versao", "indice", "_facetas", "_similares", "_sugestoes", "_vocabulario",
+                 "_fragmentos", "_loja")
+
+    def __init__(self, veiculos: Sequence[Dict[str, Any]], updated_at: Optional[str] = None, versao: int = 0,
+                 anterior: Optional["Snapshot"] = None, indice: Optional[SearchIndex] = None,
+                 loja: Optional["InventoryStore"] = None):
+        self.veiculos = veiculos
+        self.updated_at = updated_at
+        self.versao = versao
+        if indice is None:
+            indice = SearchIndex(veiculos, anterior.indice if anterior is not None else None)
+        self.indice = indice
+        self._facetas: Optional[FacetIndex] = None
+        self._similares: Optional[SimilarIndex] = None
+        self._sugestoes: Optional[SuggestIndex] = None
+        self._vocabulario: Optional[Vocabulario] = None
+        self._fragmentos: Optional[List[Optional[bytes]]] = None
+        # Quem publicou o snapshot: guarda o último autocomplete montado
+        self._loja = loja
+
+    @property
+    def facetas(self) -> FacetIndex:
+        """Contagens por faceta, montadas na primeira consulta a este snapshot"""
+        if self._facetas is None:
+            self._facetas = FacetIndex(self.veiculos, self.indice)
+        return self._facetas
+
+    @property
+    def similares(self) -> SimilarIndex:
+        """Matriz de atributos dos veículos parecidos, montada na primeira consulta a este snapshot"""
+        if self._similares is None:
+            self._similares = SimilarIndex(self.indice)
+        return self._similares
+
+    @property
+    def sugestoes(self) -> SuggestIndex:
+        """Autocomplete de marcas, modelos e títulos (parte do último montado pela mesma loja)"""
+        if self._sugestoes is None:
+            if self._loja is not None:
+                return self._loja.montar_sugestoes(self)
+            self._sugestoes = SuggestIndex(self.indice, self.veiculos)
+        return self._sugestoes
+
+    @property
+    def sugestoes_prontas(self) -> bool:
+        """Se o autocomplete já foi montado (senão, a primeira consulta monta)"""
+        return self._sugestoes is not None
+
+    @property
+    def vocabulario(self) -> Vocabulario:
+        """Marcas e modelos do parser (listas fixas + aliases + estoque); a ingestão já monta ao publicar"""
+        if self._vocabulario is None:
+            self._vocabulario = vocabulario_do_snapshot(self)
+        return self._vocabulario
+
+    def fragmento(self, i: int) -> bytes:
+        """JSON do veículo da linha `i`.
+
+        Do snapshot mapeado sai o trecho do arquivo; em memória, cada veículo
+        é codificado na primeira vez que aparece numa resposta e guardado.
+        """
+        if isinstance(self.veiculos, VeiculosMapeados):
+            return self.veiculos.bruto(i)
+        if self._fragmentos is None:
+            self._fragmentos = [None] * len(self.veiculos)
+        dados = self._fragmentos[i]
+        if dados is None:
+            dados = self._fragmentos[i] = codificar(self.veiculos[i])
+        return dados
+
+    def __len__(self) -> int:
+        return len(self.veiculos)
+
+
+class InventoryStore:
+    """Mantém o snapshot atual do estoque em memória.
+
+    Leitores pegam a referência com `atual()` e trabalham sobre ela até o fim
+    da requisição; uma atualização monta um snapshot novo e só então troca a
+    referência, então nenhuma busca em andamento vê dados pela metade.
+    """
+
+    def __init__(self):
+        self._snapshot = Snapshot([])
+        self._lock = threading.Lock()
+        # Último autocomplete montado: o do próximo snapshot parte dele
+        self._sugestoes: Optional[SuggestIndex] = None
+        self._sugestoes_lock = threading.Lock()
+
+    def atual(self) -> Snapshot:
+        return self._snapshot
+
+    def publicar(self, veiculos: Sequence[Dict[str, Any]], updated_at: Optional[str] = None,
+                 indice: Optional[SearchIndex] = None, versao: int = 0) -> Snapshot:
+        """Publica um novo snapshot (o lock só serializa escritores).
+
+        Veículos que são o mesmo objeto do snapshot atual reaproveitam o que
+        já foi indexado para eles; com `indice`, nada é reindexado. A versão
+        nunca volta: é a maior entre `versao` e a atual + 1. Dicts comuns
+        viram `Veiculo` (somente leitura) antes de entrar no snapshot.
+        """
+        with self._lock:
+            atual = self._snapshot
+            if indice is None:
+                veiculos = [como_veiculo(veiculo) for veiculo in veiculos]
+            novo = Snapshot(veiculos, updated_at, max(versao, atual.versao + 1), anterior=atual, indice=indice,
+                            loja=self)
+            self._snapshot = novo
+        return novo
+
+    def montar_sugestoes(self, snapshot: Snapshot) -> SuggestIndex:
+        """Autocomplete do snapshot a partir do último montado (um de cada vez)"""
+        with self._sugestoes_lock:
+            if snapshot._sugestoes is None:
+                snapshot._sugestoes = SuggestIndex(snapshot.indice, snapshot.veiculos, self._sugestoes)
+                self._sugestoes = snapshot._sugestoes
+            return snapshot._sugestoes
+
+    def salvar_snapshot(self, caminho: str, snapshot: Optional[Snapshot] = None):
+        """Grava o snapshot (atual, por padrão) no formato binário com os índices.
+
+        O arquivo de versão só é trocado depois, então quem o lê sempre
+        encontra um snapshot pelo menos tão novo quanto ele.
+        """
+        snapshot = snapshot or self._snapshot
+        salvar_snapshot(snapshot.veiculos, snapshot.updated_at, snapshot.versao, snapshot.indice, caminho)
+        gravar_versao(caminho, snapshot.versao, snapshot.updated_at)
+
+    def carregar_snapshot(self, caminho: str) -> Optional[Snapshot]:
+        """Publica o snapshot binário mapeado em memória, já com os índices prontos"""
+        try:
+            carregado = carregar_snapshot(caminho)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[ERRO] Falha ao ler {caminho}: {e}")
+            return None
+        if carregado is None:
+            return None
+        veiculos, updated_at, versao, indice = carregado
+        return self.publicar(veiculos, updated_at, indice=indice, versao=versao)
+
+    def carregar_arquivo(self, caminho: str) -> Optional[Snapshot]:
+        """Carrega um data.json de versões anteriores, se existir"""
+        if not os.path.exists(caminho):
+            return None
+        try:
+            with open(caminho, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[ERRO] Falha ao ler {caminho}: {e}")
+            return None
+
+        # Formato antigo: lista direta de veículos
+        if isinstance(data, list):
+            return self.publicar(data)
+        return self.publicar(data.get("veiculos", []), data.get("_updated_at"))
+
+
+estoque = InventoryStore()
@@ -0,0 +1,84 @@
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+
+
+class KeywordAutomaton:
+    """Autômato de Aho-Corasick para achar várias palavras-chave numa passada.
+
+    Cada palavra-chave é registrada com um grupo (cor, combustível, ...);
+    `buscar` devolve, por grupo, o conjunto de palavras que aparecem como
+    substring do texto, inclusive sobrepostas ("gas" dentro de "gasolina").
+    """
+
+    def __init__(self, palavras: Iterable[Tuple[Hashable, str]]):
+        self._transicoes: List[Dict[str, int]] = [{}]
+        self._falhas: List[int] = [0]
+        self._saidas: List[List[Tuple[Hashable, str]]] = [[]]
+
+        for grupo, palavra in palavras:
+            estado = 0
+            for ch in palavra:
+                proximo = self._transicoes[estado].get(ch)
+                if proximo is None:
+                    proximo = len(self._transicoes)
+                    self._transicoes.append({})
+                    self._falhas.append(0)
+                    self._saidas.append([])
+                    self._transicoes[estado][ch] = proximo
+                estado = proximo
+            self._saidas[estado].append((grupo, palavra))
+
+        # Links de falha em largura; cada estado herda as saídas do seu link
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for ch, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                falha = self._falhas[estado]
+                while falha and ch not in self._transicoes[falha]:
+                    falha = self._falhas[falha]
+                destino = self._transicoes[falha].get(ch, 0)
+                self._falhas[proximo] = destino if destino != proximo else 0
+                self._saidas[proximo] = self._saidas[proximo] + self._saidas[self._falhas[proximo]]
+
+    def buscar(self, texto: str) -> Dict[Hashable, Set[str]]:
+        transicoes, falhas, saidas = self._transicoes, self._falhas, self._saidas
+        encontrados: Dict[Hashable, Set[str]] = {}
+        estado = 0
+        for ch in texto:
+            while estado and ch not in transicoes[estado]:
+                estado = falhas[estado]
+            estado = transicoes[estado].get(ch, 0)
+            for grupo, palavra in saidas[estado]:
+                encontrados.setdefault(grupo, set()).add(palavra)
+        return encontrados
+
+
+class TokenTrie:
+    """Trie de sequências de palavras (marcas e modelos com mais de uma palavra)"""
+
+    def __init__(self, entradas: Iterable[Tuple[Sequence[str], str]]):
+        self._raiz: Dict = {}
+        for tokens, valor in entradas:
+            if not tokens:
+                continue
+            no = self._raiz
+            for token in tokens:
+                no = no.setdefault(token, {})
+            # Mantém a primeira entrada registrada para a mesma sequência
+            no.setdefault(None, valor)
+
+    def primeiro(self, tokens: Sequence[str]) -> Optional[str]:
+        """Primeira ocorrência (da esquerda) com a sequência mais longa possível"""
+        for inicio in range(len(tokens)):
+            no = self._raiz
+            achado = None
+            for token in tokens[inicio:]:
+                no = no.get(token)
+                if no is None:
+                    break
+                if None in no:
+                    achado = no[None]
+            if achado is not None:
+                return achado
+        return None
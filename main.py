@@ -1,100 +1,54 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
-from unidecode import unidecode
+from fastapi.responses import JSONResponse, PlainTextResponse
 from rapidfuzz import fuzz
 from apscheduler.schedulers.background import BackgroundScheduler
-from xml_fetcher import fetch_and_convert_xml
-import json, os, re
-from typing import Dict, List, Optional, Any
+from xml_fetcher import SNAPSHOT_FILE
+import ingestion
+from inventory import estoque
+from search_index import SearchIndex, normalizar
+from attributes import canonicalizar
+from facets import FACETS_MAX_VALORES
+from similar import SIMILAR_K, SIMILAR_MAX_K, SimilarIndex
+from suggest import SUGGEST_MAX, SUGGEST_MAX_LIMITE
+from vocabulary import MAPEAMENTO_CATEGORIAS, MARCAS_CONHECIDAS, VOCABULARIO_BASE, Vocabulario, tokenizar
+from nlp_parser import ParserSpacy
+import metrics
+from metrics import etapa, iniciar_etapas, em_milissegundos
+from serialization import ListaJSON, RESPOSTA_FRAGMENTOS, RespostaJSON, codificar, codificar_resposta, resposta_json
+from keyword_automaton import KeywordAutomaton
+from query_cache import QueryCache, normalizar_query
+import asyncio, contextlib, contextvars, functools, multiprocessing, os, re, time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
 from pydantic import BaseModel
 
-app = FastAPI()
-
-# Mapeamento de categorias (mantido do código original)
-MAPEAMENTO_CATEGORIAS = {
-    # Hatch
-    "gol": "Hatch", "uno": "Hatch", "palio": "Hatch", "celta": "Hatch", "ka": "Hatch",
-    "fiesta": "Hatch", "march": "Hatch", "sandero": "Hatch", "onix": "Hatch", "hb20": "Hatch",
-    "i30": "Hatch", "golf": "Hatch", "polo": "Hatch", "fox": "Hatch", "up": "Hatch",
-    "fit": "Hatch", "city": "Hatch", "yaris": "Hatch", "etios": "Hatch", "clio": "Hatch",
-    "corsa": "Hatch", "bravo": "Hatch", "punto": "Hatch", "208": "Hatch", "argo": "Hatch",
-    "mobi": "Hatch", "c3": "Hatch", "picanto": "Hatch", "astra hatch": "Hatch", "stilo": "Hatch",
-    "focus hatch": "Hatch", "206": "Hatch", "c4 vtr": "Hatch", "kwid": "Hatch", "soul": "Hatch",
-    "agile": "Hatch", "sonic hatch": "Hatch", "fusca": "Hatch",
-
-    # Sedan
-    "civic": "Sedan", "corolla": "Sedan", "sentra": "Sedan", "versa": "Sedan", "jetta": "Sedan",
-    "prisma": "Sedan", "voyage": "Sedan", "siena": "Sedan", "grand siena": "Sedan", "cruze": "Sedan",
-    "cobalt": "Sedan", "logan": "Sedan", "fluence": "Sedan", "cerato": "Sedan", "elantra": "Sedan",
-    "virtus": "Sedan", "accord": "Sedan", "altima": "Sedan", "fusion": "Sedan", "mazda3": "Sedan",
-    "mazda6": "Sedan", "passat": "Sedan", "city sedan": "Sedan", "astra sedan": "Sedan", "vectra sedan": "Sedan",
-    "classic": "Sedan", "cronos": "Sedan", "linea": "Sedan", "focus sedan": "Sedan", "ka sedan": "Sedan",
-    "408": "Sedan", "c4 pallas": "Sedan", "polo sedan": "Sedan", "bora": "Sedan", "hb20s": "Sedan",
-    "lancer": "Sedan", "camry": "Sedan", "onix plus": "Sedan",
-
-    # SUV
-    "duster": "SUV", "ecosport": "SUV", "hrv": "SUV", "compass": "SUV", "renegade": "SUV",
-    "tracker": "SUV", "kicks": "SUV", "captur": "SUV", "creta": "SUV", "tucson": "SUV",
-    "santa fe": "SUV", "sorento": "SUV", "sportage": "SUV", "outlander": "SUV", "asx": "SUV",
-    "pajero": "SUV", "tr4": "SUV", "aircross": "SUV", "tiguan": "SUV", "t-cross": "SUV",
-    "rav4": "SUV", "cx5": "SUV", "forester": "SUV", "wrv": "SUV", "land cruiser": "SUV", 
-    "cherokee": "SUV", "grand cherokee": "SUV", "xtrail": "SUV", "murano": "SUV", "cx9": "SUV",
-    "edge": "SUV", "trailblazer": "SUV", "pulse": "SUV", "fastback": "SUV", "territory": "SUV",
-    "bronco sport": "SUV", "2008": "SUV", "3008": "SUV", "c4 cactus": "SUV", "taos": "SUV",
-    "cr-v": "SUV", "corolla cross": "SUV", "sw4": "SUV", "pajero sport": "SUV", "commander": "SUV",
-    "xv": "SUV", "xc60": "SUV", "tiggo 5x": "SUV", "haval h6": "SUV", "nivus": "SUV",
-
-    # Caminhonete
-    "hilux": "Caminhonete", "ranger": "Caminhonete", "s10": "Caminhonete", "l200": "Caminhonete", "triton": "Caminhonete",
-    "saveiro": "Utilitário", "strada": "Utilitário", "montana": "Utilitário", "oroch": "Utilitário", 
-    "toro": "Caminhonete", 
-    "frontier": "Caminhonete", "amarok": "Caminhonete", "gladiator": "Caminhonete", "maverick": "Caminhonete", "colorado": "Caminhonete",
-    "dakota": "Caminhonete", "montana (nova)": "Caminhonete", "f-250": "Caminhonete", "courier (pickup)": "Caminhonete", "hoggar": "Caminhonete",
-    "ram 1500": "Caminhonete",
-
-    # Utilitário
-    "kangoo": "Utilitário", "partner": "Utilitário", "doblo": "Utilitário", "fiorino": "Utilitário", "berlingo": "Utilitário",
-    "express": "Utilitário", "combo": "Utilitário", "kombi": "Utilitário", "doblo cargo": "Utilitário", "kangoo express": "Utilitário",
-
-    # Furgão
-    "master": "Furgão", "sprinter": "Furgão", "ducato": "Furgão", "daily": "Furgão", "jumper": "Furgão",
-    "boxer": "Furgão", "trafic": "Furgão", "transit": "Furgão", "vito": "Furgão", "expert (furgão)": "Furgão",
-    "jumpy (furgão)": "Furgão", "scudo (furgão)": "Furgão",
-
-    # Coupe
-    "camaro": "Coupe", "mustang": "Coupe", "tt": "Coupe", "supra": "Coupe", "370z": "Coupe",
-    "rx8": "Coupe", "challenger": "Coupe", "corvette": "Coupe", "veloster": "Coupe", "cerato koup": "Coupe",
-    "clk coupe": "Coupe", "a5 coupe": "Coupe", "gt86": "Coupe", "rcz": "Coupe", "brz": "Coupe",
-
-    # Conversível
-    "z4": "Conversível", "boxster": "Conversível", "miata": "Conversível", "beetle cabriolet": "Conversível", "slk": "Conversível",
-    "911 cabrio": "Conversível", "tt roadster": "Conversível", "a5 cabrio": "Conversível", "mini cabrio": "Conversível", "206 cc": "Conversível",
-    "eos": "Conversível",
-
-    # Minivan / Station Wagon
-    "spin": "Minivan", "livina": "Minivan", "caravan": "Minivan", "touran": "Minivan", "parati": "Station Wagon",
-    "quantum": "Station Wagon", "sharan": "Minivan", "zafira": "Minivan", "picasso": "Minivan", "grand c4": "Minivan",
-    "meriva": "Minivan", "scenic": "Minivan", "xsara picasso": "Minivan", "carnival": "Minivan", "idea": "Minivan",
-    "spacefox": "Station Wagon", "golf variant": "Station Wagon", "palio weekend": "Station Wagon", "astra sw": "Station Wagon", "206 sw": "Station Wagon",
-    "a4 avant": "Station Wagon", "fielder": "Station Wagon",
-
-    # Off-road
-    "wrangler": "Off-road", "troller": "Off-road", "defender": "Off-road", "bronco": "Off-road", "samurai": "Off-road",
-    "jimny": "Off-road", "land cruiser": "Off-road", "grand vitara": "Off-road", "jimny sierra": "Off-road", "bandeirante (ate 2001)": "Off-road"
-}
+app = FastAPI(default_response_class=RespostaJSON)
 
-# Dicionários para extração inteligente de parâmetros
-MARCAS_CONHECIDAS = [
-    "toyota", "honda", "ford", "chevrolet", "volkswagen", "fiat", "nissan", "hyundai", 
-    "jeep", "renault", "peugeot", "citroën", "mitsubishi", "kia", "mazda", "subaru",
-    "suzuki", "audi", "bmw", "mercedes", "volvo", "land rover", "jaguar", "porsche",
-    "ferrari", "lamborghini", "bentley", "rolls royce", "maserati", "bugatti",
-    "tesla", "lexus", "infiniti", "acura", "cadillac", "lincoln", "buick", "gmc",
-    "dodge", "chrysler", "ram", "isuzu", "daihatsu", "great wall", "haval", "byd",
-    "chery", "geely", "mg", "jac", "lifan", "foton", "iveco", "scania", "volvo",
-    "mercedes-benz", "vw"
-]
+cache_buscas = QueryCache()
+
+# Execução das buscas fora do event loop: thread (padrão), process ou inline.
+# O rapidfuzz libera o GIL no cdist, então threads já dividem bem a CPU.
+SEARCH_EXECUTOR = os.getenv("SEARCH_EXECUTOR", "thread")
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", str(min(8, os.cpu_count() or 4))))
+# Buscas simultâneas por worker antes de responder 503
+SEARCH_MAX_INFLIGHT = int(os.getenv("SEARCH_MAX_INFLIGHT", str(SEARCH_WORKERS * 4)))
+
+# Máximo de queries por chamada do endpoint em lote
+SEARCH_BATCH_MAX = int(os.getenv("SEARCH_BATCH_MAX", "20"))
+
+# Busca sem resultados devolve veículos parecidos com o que foi pedido em "similares"
+SIMILAR_FALLBACK = os.getenv("SIMILAR_FALLBACK", "1").lower() not in ("0", "false", "nao", "não")
+
+# Parser das queries: regex (padrão) ou spacy (marca, modelo, preço, km e ano por entidades)
+QUERY_PARSER = os.getenv("QUERY_PARSER", "regex").lower()
+parser_spacy = ParserSpacy() if QUERY_PARSER == "spacy" else None
+
+_executor = None
+semaforo_buscas = asyncio.Semaphore(SEARCH_MAX_INFLIGHT)
 
+# Dicionários para extração inteligente de parâmetros (marcas e categorias dos modelos em vocabulary.py)
 CORES_CONHECIDAS = [
     "branco", "branca", "preto", "preta", "prata", "cinza", "azul", "vermelho", "vermelha",
     "verde", "amarelo", "amarela", "dourado", "dourada", "marrom", "bege", "laranja",
@@ -131,10 +85,6 @@ class SearchParams(BaseModel):
     valor_min: Optional[float] = None  # Corrigido
     opcionais: Optional[str] = None
 
-def normalizar(texto: str) -> str:
-    """Função de normalização mantida do código original"""
-    return unidecode(texto).lower().replace("-", "").replace(" ", "").strip()
-
 def extrair_valores_numericos(texto: str) -> List[float]:
     """Extrai valores numéricos do texto, considerando formatos brasileiros"""
     # Padrões para valores em reais
@@ -206,21 +156,80 @@ def encontrar_melhor_match(texto: str, lista_opcoes: List[str], threshold: int =
     
     return melhor_match
 
-def extrair_parametros_inteligente(query: str) -> SearchParams:
+# Categorias e opcionais reconhecidos na query (ordem = prioridade)
+CATEGORIAS_POSSIVEIS = ['hatch', 'sedan', 'suv', 'caminhonete', 'utilitario', 'utilitário', 'furgao', 'furgão',
+                        'coupe', 'coupé', 'conversivel', 'conversível', 'minivan', 'station wagon', 'off-road']
+
+CATEGORIAS_PADRAO = {
+    'suv': 'SUV', 'utilitario': 'Utilitário', 'utilitário': 'Utilitário', 'furgao': 'Furgão', 'furgão': 'Furgão',
+    'coupe': 'Coupe', 'coupé': 'Coupe', 'conversivel': 'Conversível', 'conversível': 'Conversível'
+}
+
+OPCIONAIS_KEYWORDS = ['ar', 'arcondicionado', 'direcao', 'direção', 'eletrica', 'elétrica', 'vidro', 'eletrico', 'elétrico',
+                      'trava', 'alarme', 'airbag', 'abs', 'cd', 'mp3', 'bluetooth', 'gps', 'navegador']
+
+# Padrões compilados uma única vez na importação
+PADROES_PRECO = [
+    re.compile(r'(?:ate|até|max|maximo|máximo|teto|limite)?\s*r?\$?\s*([\d,.]+)\s*(?:mil|k|reais?|r\$)?'),
+    re.compile(r'preco\s*(?:ate|até|max|maximo|máximo)?\s*r?\$?\s*([\d,.]+)'),
+    re.compile(r'valor\s*(?:ate|até|max|maximo|máximo)?\s*r?\$?\s*([\d,.]+)')
+]
+PALAVRAS_PRECO = ['ate', 'até', 'max', 'maximo', 'máximo', 'teto', 'limite', 'preco', 'valor']
+PADRAO_ANO = re.compile(r'\b(20\d{2}|19\d{2})\b')
+PADRAO_FABRICACAO = re.compile(r'fabricac[aã]o\s*(\d{4})')
+PADROES_KM = [
+    re.compile(r'(\d+)\.?(\d*)\s*k?m?\s*km'),
+    re.compile(r'(\d+)\s*mil\s*km'),
+    re.compile(r'km\s*(\d+)'),
+    re.compile(r'(\d+)\s*k\s*km')
+]
+PADROES_MOTOR = [
+    re.compile(r'motor\s*(\d+\.?\d*)'),
+    re.compile(r'(\d+\.?\d*)\s*(?:litros?|l)\s*motor'),
+    re.compile(r'(\d+\.?\d*)\s*motor')
+]
+PADROES_PORTAS = [
+    re.compile(r'(\d+)\s*porta'),
+    re.compile(r'porta\s*(\d+)')
+]
+
+
+def compilar_parser():
+    """Monta o autômato de palavras-chave (cores, combustíveis, câmbios, categorias, opcionais)"""
+    return KeywordAutomaton(
+        [("cor", cor) for cor in CORES_CONHECIDAS]
+        + [("combustivel", c) for c in COMBUSTIVEIS_CONHECIDOS]
+        + [("cambio", c) for c in TRANSMISSOES_CONHECIDAS]
+        + [("categoria", c) for c in CATEGORIAS_POSSIVEIS]
+        + [("opcional", o) for o in OPCIONAIS_KEYWORDS]
+    )
+
+
+AUTOMATO_PALAVRAS = compilar_parser()
+
+def primeiro_da_lista(encontrados: set, lista: List[str]) -> Optional[str]:
+    """Primeiro item de `lista` (ordem de prioridade) presente em `encontrados`"""
+    for item in lista:
+        if item in encontrados:
+            return item
+    return None
+
+
+def extrair_parametros_inteligente(query: str, vocabulario: Optional[Vocabulario] = None) -> SearchParams:
     """Extrai APENAS os parâmetros explicitamente mencionados na query"""
+    vocabulario = vocabulario or VOCABULARIO_BASE
     query_lower = query.lower()
     params = SearchParams()
-    
+
+    # Uma passada do autômato acha cores, combustíveis, câmbios, categorias e opcionais
+    palavras_chave = AUTOMATO_PALAVRAS.buscar(query_lower)
+
     # Extrair preço/valor
-    padroes_preco = [
-        r'(?:ate|até|max|maximo|máximo|teto|limite)?\s*r?\$?\s*([\d,.]+)\s*(?:mil|k|reais?|r\$)?',
-        r'preco\s*(?:ate|até|max|maximo|máximo)?\s*r?\$?\s*([\d,.]+)',
-        r'valor\s*(?:ate|até|max|maximo|máximo)?\s*r?\$?\s*([\d,.]+)'
-    ]
-    
-    for padrao in padroes_preco:
-        matches = re.findall(padrao, query_lower)
-        if matches and any(word in query_lower for word in ['ate', 'até', 'max', 'maximo', 'máximo', 'teto', 'limite', 'preco', 'valor']):
+    if any(word in query_lower for word in PALAVRAS_PRECO):
+        for padrao in PADROES_PRECO:
+            matches = padrao.findall(query_lower)
+            if not matches:
+                continue
             try:
                 valor_str = matches[0].replace(',', '').replace('.', '')
                 valor = float(valor_str)
@@ -232,30 +241,22 @@ def extrair_parametros_inteligente(query: str) -> SearchParams:
                 break
             except ValueError:
                 continue
-    
+
     # Extrair ano - APENAS se explicitamente mencionado
-    if 'ano' in query_lower or re.search(r'\b(20\d{2}|19\d{2})\b', query_lower):
-        anos = re.findall(r'\b(20\d{2}|19\d{2})\b', query_lower)
-        if anos:
-            params.ano = int(anos[0])
-    
+    anos = PADRAO_ANO.findall(query_lower)
+    if anos:
+        params.ano = int(anos[0])
+
     # Extrair ano de fabricação - APENAS se explicitamente mencionado
     if 'fabricacao' in query_lower or 'fabricação' in query_lower:
-        anos = re.findall(r'fabricac[aã]o\s*(\d{4})', query_lower)
+        anos = PADRAO_FABRICACAO.findall(query_lower)
         if anos:
             params.ano_fabricacao = int(anos[0])
-    
+
     # Extrair km - APENAS se explicitamente mencionado
     if 'km' in query_lower:
-        km_patterns = [
-            r'(\d+)\.?(\d*)\s*k?m?\s*km',
-            r'(\d+)\s*mil\s*km',
-            r'km\s*(\d+)',
-            r'(\d+)\s*k\s*km'
-        ]
-        
-        for pattern in km_patterns:
-            matches = re.findall(pattern, query_lower)
+        for pattern in PADROES_KM:
+            matches = pattern.findall(query_lower)
             if matches:
                 try:
                     if isinstance(matches[0], tuple):
@@ -269,288 +270,467 @@ def extrair_parametros_inteligente(query: str) -> SearchParams:
                     break
                 except ValueError:
                     continue
-    
-    # Extrair cor - APENAS se explicitamente mencionada
-    cores_encontradas = []
-    for cor in CORES_CONHECIDAS:
-        if cor in query_lower:
-            cores_encontradas.append(cor)
-    
+
+    # Extrair cor - pega a mais específica (mais longa)
+    cores_encontradas = palavras_chave.get("cor")
     if cores_encontradas:
-        # Pega a cor mais específica (mais longa)
-        params.cor = max(cores_encontradas, key=len)
-    
-    # Extrair combustível - APENAS se explicitamente mencionado
-    for combustivel in COMBUSTIVEIS_CONHECIDOS:
-        if combustivel in query_lower:
-            params.combustivel = combustivel
-            break
-    
-    # Extrair câmbio/transmissão - APENAS se explicitamente mencionado
-    cambios = ['manual', 'automatico', 'automatica', 'cvt', 'semi-automatico', 'semi-automatica', 'tiptronic']
-    for cambio in cambios:
-        if cambio in query_lower:
-            params.cambio = cambio
-            params.transmissao = cambio  # Preenche ambos os campos
-            break
-    
+        params.cor = max((cor for cor in CORES_CONHECIDAS if cor in cores_encontradas), key=len)
+
+    # Extrair combustível e câmbio/transmissão (primeiro da lista de prioridade)
+    params.combustivel = primeiro_da_lista(palavras_chave.get("combustivel", set()), COMBUSTIVEIS_CONHECIDOS)
+
+    cambio = primeiro_da_lista(palavras_chave.get("cambio", set()), TRANSMISSOES_CONHECIDAS)
+    if cambio:
+        params.cambio = cambio
+        params.transmissao = cambio  # Preenche ambos os campos
+
     # Extrair motor - APENAS se explicitamente mencionado
     if 'motor' in query_lower:
-        motor_patterns = [
-            r'motor\s*(\d+\.?\d*)',
-            r'(\d+\.?\d*)\s*(?:litros?|l)\s*motor',
-            r'(\d+\.?\d*)\s*motor'
-        ]
-        
-        for pattern in motor_patterns:
-            matches = re.findall(pattern, query_lower)
+        for pattern in PADROES_MOTOR:
+            matches = pattern.findall(query_lower)
             if matches:
                 params.motor = matches[0]
                 break
-    
+
     # Extrair portas - APENAS se explicitamente mencionado
     if 'porta' in query_lower:
-        portas_patterns = [
-            r'(\d+)\s*porta',
-            r'porta\s*(\d+)'
-        ]
-        
-        for pattern in portas_patterns:
-            matches = re.findall(pattern, query_lower)
+        for pattern in PADROES_PORTAS:
+            matches = pattern.findall(query_lower)
             if matches:
                 try:
                     params.portas = int(matches[0])
                     break
                 except ValueError:
                     continue
-    
-    # Extrair categoria - APENAS se explicitamente mencionada
-    categorias_possiveis = ['hatch', 'sedan', 'suv', 'caminhonete', 'utilitario', 'utilitário', 'furgao', 'furgão', 
-                           'coupe', 'coupé', 'conversivel', 'conversível', 'minivan', 'station wagon', 'off-road']
-    
-    for categoria in categorias_possiveis:
-        if categoria in query_lower:
-            # Mapear para formato padrão
-            if categoria in ['suv']:
-                params.categoria = 'SUV'
-            elif categoria in ['utilitario', 'utilitário']:
-                params.categoria = 'Utilitário'
-            elif categoria in ['furgao', 'furgão']:
-                params.categoria = 'Furgão'
-            elif categoria in ['coupe', 'coupé']:
-                params.categoria = 'Coupe'
-            elif categoria in ['conversivel', 'conversível']:
-                params.categoria = 'Conversível'
-            else:
-                params.categoria = categoria.title()
-            break
-    
-    # Extrair marca - APENAS se explicitamente mencionada
-    # Busca por marcas que aparecem como palavras completas na query
-    palavras_query = query_lower.split()
-    for palavra in palavras_query:
-        palavra_limpa = re.sub(r'[^\w]', '', palavra)
-        for marca in MARCAS_CONHECIDAS:
-            if palavra_limpa == marca.lower():
-                params.marca = marca.title()
-                break
-        if params.marca:
-            break
-    
-    # Extrair modelo - APENAS se explicitamente mencionado
-    # Busca por modelos que aparecem como palavras na query
-    modelos_conhecidos = list(MAPEAMENTO_CATEGORIAS.keys())
-    for palavra in palavras_query:
-        palavra_limpa = re.sub(r'[^\w]', '', palavra)
-        for modelo in modelos_conhecidos:
-            if palavra_limpa == modelo.lower():
-                params.modelo = modelo
-                break
-        if params.modelo:
-            break
-    
+
+    # Extrair categoria - mapeada para o formato padrão
+    categoria = primeiro_da_lista(palavras_chave.get("categoria", set()), CATEGORIAS_POSSIVEIS)
+    if categoria:
+        params.categoria = CATEGORIAS_PADRAO.get(categoria, categoria.title())
+
+    # Extrair marca e modelo - palavras completas da query (inclui nomes compostos)
+    palavras_query = tokenizar(query_lower)
+    marca = vocabulario.marcas.primeiro(palavras_query)
+    if marca:
+        params.marca = marca.title()
+    params.modelo = vocabulario.modelos.primeiro(palavras_query)
+
     # Extrair opcionais - busca por palavras relacionadas
-    opcionais_keywords = ['ar', 'arcondicionado', 'direcao', 'direção', 'eletrica', 'elétrica', 'vidro', 'eletrico', 'elétrico', 
-                         'trava', 'alarme', 'airbag', 'abs', 'cd', 'mp3', 'bluetooth', 'gps', 'navegador']
-    
-    opcionais_encontrados = []
-    for opcional in opcionais_keywords:
-        if opcional in query_lower:
-            opcionais_encontrados.append(opcional)
-    
+    opcionais_encontrados = palavras_chave.get("opcional", set())
     if opcionais_encontrados:
-        params.opcionais = ', '.join(opcionais_encontrados)
-    
+        params.opcionais = ', '.join(o for o in OPCIONAIS_KEYWORDS if o in opcionais_encontrados)
+
     return params
 
-def converter_preco(valor_str):
-    """Função mantida do código original"""
-    try:
-        return float(str(valor_str).replace(",", "").replace("R$", "").strip())
-    except (ValueError, TypeError):
-        return None
+def extrair_parametros_lote(queries: List[str], vocabulario: Optional[Vocabulario] = None) -> List[SearchParams]:
+    """Parâmetros de várias queries; com QUERY_PARSER=spacy, as entidades vêm de um único nlp.pipe"""
+    vocabulario = vocabulario or VOCABULARIO_BASE
+    todos = [extrair_parametros_inteligente(query, vocabulario) for query in queries]
+    if parser_spacy is None:
+        return todos
+    entidades = parser_spacy.analisar_lote([query.lower() for query in queries], vocabulario)
+    return [params.model_copy(update=campos) for params, campos in zip(todos, entidades)]
 
-def get_price_for_sort(price_val):
-    """Função mantida do código original"""
-    converted = converter_preco(price_val)
-    return converted if converted is not None else float('-inf')
+def extrair_parametros(query: str, vocabulario: Optional[Vocabulario] = None) -> SearchParams:
+    return extrair_parametros_lote([query], vocabulario)[0]
 
-def inferir_categoria_por_modelo(modelo_buscado):
-    """Função mantida do código original"""
+def inferir_categoria_por_modelo(modelo_buscado, vocabulario: Optional[Vocabulario] = None):
+    """Categoria do mapeamento fixo; sem ela, a mais comum do modelo no estoque"""
     modelo_norm = normalizar(modelo_buscado)
-    return MAPEAMENTO_CATEGORIAS.get(modelo_norm)
+    categoria = MAPEAMENTO_CATEGORIAS.get(modelo_norm)
+    if categoria is None and vocabulario is not None:
+        categoria = vocabulario.categoria_por_modelo.get(modelo_norm)
+    return categoria
+
+def mascara_atributo(indice: SearchIndex, campo: str, valor: Any) -> np.ndarray:
+    """Bitmap do valor canônico; termos fora do vocabulário caem no fuzzy (corte 80)"""
+    canonico = canonicalizar(campo, valor)
+    if canonico is not None:
+        return indice.bitmap(campo, canonico)
+    if campo not in indice.distintos:
+        return np.zeros(indice.total, dtype=bool)
+    return indice.mascara_aceita(campo, normalizar(str(valor)), 80)
+
+def filtrar_linhas(params: SearchParams, indice: SearchIndex) -> np.ndarray:
+    """Linhas que passam nos filtros, já ordenadas por relevância e preço.
+
+    Candidatos são máscaras e a pontuação fica em arrays por linha desta
+    requisição; os veículos do snapshot nunca são alterados.
+    """
+    candidatos = np.ones(indice.total, dtype=bool)
+    relevancia = np.zeros(indice.total, dtype=np.float64)
+    criterios = np.zeros(indice.total, dtype=np.int32)
 
-def filtrar_veiculos_inteligente(vehicles: List[Dict], params: SearchParams) -> List[Dict]:
-    """Versão aprimorada da função de filtro usando os parâmetros extraídos"""
-    vehicles_processados = list(vehicles)
-    
-    # Inicializa scores de relevância
-    for v in vehicles_processados:
-        v['_relevance_score'] = 0.0
-        v['_matched_criteria'] = 0
-    
     # Filtros básicos (marca, modelo, categoria)
     if params.marca:
-        vehicles_temp = []
-        for v in vehicles_processados:
-            marca_veiculo = normalizar(str(v.get("marca", "")))
-            marca_busca = normalizar(params.marca)
-            
-            if marca_busca in marca_veiculo or fuzz.partial_ratio(marca_veiculo, marca_busca) >= 80:
-                v['_relevance_score'] += 100
-                v['_matched_criteria'] += 1
-                vehicles_temp.append(v)
-        vehicles_processados = vehicles_temp
-    
+        aceitas = indice.mascara_aceita("marca", normalizar(params.marca), 80)
+        candidatos &= aceitas
+        relevancia += aceitas * 100.0
+        criterios += aceitas
+
     if params.modelo:
-        vehicles_temp = []
-        for v in vehicles_processados:
-            modelo_veiculo = normalizar(str(v.get("modelo", "")))
-            titulo_veiculo = normalizar(str(v.get("titulo", "")))
-            modelo_busca = normalizar(params.modelo)
-            
-            score_modelo = max(
-                fuzz.partial_ratio(modelo_veiculo, modelo_busca),
-                fuzz.partial_ratio(titulo_veiculo, modelo_busca)
-            )
-            
-            if modelo_busca in modelo_veiculo or modelo_busca in titulo_veiculo or score_modelo >= 75:
-                v['_relevance_score'] += score_modelo
-                v['_matched_criteria'] += 1
-                vehicles_temp.append(v)
-        vehicles_processados = vehicles_temp
-    
+        modelo_busca = normalizar(params.modelo)
+        score = np.maximum(
+            indice.pontuacao_por_linha("modelo", modelo_busca, 75),
+            indice.pontuacao_por_linha("titulo", modelo_busca, 75),
+        )
+        aceitas = score >= 75
+        candidatos &= aceitas
+        relevancia += np.where(aceitas, score, 0.0)
+        criterios += aceitas
+
     if params.categoria:
-        vehicles_temp = []
-        for v in vehicles_processados:
-            categoria_veiculo = normalizar(str(v.get("categoria", "")))
-            categoria_busca = normalizar(params.categoria)
-            
-            if categoria_busca == categoria_veiculo:
-                v['_relevance_score'] += 80
-                v['_matched_criteria'] += 1
-                vehicles_temp.append(v)
-        vehicles_processados = vehicles_temp
-    
-    # Filtros adicionais (cor, combustível, transmissão, etc.)
+        canonico = canonicalizar("categoria", params.categoria)
+        if canonico is not None:
+            aceitas = indice.bitmap("categoria", canonico)
+        else:
+            aceitas = indice.mascara("categoria", normalizar(params.categoria))
+        candidatos &= aceitas
+        relevancia += aceitas * 80.0
+        criterios += aceitas
+
+    # Filtros adicionais (cor, combustível, transmissão, portas) só pontuam
     filtros_adicionais = [
         (params.cor, "cor"),
         (params.combustivel, "combustivel"),
-        (params.transmissao, "transmissao")
+        (params.transmissao, "transmissao"),
+        (params.portas, "portas"),
     ]
-    
+
     for param_value, field_name in filtros_adicionais:
         if param_value:
-            for v in vehicles_processados:
-                field_value = normalizar(str(v.get(field_name, "")))
-                param_norm = normalizar(param_value)
-                
-                if param_norm in field_value or fuzz.partial_ratio(field_value, param_norm) >= 80:
-                    v['_relevance_score'] += 50
-                    v['_matched_criteria'] += 1
-    
-    # Filtros de valor
-    if params.valor_max:
-        vehicles_temp = []
-        for v in vehicles_processados:
-            preco = converter_preco(v.get("preco"))
-            if preco is not None and preco <= params.valor_max * 1.3:  # Margem de 30%
-                vehicles_temp.append(v)
-        vehicles_processados = vehicles_temp
-    
-    if params.valor_min:
-        vehicles_temp = []
-        for v in vehicles_processados:
-            preco = converter_preco(v.get("preco"))
-            if preco is not None and preco >= params.valor_min:
-                vehicles_temp.append(v)
-        vehicles_processados = vehicles_temp
-    
-    # Filtros de ano
-    if params.ano_min:
-        vehicles_temp = []
-        for v in vehicles_processados:
-            try:
-                ano = int(v.get("ano", 0))
-                if ano >= params.ano_min:
-                    vehicles_temp.append(v)
-            except (ValueError, TypeError):
-                continue
-        vehicles_processados = vehicles_temp
-    
-    if params.ano_max:
-        vehicles_temp = []
-        for v in vehicles_processados:
-            try:
-                ano = int(v.get("ano", 0))
-                if ano <= params.ano_max:
-                    vehicles_temp.append(v)
-            except (ValueError, TypeError):
-                continue
-        vehicles_processados = vehicles_temp
-    
-    # Filtro de quilometragem
+            aceitas = mascara_atributo(indice, field_name, param_value)
+            relevancia += aceitas * 50.0
+            criterios += aceitas
+
+    # Filtros numéricos (valor com margem de 30% no máximo, ano e km) em uma única máscara
+    faixas = {}
+    if params.valor_max or params.valor_min:
+        faixas["preco"] = (params.valor_min or None, params.valor_max * 1.3 if params.valor_max else None)
+    if params.ano_min or params.ano_max:
+        faixas["ano"] = (params.ano_min or None, params.ano_max or None)
     if params.km_max:
-        vehicles_temp = []
-        for v in vehicles_processados:
-            try:
-                km = float(str(v.get("km", "0")).replace(",", "").replace(".", ""))
-                if km <= params.km_max:
-                    vehicles_temp.append(v)
-            except (ValueError, TypeError):
-                continue
-        vehicles_processados = vehicles_temp
-    
-    # Ordenação por relevância e preço
-    vehicles_processados.sort(
-        key=lambda v: (
-            v['_matched_criteria'],
-            v['_relevance_score'],
-            get_price_for_sort(v.get("preco"))
-        ),
-        reverse=True
-    )
-    
-    # Remove campos temporários
-    for v in vehicles_processados:
-        v.pop('_relevance_score', None)
-        v.pop('_matched_criteria', None)
-    
-    return vehicles_processados
+        faixas["km"] = (None, params.km_max)
+
+    if faixas:
+        candidatos &= indice.mascara_intervalos(faixas)
+
+    # Ordena por critérios, relevância e preço (decrescentes); o lexsort é
+    # estável, então empates mantêm a ordem do estoque
+    with etapa("ordenacao"):
+        linhas = np.flatnonzero(candidatos)
+        ordem = np.lexsort((-indice.preco_ordem[linhas], -relevancia[linhas], -criterios[linhas]))
+        return linhas[ordem]
+
+def pre_pontuar(lista_params: List[SearchParams], indice: SearchIndex):
+    """Calcula numa chamada de cdist por campo os termos fuzzy de várias queries.
+
+    As pontuações ficam memorizadas no índice, então o `filtrar_linhas` de
+    cada query depois só as consulta.
+    """
+    termos: Dict[Tuple[str, float], List[str]] = {}
+    for params in lista_params:
+        if params.marca:
+            termos.setdefault(("marca", 80), []).append(normalizar(params.marca))
+        if params.modelo:
+            modelo_busca = normalizar(params.modelo)
+            termos.setdefault(("modelo", 75), []).append(modelo_busca)
+            termos.setdefault(("titulo", 75), []).append(modelo_busca)
+        for valor, campo in ((params.cor, "cor"), (params.combustivel, "combustivel"), (params.transmissao, "transmissao")):
+            # Valores canônicos usam os bitmaps; só o que sobra é pontuado
+            if valor and canonicalizar(campo, valor) is None:
+                termos.setdefault((campo, 80), []).append(normalizar(valor))
+    for (campo, corte), lista in termos.items():
+        indice.pontuacoes(campo, lista, corte)
+
+def projetar_veiculo(veiculo: Dict, campos: Optional[List[str]] = None, omitir: Optional[List[str]] = None) -> Dict:
+    """Copia só os campos pedidos do veículo (o snapshot compartilhado não é alterado)"""
+    if campos:
+        return {campo: veiculo[campo] for campo in campos if campo in veiculo}
+    if omitir:
+        return {campo: valor for campo, valor in veiculo.items() if campo not in omitir}
+    return veiculo
+
+def filtrar_veiculos_inteligente(vehicles: List[Dict], params: SearchParams, indice: Optional[SearchIndex] = None) -> List[Dict]:
+    """Versão aprimorada da função de filtro usando os parâmetros extraídos"""
+    if indice is None:
+        indice = SearchIndex(vehicles)
+    return [vehicles[i] for i in filtrar_linhas(params, indice).tolist()]
 
 @app.on_event("startup")
 def agendar_tarefas():
-    """Função mantida do código original"""
+    """Carrega o último estoque salvo e agenda as atualizações do feed.
+
+    A primeira leitura do XML roda em segundo plano logo após o start, então
+    o worker fica pronto sem esperar o feed. Com vários workers, só o líder
+    baixa o feed; os outros recarregam o snapshot que ele publica.
+    """
+    ingestion.carregar_inicial()
     scheduler = BackgroundScheduler(timezone="America/Sao_Paulo")
-    scheduler.add_job(fetch_and_convert_xml, "cron", hour="0,12")
+    ingestion.agendar(scheduler)
     scheduler.start()
-    fetch_and_convert_xml()
+
+def primeiro_informado(*valores):
+    """Primeiro valor que não é None (ex.: `limit` ou o nome antigo `limite`, depois o padrão)"""
+    return next((valor for valor in valores if valor is not None), None)
+
+def lista_de_campos(valor) -> Optional[List[str]]:
+    """Aceita lista ou string separada por vírgulas"""
+    if not valor:
+        return None
+    if isinstance(valor, str):
+        valor = valor.split(",")
+    return [str(campo).strip() for campo in valor if str(campo).strip()]
+
+def ler_origens(request_data: dict) -> Optional[List[str]]:
+    """"origem" do corpo da requisição: texto separado por vírgulas ou lista de textos (ValueError se outro tipo)"""
+    valor = request_data.get("origem")
+    if valor is not None and not isinstance(valor, str) and not (
+            isinstance(valor, list) and all(isinstance(origem, str) for origem in valor)):
+        raise ValueError("origem inválida")
+    return lista_de_campos(valor)
+
+def ler_paginacao(request_data: dict) -> Tuple[Optional[int], int, Optional[List[str]], Optional[List[str]]]:
+    """limit/offset/fields/omit do corpo da requisição (ValueError se inválidos)"""
+    limit = request_data.get("limit")
+    limit = int(limit) if limit is not None else None
+    offset = int(request_data.get("offset") or 0)
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError("limit/offset inválidos")
+    return limit, offset, lista_de_campos(request_data.get("fields")), lista_de_campos(request_data.get("omit"))
+
+def resultados_json(snapshot, linhas: List[int], campos: Optional[List[str]], omitir: Optional[List[str]]) -> ListaJSON:
+    if RESPOSTA_FRAGMENTOS and not campos and not omitir:
+        # Veículo inteiro: o JSON já codificado no snapshot
+        return ListaJSON([snapshot.fragmento(i) for i in linhas])
+    return ListaJSON([codificar(projetar_veiculo(snapshot.veiculos[i], campos, omitir)) for i in linhas])
+
+def montar_resposta(snapshot, params: SearchParams, ordenadas: List[int], total: int, limit: Optional[int],
+                    offset: int, campos: Optional[List[str]], omitir: Optional[List[str]]) -> Dict[str, Any]:
+    fim = offset + limit if limit is not None else None
+    metrics.RESULTADOS_BUSCA.observar(total)
+    with etapa("projecao"):
+        resposta = {
+            "parametros_detectados": params.dict(exclude_none=True),
+            "total_encontrado": total,
+            "resultados": resultados_json(snapshot, ordenadas[offset:fim], campos, omitir),
+        }
+    if limit is not None:
+        resposta["offset"] = offset
+        resposta["limit"] = limit
+        resposta["proximo_offset"] = fim if fim < total else None
+    return resposta
+
+def linhas_da_busca(snapshot, chave: str, params: Optional[SearchParams] = None) -> Tuple[SearchParams, np.ndarray]:
+    """Parse + filtro + ordenação de uma query já normalizada.
+
+    Reaproveita o resultado da mesma query nesta versão do estoque; com
+    `params` (já extraídos, ex.: pelo lote), não faz o parse de novo.
+    """
+    with etapa("cache"):
+        em_cache = cache_buscas.obter(snapshot.versao, chave)
+    if em_cache is not None:
+        return em_cache
+    if params is None:
+        vocabulario = snapshot.vocabulario
+        with etapa("parse"):
+            params = extrair_parametros(chave, vocabulario)
+    with etapa("filtro"):
+        linhas = filtrar_linhas(params, snapshot.indice)
+    cache_buscas.guardar(snapshot.versao, chave, (params, linhas))
+    return params, linhas
+
+def mascara_origem(indice: SearchIndex, origens: List[str]) -> np.ndarray:
+    """Linhas de qualquer uma das origens (feeds do XML_URLS) pedidas"""
+    mascara = np.zeros(indice.total, dtype=bool)
+    for origem in origens:
+        mascara |= indice.mascara("origem", normalizar(origem))
+    return mascara
+
+def buscar_linhas(snapshot, chave: str, quantidade: Optional[int] = None, origens: Optional[List[str]] = None,
+                  params: Optional[SearchParams] = None) -> Tuple[SearchParams, List[int], int]:
+    """(parâmetros, top `quantidade` linhas ordenadas, total encontrado)
+
+    Com `origens`, só os veículos desses feeds (o cache continua por query).
+    """
+    params, linhas = linhas_da_busca(snapshot, chave, params)
+    if origens:
+        linhas = linhas[mascara_origem(snapshot.indice, origens)[linhas]]
+    return params, linhas[:quantidade].tolist(), len(linhas)
+
+def facetas_da_busca(snapshot, chave: Optional[str], limite: int = FACETS_MAX_VALORES,
+                     origens: Optional[List[str]] = None) -> Tuple[Optional[SearchParams], int, Dict]:
+    """Facetas do resultado da query (ou do estoque inteiro, sem query)"""
+    params = None
+    if chave:
+        params, linhas = linhas_da_busca(snapshot, chave)
+        if origens:
+            linhas = linhas[mascara_origem(snapshot.indice, origens)[linhas]]
+    elif origens:
+        linhas = np.flatnonzero(mascara_origem(snapshot.indice, origens))
+    else:
+        return None, snapshot.indice.total, snapshot.facetas.contar(limite=limite)
+    return params, len(linhas), snapshot.facetas.contar(linhas, limite)
+
+def referencia_da_busca(similares: SimilarIndex, params: SearchParams, vocabulario: Optional[Vocabulario] = None):
+    """O que a query pediu como ponto de partida dos veículos parecidos.
+
+    Faixas viram o meio; sem categoria, vale a do modelo pedido.
+    """
+    def meio(minimo, maximo):
+        if minimo is not None and maximo is not None:
+            return (minimo + maximo) / 2
+        return minimo if minimo is not None else maximo
+
+    return similares.referencia(
+        preco=params.preco or meio(params.valor_min, params.valor_max),
+        ano=params.ano or params.ano_fabricacao or meio(params.ano_min, params.ano_max),
+        km=params.km if params.km is not None else params.km_max,
+        categoria=params.categoria or (params.modelo and inferir_categoria_por_modelo(params.modelo, vocabulario)),
+        marca=params.marca,
+        combustivel=params.combustivel,
+        transmissao=params.transmissao or params.cambio,
+    )
+
+class VeiculoAmbiguo(Exception):
+    """O id existe em mais de um feed e as `origens` pedidas não dizem qual"""
+
+    def __init__(self, origens: List[str]):
+        super().__init__(origens)
+        self.origens = origens
+
+def linha_do_veiculo(snapshot, id_veiculo: str, origens: Optional[List[str]] = None) -> Optional[int]:
+    """Linha do veículo `id_veiculo` (com `origens`, só desses feeds); None se não está no estoque"""
+    indice = snapshot.indice
+    linhas = indice.linhas_por_id.get(id_veiculo, [])
+    if linhas and origens:
+        mascara = mascara_origem(indice, origens)
+        linhas = [linha for linha in linhas if mascara[linha]]
+    if not linhas:
+        return None
+    # Ids não são únicos entre feeds: sem origem que desempate, não escolhe um por conta própria
+    if len({int(indice.codigos["origem"][linha]) for linha in linhas}) > 1:
+        raise VeiculoAmbiguo(sorted({str(snapshot.veiculos[linha].get("origem")) for linha in linhas}))
+    return linhas[-1]
+
+def veiculos_similares(snapshot, id_veiculo: Optional[str] = None, params: Optional[SearchParams] = None,
+                       k: int = SIMILAR_K, origens: Optional[List[str]] = None) -> Optional[Tuple[List[int], List[float]]]:
+    """(linhas, distâncias) dos k veículos mais parecidos com o veículo `id_veiculo` ou com os `params`.
+
+    None se o veículo não está no estoque (nos feeds de `origens`, quando informadas).
+    """
+    similares = snapshot.similares
+    excluir = None
+    if id_veiculo is not None:
+        excluir = linha_do_veiculo(snapshot, id_veiculo, origens)
+        if excluir is None:
+            return None
+        referencia = similares.referencia_da_linha(excluir)
+    else:
+        referencia = referencia_da_busca(similares, params, snapshot.vocabulario)
+    mascara = mascara_origem(snapshot.indice, origens) if origens else None
+    linhas, distancias = similares.proximos(referencia, k, excluir, mascara)
+    return linhas.tolist(), [round(float(d), 4) for d in distancias]
+
+def similares_do_lote(snapshot, lista_params: List[SearchParams], k: int = SIMILAR_K,
+                      origens: Optional[List[str]] = None) -> List[Tuple[List[int], List[float]]]:
+    """`veiculos_similares` dos params de cada query do lote que ficou sem resultados"""
+    return [veiculos_similares(snapshot, None, params, k, origens) for params in lista_params]
+
+def buscar_lote(snapshot, chaves: List[str], quantidade: Optional[int] = None,
+                origens: Optional[List[str]] = None) -> List[Tuple[SearchParams, List[int], int]]:
+    """`buscar_linhas` para várias queries, pontuando os termos de todas de uma vez.
+
+    As que não estão no cache passam pelo parse uma vez só, juntas.
+    """
+    faltando = [chave for chave in dict.fromkeys(chaves) if not cache_buscas.contem(snapshot.versao, chave)]
+    with etapa("parse"):
+        extraidos = dict(zip(faltando, extrair_parametros_lote(faltando, snapshot.vocabulario)))
+    pre_pontuar(list(extraidos.values()), snapshot.indice)
+    return [buscar_linhas(snapshot, chave, quantidade, origens, extraidos.get(chave)) for chave in chaves]
+
+def _no_processo(funcao, versao: int, *args):
+    """Roda em um processo do pool: usa o snapshot mapeado da mesma versão do pedido"""
+    snapshot = estoque.atual()
+    if snapshot.versao != versao:
+        estoque.carregar_snapshot(SNAPSHOT_FILE)
+        snapshot = estoque.atual()
+        if snapshot.versao != versao:
+            return None
+    return funcao(snapshot, *args)
+
+def no_contexto(funcao):
+    """Roda `funcao` (numa thread) no contexto desta requisição, para as etapas medidas lá voltarem para ela"""
+    return functools.partial(contextvars.copy_context().run, funcao)
+
+def obter_executor():
+    global _executor
+    if _executor is None:
+        if SEARCH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(SEARCH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            _executor = ThreadPoolExecutor(SEARCH_WORKERS, thread_name_prefix="busca")
+    return _executor
+
+async def executar(funcao, snapshot, *args, processo: bool = False):
+    """`funcao(snapshot, *args)` fora do event loop, no executor configurado (SEARCH_EXECUTOR).
+
+    Com SEARCH_EXECUTOR=process, só as funções com `processo` vão para o
+    pool (as outras usam o snapshot deste worker, numa thread); se o
+    processo não tem a versão do snapshot, resolve numa thread deste worker.
+    """
+    if SEARCH_EXECUTOR == "inline":
+        return funcao(snapshot, *args)
+    loop = asyncio.get_running_loop()
+    if SEARCH_EXECUTOR == "process":
+        if processo:
+            resultado = await loop.run_in_executor(obter_executor(), _no_processo, funcao, snapshot.versao, *args)
+            if resultado is not None:
+                return resultado
+        return await loop.run_in_executor(None, no_contexto(funcao), snapshot, *args)
+    return await loop.run_in_executor(obter_executor(), no_contexto(funcao), snapshot, *args)
+
+class ServidorOcupado(Exception):
+    """Limite de buscas simultâneas atingido; `vazio` completa o corpo do 503 no formato do endpoint"""
+
+    def __init__(self, vazio: Dict[str, Any]):
+        super().__init__("Servidor ocupado")
+        self.vazio = vazio
+
+@app.exception_handler(ServidorOcupado)
+async def responder_ocupado(request: Request, exc: ServidorOcupado):
+    return JSONResponse(
+        content={"error": "Servidor ocupado, tente novamente", **exc.vazio},
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
+
+@contextlib.asynccontextmanager
+async def vaga_de_busca(endpoint: str, vazio: Dict[str, Any]):
+    """Ocupa uma das SEARCH_MAX_INFLIGHT vagas; sem vaga, recusa com 503 em vez de enfileirar"""
+    if semaforo_buscas.locked():
+        metrics.BUSCAS_REJEITADAS.incrementar(endpoint)
+        raise ServidorOcupado(vazio)
+    async with semaforo_buscas:
+        yield
 
 @app.post("/api/search-smart")
-async def search_smart(request_data: dict):
+async def search_smart(request_data: dict, request: Request):
+    """Busca inteligente; com "debug_timings": true, devolve o tempo de cada etapa em "timings_ms".
+
+    Etapas: cache, parse, filtro (inclui fuzzy e ordenacao), projecao e
+    serializacao (a compressao fica de fora do timings_ms); com
+    SEARCH_EXECUTOR=process, as etapas que rodam no processo do pool não
+    aparecem (só "busca", o tempo total até a resposta).
+    Com "origem" (lista ou separada por vírgulas), só veículos desses feeds.
+    Sem nenhum resultado, "similares" traz os veículos mais parecidos com o
+    que foi pedido (desligue com "similares": false).
+    """
+    inicio = time.perf_counter()
+    etapas = iniciar_etapas(bool(request_data.get("debug_timings")))
     query = request_data.get("query")
-    if not query:
-        # 1) Query não foi enviada
+    if not isinstance(query, str) or not query:
+        # 1) Query não foi enviada (ou não é texto)
         return JSONResponse(
             content={
                 "error": "Query não informada",
@@ -560,8 +740,33 @@ async def search_smart(request_data: dict):
             status_code=400,
         )
 
-    # 2) Verifica se há dados em disco
-    if not os.path.exists("data.json"):
+    # Paginação e projeção opcionais (sem limit, devolve todos como antes)
+    try:
+        limit, offset, campos, omitir = ler_paginacao(request_data)
+    except (TypeError, ValueError):
+        return JSONResponse(
+            content={
+                "error": "limit/offset inválidos",
+                "resultados": [],
+                "total_encontrado": 0,
+            },
+            status_code=400,
+        )
+    try:
+        origens = ler_origens(request_data)
+    except ValueError:
+        return JSONResponse(
+            content={
+                "error": "origem inválida",
+                "resultados": [],
+                "total_encontrado": 0,
+            },
+            status_code=400,
+        )
+
+    # 2) Pega o snapshot atual do estoque (sem acessar o disco)
+    snapshot = estoque.atual()
+    if snapshot.versao == 0:
         return JSONResponse(
             content={
                 "error": "Nenhum dado disponível",
@@ -571,17 +776,234 @@ async def search_smart(request_data: dict):
             status_code=500,          # ou 404/204, escolha o que fizer sentido
         )
 
-    # 3) Carrega dados do estoque
-    with open("data.json", encoding="utf-8") as f:
-        vehicles = json.load(f)
+    # 3) Extrai parâmetros, filtra e ordena só o necessário para a página pedida (fora do event loop);
+    #    com o limite de buscas simultâneas atingido, recusa com 503 em vez de enfileirar
+    fim = offset + limit if limit is not None else None
+    chave = normalizar_query(query)
+    async with vaga_de_busca("search-smart", {"resultados": [], "total_encontrado": 0}):
+        with etapa("busca"):
+            params, ordenadas, total = await executar(buscar_linhas, snapshot, chave, fim, origens, processo=True)
+        if request_data.get("facets"):
+            with etapa("facetas"):
+                _, _, facetas = await executar(facetas_da_busca, snapshot, chave, FACETS_MAX_VALORES, origens)
+        similares = None
+        if total == 0 and SIMILAR_FALLBACK and request_data.get("similares", True):
+            with etapa("similares"):
+                k = min(limit or SIMILAR_K, SIMILAR_MAX_K)
+                similares, _ = await executar(veiculos_similares, snapshot, None, params, k, origens)
+
+    # 4) Resposta final
+    resposta = montar_resposta(snapshot, params, ordenadas, total, limit, offset, campos, omitir)
+    if request_data.get("facets"):
+        resposta["facets"] = facetas
+    if similares is not None:
+        resposta["similares"] = resultados_json(snapshot, similares, campos, omitir)
+    if etapas is not None:
+        resposta["timings_ms"] = em_milissegundos(etapas)
+        resposta["timings_ms"]["total"] = round((time.perf_counter() - inicio) * 1000, 3)
+    with etapa("serializacao"):
+        corpo = codificar_resposta(resposta)
+    with etapa("compressao"):
+        return resposta_json(corpo, request.headers.get("accept-encoding"))
+
+@app.post("/api/search-smart/batch")
+async def search_smart_batch(request_data: dict, request: Request):
+    """Várias queries numa chamada: um snapshot só e pontuação fuzzy em lote.
+
+    Como no /api/search-smart, cada query sem resultados traz "similares"
+    (desligue com "similares": false, que vale para o lote inteiro).
+    """
+    queries = request_data.get("queries")
+    if not isinstance(queries, list) or not queries or len(queries) > SEARCH_BATCH_MAX:
+        return JSONResponse(
+            content={
+                "error": f"Informe 'queries' como uma lista com 1 a {SEARCH_BATCH_MAX} itens",
+                "respostas": [],
+            },
+            status_code=400,
+        )
+    try:
+        limit, offset, campos, omitir = ler_paginacao(request_data)
+    except (TypeError, ValueError):
+        return JSONResponse(
+            content={"error": "limit/offset inválidos", "respostas": []},
+            status_code=400,
+        )
+    try:
+        origens = ler_origens(request_data)
+    except ValueError:
+        return JSONResponse(
+            content={"error": "origem inválida", "respostas": []},
+            status_code=400,
+        )
+
+    snapshot = estoque.atual()
+    if snapshot.versao == 0:
+        return JSONResponse(
+            content={"error": "Nenhum dado disponível", "respostas": []},
+            status_code=500,
+        )
+
+    validas = [normalizar_query(q) for q in queries if isinstance(q, str) and q.strip()]
+    fim = offset + limit if limit is not None else None
+    async with vaga_de_busca("search-smart/batch", {"respostas": []}):
+        resultados = await executar(buscar_lote, snapshot, validas, fim, origens, processo=True)
+        similares = {}
+        if SIMILAR_FALLBACK and request_data.get("similares", True):
+            vazias = [posicao for posicao, (_, _, total) in enumerate(resultados) if total == 0]
+            if vazias:
+                k = min(limit or SIMILAR_K, SIMILAR_MAX_K)
+                encontrados = await executar(similares_do_lote, snapshot, [resultados[p][0] for p in vazias], k, origens)
+                similares = dict(zip(vazias, encontrados))
+
+    respostas = []
+    posicao = 0
+    for q in queries:
+        if not (isinstance(q, str) and q.strip()):
+            respostas.append({"error": "Query não informada", "resultados": [], "total_encontrado": 0})
+            continue
+        params, ordenadas, total = resultados[posicao]
+        resposta = montar_resposta(snapshot, params, ordenadas, total, limit, offset, campos, omitir)
+        if posicao in similares:
+            resposta["similares"] = resultados_json(snapshot, similares[posicao][0], campos, omitir)
+        resposta["query"] = q
+        respostas.append(resposta)
+        posicao += 1
+    corpo = b'{"respostas":[' + b",".join(codificar_resposta(resposta) for resposta in respostas) + b"]}"
+    return resposta_json(corpo, request.headers.get("accept-encoding"))
+
+@app.get("/api/facets")
+async def facets(request: Request, q: Optional[str] = None, limit: Optional[int] = None,
+                 origem: Optional[str] = None, limite: Optional[int] = None):
+    """Contagens por marca, modelo, categoria, combustível, ano, faixa de preço e origem.
+
+    Com `q`, conta só os veículos que a busca inteligente encontraria; com
+    `origem` (separadas por vírgula), só os desses feeds. `limit` é o máximo
+    de valores por faceta (`limite` ainda é aceito).
+    """
+    limite = primeiro_informado(limit, limite, FACETS_MAX_VALORES)
+    snapshot = estoque.atual()
+    if snapshot.versao == 0:
+        return JSONResponse(content={"error": "Nenhum dado disponível", "facets": {}}, status_code=500)
+    if limite < 1:
+        return JSONResponse(content={"error": "limit inválido", "facets": {}}, status_code=400)
+
+    chave = normalizar_query(q) if q and q.strip() else None
+    async with vaga_de_busca("facets", {"facets": {}}):
+        params, total, facetas = await executar(facetas_da_busca, snapshot, chave, limite, lista_de_campos(origem))
+
+    resposta = {"total_encontrado": total, "facets": facetas}
+    if params is not None:
+        resposta["parametros_detectados"] = params.dict(exclude_none=True)
+    return resposta_json(codificar(resposta), request.headers.get("accept-encoding"))
+
+@app.get("/api/similar/{id_veiculo}")
+async def similar(id_veiculo: str, request: Request, k: int = SIMILAR_K, origem: Optional[str] = None):
+    """Os k veículos mais parecidos com o do `id_veiculo` (preço, ano, km, categoria,
+    marca, combustível e transmissão), do mais perto ao mais longe.
 
-    # 4) Extrai parâmetros e filtra
-    params = extrair_parametros_inteligente(query)
-    resultados = filtrar_veiculos_inteligente(vehicles, params)
+    Com `origem`, o veículo e os resultados são desses feeds; um id que
+    existe em mais de um feed exige `origem` (409 com as origens dele).
+    """
+    snapshot = estoque.atual()
+    if snapshot.versao == 0:
+        return JSONResponse(content={"error": "Nenhum dado disponível", "resultados": []}, status_code=500)
+    if not 1 <= k <= SIMILAR_MAX_K:
+        return JSONResponse(content={"error": "k inválido", "resultados": []}, status_code=400)
 
-    # 5) Resposta final
-    return {
-        "parametros_detectados": params.dict(exclude_none=True),
-        "total_encontrado": len(resultados),
-        "resultados": resultados,
+    try:
+        async with vaga_de_busca("similar", {"resultados": []}):
+            encontrado = await executar(veiculos_similares, snapshot, id_veiculo, None, k, lista_de_campos(origem))
+    except VeiculoAmbiguo as e:
+        return JSONResponse(
+            content={"error": "Veículo em mais de um feed; informe a origem", "origens": e.origens, "resultados": []},
+            status_code=409,
+        )
+    if encontrado is None:
+        return JSONResponse(content={"error": "Veículo não encontrado", "resultados": []}, status_code=404)
+
+    linhas, distancias = encontrado
+    resposta = {
+        "id": id_veiculo,
+        "total_encontrado": len(linhas),
+        "resultados": resultados_json(snapshot, linhas, None, None),
+        "distancias": distancias,
     }
+    return resposta_json(codificar_resposta(resposta), request.headers.get("accept-encoding"))
+
+def sugerir(snapshot, texto: str, limite: int) -> List[Dict[str, Any]]:
+    return snapshot.sugestoes.sugerir(texto, limite)
+
+@app.get("/api/suggest")
+async def suggest(q: str = "", limit: Optional[int] = None, limite: Optional[int] = None):
+    """Sugestões de marca, modelo e título para o que foi digitado até agora ("cor" -> Corolla, Corsa...).
+
+    `limit` é o máximo de sugestões (`limite` ainda é aceito).
+    """
+    limite = primeiro_informado(limit, limite, SUGGEST_MAX)
+    snapshot = estoque.atual()
+    if snapshot.versao == 0:
+        return JSONResponse(content={"error": "Nenhum dado disponível", "sugestoes": []}, status_code=500)
+    if not 1 <= limite <= SUGGEST_MAX_LIMITE:
+        return JSONResponse(content={"error": "limit inválido", "sugestoes": []}, status_code=400)
+    if snapshot.sugestoes_prontas:
+        sugestoes = sugerir(snapshot, q, limite)
+    else:
+        # Snapshot ainda sem autocomplete (ex.: logo após o start): monta fora do event loop, numa vaga de busca
+        async with vaga_de_busca("suggest", {"sugestoes": []}):
+            sugestoes = await executar(sugerir, snapshot, q, limite)
+    return {"q": q, "sugestoes": sugestoes}
+
+def idade_do_snapshot(snapshot) -> Optional[float]:
+    """Segundos desde a última atualização do estoque"""
+    if not snapshot.updated_at:
+        return None
+    try:
+        return round((datetime.now() - datetime.fromisoformat(snapshot.updated_at)).total_seconds(), 1)
+    except ValueError:
+        return None
+
+def tamanho_do_arquivo(caminho: str) -> Optional[int]:
+    try:
+        return os.path.getsize(caminho)
+    except OSError:
+        return None
+
+for _nome, _ajuda, _obter, _tipo in [
+    ("snapshot_versao", "Versão do estoque em uso", lambda: estoque.atual().versao, "gauge"),
+    ("snapshot_veiculos", "Veículos no estoque em uso", lambda: len(estoque.atual()), "gauge"),
+    ("snapshot_idade_segundos", "Segundos desde a última atualização do estoque",
+     lambda: idade_do_snapshot(estoque.atual()), "gauge"),
+    ("snapshot_bytes", "Tamanho do arquivo de snapshot", lambda: tamanho_do_arquivo(SNAPSHOT_FILE), "gauge"),
+    ("busca_cache_hits_total", "Buscas respondidas pelo cache", lambda: cache_buscas.hits, "counter"),
+    ("busca_cache_misses_total", "Buscas que não estavam no cache", lambda: cache_buscas.misses, "counter"),
+    ("busca_cache_evictions_total", "Entradas descartadas do cache por limite", lambda: cache_buscas.evictions, "counter"),
+    ("busca_cache_entradas", "Entradas no cache de buscas", lambda: len(cache_buscas._entradas), "gauge"),
+]:
+    metrics.registro.registrar(metrics.Medidor(_nome, _ajuda, _obter, _tipo))
+
+@app.get("/metrics")
+def metricas():
+    """Métricas deste worker no formato texto do Prometheus"""
+    return PlainTextResponse(metrics.registro.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/ready")
+def ready():
+    """Prontidão do worker: 200 com estoque carregado, 503 enquanto não houver nenhum"""
+    snapshot = estoque.atual()
+    idade = idade_do_snapshot(snapshot)
+    return JSONResponse(
+        content={
+            "pronto": snapshot.versao > 0,
+            "versao": snapshot.versao,
+            "updated_at": snapshot.updated_at,
+            "idade_segundos": idade,
+            "total_veiculos": len(snapshot),
+        },
+        status_code=200 if snapshot.versao > 0 else 503,
+    )
+
+@app.get("/api/search-smart/cache")
+def search_smart_cache():
+    """Contadores do cache de buscas"""
+    return cache_buscas.estatisticas()
@@ -0,0 +1,178 @@
+"""Métricas no formato texto do Prometheus, sem dependências externas.
+
+Cada worker do uvicorn tem os próprios contadores; o /metrics responde com
+os do worker que atendeu a requisição.
+
+`etapa(nome)` mede um trecho do código: o tempo vai para o histograma da
+etapa e, se a requisição pediu `debug_timings`, também para o dicionário
+devolvido por `iniciar_etapas`. Com METRICS_ENABLED=0 e sem debug, `etapa`
+devolve um context manager vazio.
+"""
+import os, threading, time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() not in ("0", "false", "nao", "não")
+
+# Limites (segundos) dos histogramas de duração
+BUCKETS_SEGUNDOS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Limites dos histogramas de quantidade de resultados
+BUCKETS_QUANTIDADE = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+
+
+def _rotulos(nomes: Sequence[str], valores: Tuple[str, ...], extra: str = "") -> str:
+    pares = [f'{nome}="{valor}"' for nome, valor in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if valor != int(valor) else str(int(valor))
+
+
+class Contador:
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, *rotulos: str, valor: float = 1):
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+    def exportar(self) -> List[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} counter"]
+        with self._lock:
+            for rotulos, valor in sorted(self._valores.items()):
+                linhas.append(f"{self.nome}{_rotulos(self.rotulos, rotulos)} {_numero(valor)}")
+        return linhas
+
+
+class Histograma:
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (), buckets: Sequence[float] = BUCKETS_SEGUNDOS):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self.buckets = tuple(buckets)
+        # Por combinação de rótulos: [contagem por bucket (+Inf no fim), soma]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, *rotulos: str):
+        posicao = bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                serie = self._series[rotulos] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][posicao] += 1
+            serie[1] += valor
+
+    def exportar(self) -> List[str]:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} histogram"]
+        with self._lock:
+            for rotulos, (contagens, soma) in sorted(self._series.items()):
+                acumulado = 0
+                for limite, contagem in zip(self.buckets + (float("inf"),), contagens):
+                    acumulado += contagem
+                    le = 'le="+Inf"' if limite == float("inf") else f'le="{_numero(limite)}"'
+                    linhas.append(f"{self.nome}_bucket{_rotulos(self.rotulos, rotulos, le)} {acumulado}")
+                linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, rotulos)} {soma!r}")
+                linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, rotulos)} {acumulado}")
+        return linhas
+
+
+class Medidor:
+    """Valor lido na hora da coleta (idade do snapshot, hits do cache, ...)"""
+
+    def __init__(self, nome: str, ajuda: str, obter: Callable[[], Optional[float]], tipo: str = "gauge"):
+        self.nome, self.ajuda, self.obter, self.tipo = nome, ajuda, obter, tipo
+
+    def exportar(self) -> List[str]:
+        valor = self.obter()
+        if valor is None:
+            return []
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}", f"{self.nome} {_numero(valor)}"]
+
+
+class Registro:
+    def __init__(self):
+        self.metricas: list = []
+
+    def registrar(self, metrica):
+        self.metricas.append(metrica)
+        return metrica
+
+    def exportar(self) -> str:
+        linhas: List[str] = []
+        for metrica in self.metricas:
+            linhas.extend(metrica.exportar())
+        return "\n".join(linhas) + "\n"
+
+
+registro = Registro()
+
+ETAPAS_BUSCA = registro.registrar(Histograma(
+    "busca_etapa_segundos", "Duração de cada etapa da busca inteligente", ("etapa",)))
+ETAPAS_INGESTAO = registro.registrar(Histograma(
+    "ingestao_etapa_segundos", "Duração de cada etapa da ingestão do feed", ("etapa",)))
+RESULTADOS_BUSCA = registro.registrar(Histograma(
+    "busca_resultados", "Veículos encontrados por busca", buckets=BUCKETS_QUANTIDADE))
+BUSCAS_REJEITADAS = registro.registrar(Contador(
+    "busca_rejeitadas_total", "Buscas respondidas com 503 por excesso de requisições simultâneas", ("endpoint",)))
+INGESTOES = registro.registrar(Contador(
+    "ingestao_total", "Ciclos de ingestão do feed por resultado", ("resultado",)))
+INGESTOES_FEED = registro.registrar(Contador(
+    "ingestao_feed_total", "Leituras de cada feed por resultado (XML_URLS)", ("origem", "resultado")))
+
+
+class _Etapa:
+    __slots__ = ("nome", "histograma", "etapas", "inicio")
+
+    def __init__(self, nome: str, histograma: Histograma, etapas: Optional[Dict[str, float]]):
+        self.nome, self.histograma, self.etapas = nome, histograma, etapas
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duracao = time.perf_counter() - self.inicio
+        if self.etapas is not None:
+            self.etapas[self.nome] = self.etapas.get(self.nome, 0.0) + duracao
+        if METRICS_ENABLED:
+            self.histograma.observar(duracao, self.nome)
+        return False
+
+
+class _Nenhuma:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NENHUMA = _Nenhuma()
+_etapas_da_requisicao: ContextVar[Optional[Dict[str, float]]] = ContextVar("etapas_da_requisicao", default=None)
+
+
+def iniciar_etapas(debug: bool) -> Optional[Dict[str, float]]:
+    """Começo de uma requisição: com `debug`, as etapas medidas vão para o dicionário devolvido"""
+    etapas = {} if debug else None
+    _etapas_da_requisicao.set(etapas)
+    return etapas
+
+
+def etapa(nome: str, histograma: Histograma = ETAPAS_BUSCA):
+    etapas = _etapas_da_requisicao.get()
+    if etapas is None and not METRICS_ENABLED:
+        return _NENHUMA
+    return _Etapa(nome, histograma, etapas)
+
+
+def em_milissegundos(etapas: Dict[str, float]) -> Dict[str, float]:
+    return {nome: round(duracao * 1000, 3) for nome, duracao in etapas.items()}
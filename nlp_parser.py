@@ -0,0 +1,205 @@
+"""Parser de queries com spaCy (QUERY_PARSER=spacy).
+
+Um entity ruler montado a partir do vocabulário (marcas e modelos) e de
+padrões de preço, km e ano marca as entidades da query; o resto dos
+parâmetros continua vindo do parser por regex. Como cada entidade é um
+trecho único da frase, "até 80 mil km" vira km e não preço.
+
+O modelo é carregado uma vez por processo, na primeira query, só com o
+tokenizador (os componentes treinados não são usados). Todas as queries
+passam por uma thread que junta as que estão esperando num `nlp.pipe`, com
+um cache de parse na frente.
+"""
+import os, queue, re, threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+from query_cache import QueryCache
+
+SPACY_MODELO = os.getenv("SPACY_MODELO", "pt_core_news_sm")
+# Queries processadas por chamada do nlp.pipe
+SPACY_LOTE_MAX = int(os.getenv("SPACY_LOTE_MAX", "64"))
+SPACY_CACHE_MAX = int(os.getenv("SPACY_CACHE_MAX", "4096"))
+
+# Componentes do modelo que o parser não usa (só o tokenizador interessa)
+COMPONENTES_DESLIGADOS = ["tok2vec", "morphologizer", "parser", "lemmatizer", "attribute_ruler", "ner", "senter"]
+
+QUALIFICADORES_PRECO = ["ate", "até", "max", "maximo", "máximo", "teto", "limite", "por", "valor", "preco", "preço"]
+QUALIFICADORES_KM = ["ate", "até", "max", "maximo", "máximo", "menos", "com", "rodado", "rodados"]
+UNIDADES_KM = ["km", "kms", "quilometros", "quilômetros"]
+
+# Número que não é ano (evita "hilux 2018 km 80000" virar 2018 km)
+NUMERO = {"TEXT": {"REGEX": r"^(?!(?:19|20)\d{2}$)\d+(?:[.,]\d+)*$"}}
+NUMERO_K = {"LOWER": {"REGEX": r"^\d+(?:[.,]\d+)?k$"}}
+ANO = {"TEXT": {"REGEX": r"^(?:19|20)\d{2}$"}}
+
+PADROES = [
+    {"label": "PRECO", "pattern": [
+        {"LOWER": {"IN": QUALIFICADORES_PRECO}, "OP": "+"}, {"LOWER": {"IN": ["de", "r$"]}, "OP": "*"},
+        NUMERO, {"LOWER": {"IN": ["mil", "reais", "real"]}, "OP": "*"}]},
+    {"label": "PRECO", "pattern": [{"LOWER": {"IN": QUALIFICADORES_PRECO}, "OP": "*"}, NUMERO_K]},
+    {"label": "PRECO", "pattern": [{"LOWER": "r$"}, NUMERO, {"LOWER": "mil", "OP": "?"}]},
+    {"label": "PRECO", "pattern": [NUMERO, {"LOWER": {"IN": ["mil", "reais"]}, "OP": "+"}]},
+    {"label": "KM", "pattern": [
+        {"LOWER": {"IN": QUALIFICADORES_KM}, "OP": "*"}, {"LOWER": "de", "OP": "?"},
+        NUMERO, {"LOWER": "mil", "OP": "?"}, {"LOWER": {"IN": UNIDADES_KM}}]},
+    {"label": "KM", "pattern": [{"LOWER": {"IN": QUALIFICADORES_KM}, "OP": "*"}, NUMERO_K, {"LOWER": {"IN": UNIDADES_KM}}]},
+    {"label": "KM", "pattern": [{"LOWER": {"IN": UNIDADES_KM}}, NUMERO, {"LOWER": "mil", "OP": "?"}]},
+    {"label": "ANO", "pattern": [{"LOWER": {"IN": ["ano", "modelo", "de"]}, "OP": "?"}, ANO]},
+]
+
+# Campos do SearchParams que vêm das entidades (os outros ficam com o parser por regex)
+CAMPOS_ENTIDADES = ("marca", "modelo", "preco", "valor_max", "km", "km_max", "ano")
+
+PADRAO_NUMERO = re.compile(r"\d+(?:[.,]\d+)*")
+PADRAO_NAO_PALAVRA = re.compile(r"[^\w]")
+
+
+def numero_da_entidade(tokens: List[str]) -> Optional[float]:
+    """Valor de "até 80 mil", "r$ 200.000", "90k" ou "50 mil km" (ponto é separador de milhar)"""
+    valor = None
+    multiplicador = 1
+    for token in tokens:
+        token = token.lower()
+        encontrado = PADRAO_NUMERO.match(token)
+        if valor is None and encontrado:
+            texto = encontrado.group()
+            if "," in texto:
+                texto = texto.replace(".", "").replace(",", ".")
+            elif texto.count(".") and len(texto.rsplit(".", 1)[1]) == 3:
+                texto = texto.replace(".", "")
+            valor = float(texto)
+            if token.endswith("k"):
+                multiplicador = 1000
+        elif valor is not None and token == "mil":
+            multiplicador = 1000
+    return None if valor is None else valor * multiplicador
+
+
+def entidades_do_doc(doc) -> Dict[str, Any]:
+    """Campos do SearchParams a partir das entidades (a primeira de cada tipo vale)"""
+    campos: Dict[str, Any] = dict.fromkeys(CAMPOS_ENTIDADES)
+    for entidade in doc.ents:
+        rotulo = entidade.label_
+        if rotulo == "MARCA" and campos["marca"] is None:
+            campos["marca"] = entidade.ent_id_.title()
+        elif rotulo == "MODELO" and campos["modelo"] is None:
+            campos["modelo"] = entidade.ent_id_
+        elif rotulo == "ANO" and campos["ano"] is None:
+            campos["ano"] = int(entidade[-1].text)
+        elif rotulo == "PRECO" and campos["preco"] is None:
+            valor = numero_da_entidade([token.text for token in entidade])
+            if valor is not None and valor < 1000:
+                # Ninguém anuncia carro por menos de mil reais: "até 80" é 80 mil
+                valor *= 1000
+            campos["preco"] = campos["valor_max"] = valor
+        elif rotulo == "KM" and campos["km"] is None:
+            campos["km"] = campos["km_max"] = numero_da_entidade([token.text for token in entidade])
+    return campos
+
+
+def normalizar_tokens(doc):
+    """NORM sem pontuação, como o `tokenizar` do vocabulário ("hr-v" casa com "hrv")"""
+    for token in doc:
+        token.norm_ = PADRAO_NAO_PALAVRA.sub("", token.lower_) or token.lower_
+    return doc
+
+
+def carregar_nlp(modelo: str = SPACY_MODELO):
+    """Pipeline só com o tokenizador do modelo; sem o modelo instalado, o tokenizador do português"""
+    import spacy
+    from spacy.language import Language
+
+    if not Language.has_factory("normalizar_tokens"):
+        Language.component("normalizar_tokens", func=normalizar_tokens)
+
+    try:
+        nlp = spacy.load(modelo, exclude=COMPONENTES_DESLIGADOS)
+    except OSError as e:
+        print(f"[AVISO] Modelo spaCy {modelo} indisponível ({e}); usando spacy.blank('pt').")
+        nlp, modelo = spacy.blank("pt"), "blank:pt"
+    for componente in list(nlp.pipe_names):
+        nlp.disable_pipe(componente)
+    nlp.add_pipe("normalizar_tokens")
+    nlp.add_pipe("entity_ruler", config={"phrase_matcher_attr": "NORM", "overwrite_ents": True})
+    print(f"[OK] spaCy carregado ({modelo}).")
+    return nlp
+
+
+class ParserSpacy:
+    """Entidades das queries via spaCy, em lotes, com cache por vocabulário"""
+
+    def __init__(self, modelo: str = SPACY_MODELO):
+        self.modelo = modelo
+        self.cache = QueryCache(max_entradas=SPACY_CACHE_MAX, ttl=0)
+        self._nlp = None
+        self._versao_vocabulario: Optional[int] = None
+        self._fila: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _iniciar(self):
+        # Um processo do pool criado por fork não herda a thread (nem o que estava na fila)
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._fila = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._processar_fila, name="spacy", daemon=True)
+                self._thread.start()
+
+    def _preparar(self, vocabulario):
+        """Carrega o modelo na primeira vez e refaz os padrões quando o vocabulário muda"""
+        if self._nlp is None:
+            self._nlp = carregar_nlp(self.modelo)
+        if self._versao_vocabulario == vocabulario.versao:
+            return
+        ruler = self._nlp.get_pipe("entity_ruler")
+        ruler.clear()
+        padroes = [{"label": "MARCA", "pattern": marca, "id": marca} for marca in vocabulario.nomes_marcas]
+        padroes += [{"label": "MODELO", "pattern": modelo, "id": modelo} for modelo in vocabulario.nomes_modelos]
+        ruler.add_patterns(padroes + PADROES)
+        self._versao_vocabulario = vocabulario.versao
+
+    def _processar_fila(self):
+        fila = self._fila
+        while True:
+            pedidos = [fila.get()]
+            # Junta o que chegou enquanto o lote anterior rodava
+            while len(pedidos) < SPACY_LOTE_MAX:
+                try:
+                    pedidos.append(fila.get_nowait())
+                except queue.Empty:
+                    break
+            por_vocabulario: Dict[int, list] = {}
+            for pedido in pedidos:
+                por_vocabulario.setdefault(pedido[1].versao, []).append(pedido)
+            for grupo in por_vocabulario.values():
+                try:
+                    self._preparar(grupo[0][1])
+                    docs = self._nlp.pipe([query for query, _, _ in grupo], batch_size=SPACY_LOTE_MAX)
+                    for (_, _, futuro), doc in zip(grupo, docs):
+                        futuro.set_result(entidades_do_doc(doc))
+                except Exception as e:
+                    for _, _, futuro in grupo:
+                        if not futuro.done():
+                            futuro.set_exception(e)
+
+    def analisar_lote(self, queries: List[str], vocabulario) -> List[Dict[str, Any]]:
+        """Entidades de cada query; as que não estão no cache vão juntas para o nlp.pipe"""
+        resultados: List[Optional[Dict[str, Any]]] = [self.cache.obter(vocabulario.versao, q) for q in queries]
+        pendentes: Dict[str, Future] = {}
+        for query, resultado in zip(queries, resultados):
+            if resultado is None and query not in pendentes:
+                pendentes[query] = Future()
+        if pendentes:
+            self._iniciar()
+            for query, futuro in pendentes.items():
+                self._fila.put((query, vocabulario, futuro))
+        for posicao, query in enumerate(queries):
+            if resultados[posicao] is None:
+                resultados[posicao] = pendentes[query].result()
+                self.cache.guardar(vocabulario.versao, query, resultados[posicao])
+        return resultados
+
+    def analisar(self, query: str, vocabulario) -> Dict[str, Any]:
+        return self.analisar_lote([query], vocabulario)[0]
@@ -0,0 +1,112 @@
+import os, sys, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+# Limites do cache de buscas (0 desliga o limite correspondente)
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1024"))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))
+
+
+def normalizar_query(query: str) -> str:
+    """Chave do cache: minúsculas e espaços colapsados (o parser já ignora o resto)"""
+    return " ".join(query.lower().split())
+
+
+def estimar_bytes(valor: Any) -> int:
+    """Tamanho aproximado de uma entrada; listas contam só as referências"""
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(estimar_bytes(v) for v in valor if not isinstance(v, dict))
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(estimar_bytes(v) for v in valor.values())
+    return sys.getsizeof(valor)
+
+
+class QueryCache:
+    """Cache LRU com TTL para queries já processadas.
+
+    As entradas pertencem a uma versão do estoque: quando chega uma consulta
+    com outra versão, tudo que foi calculado sobre o snapshot anterior é
+    descartado.
+    """
+
+    def __init__(self, max_entradas: int = SEARCH_CACHE_MAX_ENTRIES, max_bytes: int = SEARCH_CACHE_MAX_BYTES,
+                 ttl: float = SEARCH_CACHE_TTL):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entradas: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._versao: Optional[int] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidacoes = 0
+
+    def _sincronizar_versao(self, versao: int):
+        if versao != self._versao:
+            if self._entradas:
+                self.invalidacoes += 1
+            self._entradas.clear()
+            self._bytes = 0
+            self._versao = versao
+
+    def _remover_mais_antiga(self):
+        _, (_, _, tamanho) = self._entradas.popitem(last=False)
+        self._bytes -= tamanho
+        self.evictions += 1
+
+    def obter(self, versao: int, chave: Hashable) -> Optional[Any]:
+        with self._lock:
+            self._sincronizar_versao(versao)
+            entrada = self._entradas.get(chave)
+            if entrada is None or (self.ttl and time.monotonic() - entrada[1] > self.ttl):
+                if entrada is not None:
+                    del self._entradas[chave]
+                    self._bytes -= entrada[2]
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(chave)
+            self.hits += 1
+            return entrada[0]
+
+    def contem(self, versao: int, chave: Hashable) -> bool:
+        """Se a chave está no cache, sem contar hit/miss nem mexer na ordem do LRU"""
+        with self._lock:
+            if versao != self._versao:
+                return False
+            entrada = self._entradas.get(chave)
+            return entrada is not None and not (self.ttl and time.monotonic() - entrada[1] > self.ttl)
+
+    def guardar(self, versao: int, chave: Hashable, valor: Any):
+        tamanho = estimar_bytes(chave) + estimar_bytes(valor)
+        if self.max_bytes and tamanho > self.max_bytes:
+            return
+        with self._lock:
+            self._sincronizar_versao(versao)
+            anterior = self._entradas.pop(chave, None)
+            if anterior is not None:
+                self._bytes -= anterior[2]
+            self._entradas[chave] = (valor, time.monotonic(), tamanho)
+            self._bytes += tamanho
+            while self._entradas and (
+                (self.max_entradas and len(self._entradas) > self.max_entradas)
+                or (self.max_bytes and self._bytes > self.max_bytes)
+            ):
+                self._remover_mais_antiga()
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "versao_estoque": self._versao,
+                "entradas": len(self._entradas),
+                "bytes_estimados": self._bytes,
+                "max_entradas": self.max_entradas,
+                "max_bytes": self.max_bytes,
+                "ttl_segundos": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidacoes": self.invalidacoes,
+            }
@@ -0,0 +1,328 @@
+import os, threading
+import numpy as np
+from unidecode import unidecode
+from rapidfuzz import fuzz, process
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from attributes import ATRIBUTOS, CAMPO_ORIGEM, canonicalizar, valor_do_veiculo
+from metrics import etapa
+
+# Campos de texto normalizados uma única vez na ingestão
+CAMPOS_TEXTO = ("marca", "modelo", "titulo", "categoria", "cor", "combustivel", "transmissao", "origem")
+
+# Threads usadas pelo rapidfuzz no cálculo em lote (-1 = todos os núcleos)
+FUZZY_WORKERS = int(os.getenv("FUZZY_WORKERS", "-1"))
+
+# Limite de termos memorizados por snapshot antes de descartar o cache
+MAX_PONTUACOES_CACHE = int(os.getenv("MAX_PONTUACOES_CACHE", "4096"))
+
+# A partir deste tamanho as faixas usam busca binária no índice ordenado
+LIMIAR_BUSCA_BINARIA = 5000
+
+
+def normalizar(texto: str) -> str:
+    """Função de normalização mantida do código original"""
+    return unidecode(texto).lower().replace("-", "").replace(" ", "").strip()
+
+
+def converter_preco(valor_str):
+    """Função mantida do código original"""
+    try:
+        return float(str(valor_str).replace(",", "").replace("R$", "").strip())
+    except (ValueError, TypeError):
+        return None
+
+
+def converter_inteiro(valor) -> Optional[int]:
+    try:
+        return int(valor)
+    except (ValueError, TypeError):
+        return None
+
+
+def converter_km(valor) -> Optional[float]:
+    try:
+        return float(str(valor).replace(",", "").replace(".", ""))
+    except (ValueError, TypeError):
+        return None
+
+
+# Conversores das colunas numéricas (valores ausentes ou inválidos viram NaN)
+CONVERSORES_NUMERICOS = {
+    "preco": lambda v: converter_preco(v.get("preco")),
+    "ano": lambda v: converter_inteiro(v.get("ano", 0)),
+    "ano_fabricacao": lambda v: converter_inteiro(v.get("ano_fabricacao")),
+    "km": lambda v: converter_km(v.get("km", "0")),
+    "portas": lambda v: converter_inteiro(v.get("portas")),
+}
+
+
+class SearchIndex:
+    """Índice de busca montado uma vez por snapshot do estoque.
+
+    Guarda os campos já normalizados (valores distintos + código por linha),
+    os valores numéricos já convertidos e um índice invertido (valor
+    normalizado -> linhas) por campo, para que os filtros avaliem cada valor
+    distinto uma vez em vez de cada veículo.
+    Cor, combustível, transmissão, portas e categoria também têm um valor
+    canônico por linha e um bitmap por valor, então combinações desses
+    atributos são só E/OU de máscaras.
+    As pontuações fuzzy de cada (campo, termo) ficam memorizadas enquanto o
+    snapshot estiver em uso.
+
+    Com `anterior`, os veículos que continuam sendo o mesmo objeto do snapshot
+    anterior reaproveitam a normalização e a conversão numérica já feitas; só
+    os adicionados/alterados são processados de novo.
+    """
+
+    def __init__(self, veiculos: List[Dict[str, Any]], anterior: Optional["SearchIndex"] = None):
+        self.total = len(veiculos)
+        self._linha_por_objeto = {id(v): linha for linha, v in enumerate(veiculos)}
+
+        if anterior is not None:
+            origem = [anterior._linha_por_objeto.get(id(v), -1) for v in veiculos]
+        else:
+            origem = [-1] * self.total
+        novas = [linha for linha, anterior_linha in enumerate(origem) if anterior_linha < 0]
+        self.linhas_reaproveitadas = self.total - len(novas)
+
+        # Valores distintos por campo e, por linha, o código do seu valor
+        self.distintos: Dict[str, List[str]] = {}
+        self.codigos: Dict[str, np.ndarray] = {}
+        for campo in CAMPOS_TEXTO:
+            if anterior is not None:
+                antigos, codigos_antigos = anterior.distintos[campo], anterior.codigos[campo]
+                valores = [antigos[codigos_antigos[l]] if l >= 0 else None for l in origem]
+            else:
+                valores = [None] * self.total
+            for linha in novas:
+                valores[linha] = normalizar(str(veiculos[linha].get(CAMPO_ORIGEM.get(campo, campo), "")))
+
+            codigo_por_valor: Dict[str, int] = {}
+            codigos = [codigo_por_valor.setdefault(valor, len(codigo_por_valor)) for valor in valores]
+            self.distintos[campo] = list(codigo_por_valor)
+            self.codigos[campo] = np.array(codigos, dtype=np.int32)
+
+        # Atributos com valor canônico (cor, combustível, ...): código por linha, -1 sem valor
+        self.canonicos: Dict[str, List[str]] = {}
+        self.codigos_atributo: Dict[str, np.ndarray] = {}
+        for campo in ATRIBUTOS:
+            if anterior is not None:
+                antigos, codigos_antigos = anterior.canonicos[campo], anterior.codigos_atributo[campo]
+                valores = [
+                    (antigos[codigos_antigos[l]] if codigos_antigos[l] >= 0 else None) if l >= 0 else None
+                    for l in origem
+                ]
+            else:
+                valores = [None] * self.total
+            for linha in novas:
+                valores[linha] = canonicalizar(campo, valor_do_veiculo(veiculos[linha], campo))
+
+            codigo_por_valor = {}
+            codigos = [-1 if valor is None else codigo_por_valor.setdefault(valor, len(codigo_por_valor))
+                       for valor in valores]
+            self.canonicos[campo] = list(codigo_por_valor)
+            self.codigos_atributo[campo] = np.array(codigos, dtype=np.int16)
+
+        # Colunas numéricas: copia as linhas reaproveitadas e converte só as novas
+        origem_array = np.array(origem, dtype=np.int64)
+        reaproveitadas = origem_array >= 0
+        self.colunas: Dict[str, np.ndarray] = {}
+        for coluna, conversor in CONVERSORES_NUMERICOS.items():
+            valores = np.full(self.total, np.nan, dtype=np.float64)
+            if anterior is not None and reaproveitadas.any():
+                valores[reaproveitadas] = anterior.colunas[coluna][origem_array[reaproveitadas]]
+            for linha in novas:
+                convertido = conversor(veiculos[linha])
+                if convertido is not None:
+                    valores[linha] = convertido
+            self.colunas[coluna] = valores
+
+        self.ids = ["" if v.get("id") is None else str(v.get("id")) for v in veiculos]
+
+        # Índice invertido por campo em formato CSR: linhas agrupadas por código
+        # e o início do grupo de cada código
+        self.linhas_por_codigo: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for campo, codigos in self.codigos.items():
+            ordem = np.argsort(codigos, kind="stable").astype(np.int32)
+            contagens = np.bincount(codigos, minlength=len(self.distintos[campo]))
+            inicio = np.concatenate(([0], np.cumsum(contagens))).astype(np.int64)
+            self.linhas_por_codigo[campo] = (ordem, inicio)
+
+        # Índice ordenado por coluna: (valores ordenados, linhas correspondentes)
+        self.ordenado: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for coluna, valores in self.colunas.items():
+            validas = np.flatnonzero(~np.isnan(valores))
+            ordem = validas[np.argsort(valores[validas], kind="stable")]
+            self.ordenado[coluna] = (valores[ordem], ordem)
+
+        self.preco_ordem = np.nan_to_num(self.colunas["preco"], nan=float('-inf'))
+        self._preparar()
+
+    @classmethod
+    def de_secoes(cls, total: int, distintos: Dict[str, List[str]], codigos: Dict[str, np.ndarray],
+                  colunas: Dict[str, np.ndarray], ids: List[str],
+                  linhas_por_codigo: Dict[str, Tuple[np.ndarray, np.ndarray]],
+                  ordenado: Dict[str, Tuple[np.ndarray, np.ndarray]], preco_ordem: np.ndarray,
+                  canonicos: Dict[str, List[str]], codigos_atributo: Dict[str, np.ndarray]) -> "SearchIndex":
+        """Monta o índice a partir de seções já prontas (ex.: arrays mapeados do arquivo de snapshot)"""
+        indice = cls.__new__(cls)
+        indice.total = total
+        indice._linha_por_objeto = {}
+        indice.linhas_reaproveitadas = 0
+        indice.distintos = distintos
+        indice.codigos = codigos
+        indice.colunas = colunas
+        indice.ids = ids
+        indice.linhas_por_codigo = linhas_por_codigo
+        indice.ordenado = ordenado
+        indice.preco_ordem = preco_ordem
+        indice.canonicos = canonicos
+        indice.codigos_atributo = codigos_atributo
+        indice._preparar()
+        return indice
+
+    def _preparar(self):
+        self.codigo_por_valor: Dict[str, Dict[str, int]] = {
+            campo: {valor: codigo for codigo, valor in enumerate(distintos)}
+            for campo, distintos in self.distintos.items()
+        }
+        # Um bitmap (máscara de linhas) por valor canônico de cada atributo
+        self.bitmaps: Dict[str, Dict[str, np.ndarray]] = {
+            campo: {
+                valor: mascara
+                for valor, mascara in zip(valores, self.codigos_atributo[campo] == np.arange(len(valores))[:, None])
+            }
+            for campo, valores in self.canonicos.items()
+        }
+        self._linhas_por_id: Optional[Dict[str, List[int]]] = None
+        self._pontuacoes: Dict[Tuple[str, str, float], np.ndarray] = {}
+        self._pontuacoes_lock = threading.Lock()
+
+    @property
+    def linhas_por_id(self) -> Dict[str, List[int]]:
+        """Linhas de cada id (feeds diferentes podem usar o mesmo id)"""
+        if self._linhas_por_id is None:
+            linhas_por_id: Dict[str, List[int]] = {}
+            for linha, id_veiculo in enumerate(self.ids):
+                linhas_por_id.setdefault(id_veiculo, []).append(linha)
+            self._linhas_por_id = linhas_por_id
+        return self._linhas_por_id
+
+    def valor_normalizado(self, campo: str, linha: int) -> str:
+        return self.distintos[campo][self.codigos[campo][linha]]
+
+    def _linhas_dos_codigos(self, campo: str, codigos: Iterable[int]) -> Set[int]:
+        ordem, inicio = self.linhas_por_codigo[campo]
+        resultado: Set[int] = set()
+        for codigo in codigos:
+            resultado.update(ordem[inicio[codigo]:inicio[codigo + 1]].tolist())
+        return resultado
+
+    def linhas(self, campo: str, valor: str) -> Set[int]:
+        """Linhas cujo campo normalizado é exatamente `valor`"""
+        codigo = self.codigo_por_valor[campo].get(valor)
+        return set() if codigo is None else self._linhas_dos_codigos(campo, [codigo])
+
+    def valores(self, campo: str) -> Iterable[str]:
+        return self.distintos[campo]
+
+    def pontuacoes(self, campo: str, termos: Sequence[str], corte: float) -> Dict[str, np.ndarray]:
+        """partial_ratio de cada termo contra os valores distintos do campo.
+
+        Os termos ainda não memorizados são pontuados de uma vez com
+        `process.cdist`; valores abaixo de `corte` ficam com 0.
+        """
+        resultado = {}
+        faltando = []
+        for termo in termos:
+            memorizado = self._pontuacoes.get((campo, termo, corte))
+            if memorizado is None:
+                faltando.append(termo)
+            else:
+                resultado[termo] = memorizado
+
+        if faltando:
+            faltando = list(dict.fromkeys(faltando))
+            distintos = self.distintos[campo]
+            if distintos:
+                with etapa("fuzzy"):
+                    matriz = process.cdist(
+                        faltando, distintos, scorer=fuzz.partial_ratio,
+                        score_cutoff=corte, dtype=np.float64, workers=FUZZY_WORKERS
+                    )
+            else:
+                matriz = np.zeros((len(faltando), 0), dtype=np.float64)
+
+            with self._pontuacoes_lock:
+                if len(self._pontuacoes) + len(faltando) > MAX_PONTUACOES_CACHE:
+                    self._pontuacoes.clear()
+                for termo, linha in zip(faltando, matriz):
+                    self._pontuacoes[(campo, termo, corte)] = linha
+                    resultado[termo] = linha
+
+        return resultado
+
+    def pontuacao(self, campo: str, termo: str, corte: float) -> np.ndarray:
+        """Pontuação do termo por valor distinto (indexada pelos códigos do campo)"""
+        return self.pontuacoes(campo, [termo], corte)[termo]
+
+    def linhas_aceitas(self, campo: str, termo: str, corte: float) -> Set[int]:
+        """Linhas cujo valor atinge o corte (termo contido no valor sempre pontua 100)"""
+        return self._linhas_dos_codigos(campo, np.flatnonzero(self.pontuacao(campo, termo, corte) >= corte).tolist())
+
+    def mascara(self, campo: str, valor: str) -> np.ndarray:
+        """Máscara das linhas cujo campo normalizado é exatamente `valor`"""
+        codigo = self.codigo_por_valor[campo].get(valor)
+        if codigo is None:
+            return np.zeros(self.total, dtype=bool)
+        return self.codigos[campo] == codigo
+
+    def pontuacao_por_linha(self, campo: str, termo: str, corte: float) -> np.ndarray:
+        """Pontuação do termo em cada linha (0 abaixo do corte)"""
+        return self.pontuacao(campo, termo, corte)[self.codigos[campo]]
+
+    def mascara_aceita(self, campo: str, termo: str, corte: float) -> np.ndarray:
+        """Máscara das linhas cujo valor atinge o corte"""
+        return (self.pontuacao(campo, termo, corte) >= corte)[self.codigos[campo]]
+
+    def bitmap(self, campo: str, *valores: str) -> np.ndarray:
+        """Linhas com qualquer um dos valores canônicos do atributo (OU dos bitmaps)"""
+        mascara = np.zeros(self.total, dtype=bool)
+        for valor in valores:
+            bits = self.bitmaps[campo].get(valor)
+            if bits is not None:
+                mascara |= bits
+        return mascara
+
+    def contagem_atributo(self, campo: str, mascara: Optional[np.ndarray] = None) -> Dict[str, int]:
+        """Quantas linhas (dentro da máscara, se houver) têm cada valor canônico"""
+        codigos = self.codigos_atributo[campo]
+        if mascara is not None:
+            codigos = codigos[mascara]
+        contagens = np.bincount(codigos[codigos >= 0], minlength=len(self.canonicos[campo]))
+        return {valor: int(n) for valor, n in zip(self.canonicos[campo], contagens) if n}
+
+    def mascara_intervalo(self, coluna: str, minimo: Optional[float] = None, maximo: Optional[float] = None) -> np.ndarray:
+        """Máscara das linhas com minimo <= coluna <= maximo (NaN nunca entra)"""
+        if self.total >= LIMIAR_BUSCA_BINARIA:
+            ordenados, linhas = self.ordenado[coluna]
+            inicio = 0 if minimo is None else np.searchsorted(ordenados, minimo, side="left")
+            fim = len(ordenados) if maximo is None else np.searchsorted(ordenados, maximo, side="right")
+            mascara = np.zeros(self.total, dtype=bool)
+            mascara[linhas[inicio:fim]] = True
+            return mascara
+
+        valores = self.colunas[coluna]
+        mascara = ~np.isnan(valores)
+        if minimo is not None:
+            mascara &= valores >= minimo
+        if maximo is not None:
+            mascara &= valores <= maximo
+        return mascara
+
+    def mascara_intervalos(self, faixas: Dict[str, Tuple[Optional[float], Optional[float]]]) -> np.ndarray:
+        """Combina várias faixas numéricas em uma única máscara"""
+        mascara = np.ones(self.total, dtype=bool)
+        for coluna, (minimo, maximo) in faixas.items():
+            mascara &= self.mascara_intervalo(coluna, minimo, maximo)
+        return mascara
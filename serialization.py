@@ -0,0 +1,105 @@
+"""Serialização das respostas de busca com orjson e compressão negociada.
+
+Os veículos chegam à resposta como fragmentos JSON já codificados (do
+snapshot mapeado ou codificados uma vez por snapshot); a resposta é montada
+concatenando os fragmentos, sem passar pelo jsonable_encoder.
+"""
+import gzip, os
+import orjson
+from typing import Any, Dict, List, Optional, Tuple
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # sem o pacote brotli, só gzip
+    brotli = None
+
+# Corpos menores que isso vão sem compressão
+COMPRESSAO_MIN_BYTES = int(os.getenv("COMPRESSAO_MIN_BYTES", "1024"))
+GZIP_NIVEL = int(os.getenv("GZIP_NIVEL", "5"))
+BROTLI_QUALIDADE = int(os.getenv("BROTLI_QUALIDADE", "4"))
+
+# Com 0, cada resposta codifica os veículos de novo (sem guardar fragmentos no snapshot)
+RESPOSTA_FRAGMENTOS = os.getenv("RESPOSTA_FRAGMENTOS", "1").lower() not in ("0", "false", "nao", "não")
+
+OPCOES_ORJSON = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def codificar(valor: Any) -> bytes:
+    return orjson.dumps(valor, option=OPCOES_ORJSON)
+
+
+class ListaJSON:
+    """Lista cujos itens já são JSON codificado (entra na resposta como está)"""
+
+    __slots__ = ("itens",)
+
+    def __init__(self, itens: List[bytes]):
+        self.itens = itens
+
+    def codificar(self) -> bytes:
+        return b"[" + b",".join(self.itens) + b"]"
+
+
+def codificar_resposta(resposta: Dict[str, Any]) -> bytes:
+    """JSON de uma resposta cujos valores de primeiro nível podem ser `ListaJSON`"""
+    partes = []
+    for chave, valor in resposta.items():
+        corpo = valor.codificar() if isinstance(valor, ListaJSON) else codificar(valor)
+        partes.append(codificar(chave) + b":" + corpo)
+    return b"{" + b",".join(partes) + b"}"
+
+
+def escolher_codificacao(accept_encoding: Optional[str]) -> Optional[str]:
+    """"br" ou "gzip" conforme o Accept-Encoding (respeita q=0); None para identidade"""
+    if not accept_encoding:
+        return None
+    aceitas: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        nome, _, parametros = item.strip().partition(";")
+        peso = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                peso = float(parametros[2:])
+            except ValueError:
+                peso = 0.0
+        aceitas[nome.strip().lower()] = peso
+    disponiveis = ("br", "gzip") if brotli is not None else ("gzip",)
+    melhor, melhor_peso = None, 0.0
+    for nome in disponiveis:
+        peso = aceitas.get(nome, aceitas.get("*", 0.0))
+        if peso > melhor_peso:
+            melhor, melhor_peso = nome, peso
+    return melhor
+
+
+def comprimir(corpo: bytes, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """(corpo, Content-Encoding); corpos pequenos ficam como estão"""
+    if len(corpo) < COMPRESSAO_MIN_BYTES:
+        return corpo, None
+    codificacao = escolher_codificacao(accept_encoding)
+    if codificacao == "br":
+        return brotli.compress(corpo, quality=BROTLI_QUALIDADE), codificacao
+    if codificacao == "gzip":
+        return gzip.compress(corpo, compresslevel=GZIP_NIVEL, mtime=0), codificacao
+    return corpo, None
+
+
+def resposta_json(corpo: bytes, accept_encoding: Optional[str] = None, status_code: int = 200,
+                  headers: Optional[Dict[str, str]] = None) -> Response:
+    """Resposta com o JSON já codificado, comprimido se o cliente aceitar"""
+    corpo, codificacao = comprimir(corpo, accept_encoding)
+    headers = dict(headers or {}, Vary="Accept-Encoding")
+    if codificacao:
+        headers["Content-Encoding"] = codificacao
+    return Response(corpo, status_code=status_code, headers=headers, media_type="application/json")
+
+
+class RespostaJSON(Response):
+    """JSONResponse com orjson, para os endpoints que devolvem dicts"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return codificar(content)
@@ -0,0 +1,157 @@
+import os
+import numpy as np
+from typing import Optional, Tuple
+from attributes import canonicalizar
+from search_index import SearchIndex, normalizar
+
+# Vizinhos devolvidos quando a requisição não informa k (e o máximo aceito)
+SIMILAR_K = int(os.getenv("SIMILAR_K", "10"))
+SIMILAR_MAX_K = int(os.getenv("SIMILAR_MAX_K", "50"))
+
+# A partir deste tamanho do estoque a busca começa pela partição da categoria
+SIMILAR_LIMIAR_PARTICAO = int(os.getenv("SIMILAR_LIMIAR_PARTICAO", "20000"))
+
+NUMERICAS = ("preco", "ano", "km")
+CATEGORICAS = ("categoria", "marca", "combustivel", "transmissao")
+
+# Peso de cada atributo na distância: numéricos em desvios-padrão (preço em
+# escala log), categóricos somam o peso inteiro quando o valor é diferente
+PESOS = {
+    "preco": 2.0, "ano": 1.0, "km": 1.0,
+    "categoria": 2.0, "marca": 1.0, "combustivel": 0.75, "transmissao": 0.75,
+}
+
+# (valores numéricos, quais existem, códigos categóricos, quais existem)
+Referencia = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+class SimilarIndex:
+    """Matriz de atributos para "veículos parecidos", montada uma vez por snapshot.
+
+    Preço, ano e km ficam padronizados e já multiplicados pelo peso; marca,
+    categoria, combustível e transmissão são os códigos do índice de busca.
+    A distância de uma referência a todo o estoque são poucas operações
+    vetorizadas. Em estoques grandes, as linhas ficam agrupadas por categoria:
+    se os k melhores da mesma categoria já estão mais perto que o peso da
+    categoria, nenhuma linha de outra categoria pode passar na frente deles.
+    """
+
+    def __init__(self, indice: SearchIndex):
+        self.indice = indice
+        self.total = indice.total
+        self.centro, self.escala = {}, {}
+
+        colunas, validas = [], []
+        for campo in NUMERICAS:
+            valores = self._escala_bruta(campo, indice.colunas[campo].astype(np.float64))
+            presentes = ~np.isnan(valores)
+            centro = float(np.median(valores[presentes])) if presentes.any() else 0.0
+            escala = float(np.std(valores[presentes])) if presentes.any() else 0.0
+            self.centro[campo], self.escala[campo] = centro, escala or 1.0
+            colunas.append(np.where(presentes, self._padronizar(campo, valores), 0.0))
+            validas.append(presentes)
+        self.numericas = np.column_stack(colunas).astype(np.float32)
+        self.numericas_validas = np.column_stack(validas)
+
+        codigos = []
+        for campo in CATEGORICAS:
+            if campo == "marca":
+                marca = indice.codigos["marca"].astype(np.int32)
+                vazio = indice.codigo_por_valor["marca"].get("")
+                codigos.append(np.where(marca == vazio, -1, marca) if vazio is not None else marca)
+            else:
+                codigos.append(indice.codigos_atributo[campo].astype(np.int32))
+        self.categoricas = np.column_stack(codigos)
+        self.pesos_categoricos = np.array([PESOS[campo] ** 2 for campo in CATEGORICAS], dtype=np.float32)
+
+        # Partições por categoria (CSR): linhas ordenadas pelo código e início de cada código
+        categoria = self.categoricas[:, 0]
+        self.ordem_categoria = np.argsort(categoria, kind="stable")
+        self.inicio_categoria = np.searchsorted(
+            categoria[self.ordem_categoria], np.arange(-1, len(indice.canonicos["categoria"]) + 1)
+        )
+
+    @staticmethod
+    def _escala_bruta(campo: str, valores: np.ndarray) -> np.ndarray:
+        if campo == "preco":
+            # Preço zerado é preço ausente; diferença de preço conta em proporção
+            return np.log(np.where(valores > 0, valores, np.nan))
+        return valores
+
+    def _padronizar(self, campo: str, valores):
+        return (valores - self.centro[campo]) / self.escala[campo] * PESOS[campo]
+
+    def referencia_da_linha(self, linha: int) -> Referencia:
+        codigos = self.categoricas[linha]
+        return self.numericas[linha], self.numericas_validas[linha], codigos, codigos >= 0
+
+    def referencia(self, preco: Optional[float] = None, ano: Optional[float] = None, km: Optional[float] = None,
+                   categoria: Optional[str] = None, marca: Optional[str] = None,
+                   combustivel: Optional[str] = None, transmissao: Optional[str] = None) -> Referencia:
+        """Referência a partir de valores soltos (ex.: o que a query pediu); o que faltar não pesa"""
+        numericas = np.zeros(len(NUMERICAS), dtype=np.float32)
+        validas = np.zeros(len(NUMERICAS), dtype=bool)
+        for posicao, (campo, valor) in enumerate(zip(NUMERICAS, (preco, ano, km))):
+            if valor is None:
+                continue
+            bruto = float(self._escala_bruta(campo, np.array([valor], dtype=np.float64))[0])
+            if not np.isnan(bruto):
+                numericas[posicao], validas[posicao] = self._padronizar(campo, bruto), True
+
+        codigos = np.full(len(CATEGORICAS), -1, dtype=np.int32)
+        for posicao, (campo, valor) in enumerate(zip(CATEGORICAS, (categoria, marca, combustivel, transmissao))):
+            if not valor:
+                continue
+            if campo == "marca":
+                codigo = self.indice.codigo_por_valor["marca"].get(normalizar(valor))
+            else:
+                canonico = canonicalizar(campo, valor)
+                canonicos = self.indice.canonicos[campo]
+                codigo = canonicos.index(canonico) if canonico in canonicos else None
+            if codigo is not None:
+                codigos[posicao] = codigo
+        return numericas, validas, codigos, codigos >= 0
+
+    def distancias(self, referencia: Referencia, linhas: Optional[np.ndarray] = None) -> np.ndarray:
+        """Distância ao quadrado da referência a cada linha (todas, sem `linhas`)"""
+        numericas, validas, codigos, presentes = referencia
+        matriz = self.numericas if linhas is None else self.numericas[linhas]
+        categoricas = self.categoricas if linhas is None else self.categoricas[linhas]
+        distancias = ((matriz[:, validas] - numericas[validas]) ** 2).sum(axis=1)
+        distancias += ((categoricas[:, presentes] != codigos[presentes]) * self.pesos_categoricos[presentes]).sum(axis=1)
+        return distancias
+
+    def proximos(self, referencia: Referencia, k: int = SIMILAR_K, excluir: Optional[int] = None,
+                 mascara: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(linhas, distâncias) dos k vizinhos mais próximos, do mais perto ao mais longe.
+
+        `excluir` tira uma linha (a do próprio veículo); `mascara` limita as candidatas.
+        """
+        _, validas, codigos, presentes = referencia
+        if not (validas.any() or presentes.any()) or k < 1:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if self.total >= SIMILAR_LIMIAR_PARTICAO and presentes[0]:
+            codigo = codigos[0] + 1
+            particao = self.ordem_categoria[self.inicio_categoria[codigo]:self.inicio_categoria[codigo + 1]]
+            linhas, distancias = self._melhores(referencia, particao, k, excluir, mascara)
+            if len(linhas) == k and distancias[-1] <= self.pesos_categoricos[0]:
+                return linhas, np.sqrt(distancias)
+        linhas, distancias = self._melhores(referencia, None, k, excluir, mascara)
+        return linhas, np.sqrt(distancias)
+
+    def _melhores(self, referencia: Referencia, linhas: Optional[np.ndarray], k: int,
+                  excluir: Optional[int], mascara: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        distancias = self.distancias(referencia, linhas)
+        if linhas is None:
+            linhas = np.arange(self.total)
+        candidatas = np.ones(len(linhas), dtype=bool) if mascara is None else mascara[linhas]
+        if excluir is not None:
+            candidatas &= linhas != excluir
+        linhas, distancias = linhas[candidatas], distancias[candidatas]
+        if len(linhas) > k:
+            melhores = np.argpartition(distancias, k - 1)[:k]
+            linhas, distancias = linhas[melhores], distancias[melhores]
+        # Do mais perto ao mais longe; empates pela linha
+        ordem = np.lexsort((linhas, distancias))
+        return linhas[ordem], distancias[ordem]
@@ -0,0 +1,196 @@
+import json, mmap, os, struct
+import numpy as np
+import orjson
+from collections.abc import Sequence
+from typing import Any, Dict, List, Optional, Tuple
+from search_index import SearchIndex
+from vehicle import Veiculo
+
+# Arquivo binário do snapshot:
+#   MAGIC | seções alinhadas (arrays NumPy crus e tabelas de strings) | cabeçalho JSON | offset do cabeçalho | MAGIC
+# Os arrays são lidos direto do mmap, então vários workers que abrem o mesmo
+# arquivo compartilham as mesmas páginas de memória.
+MAGIC = b"APISNAP1"
+FORMATO = 3
+ALINHAMENTO = 64
+
+
+class TabelaStrings(Sequence):
+    """Strings UTF-8 guardadas em sequência no mmap, decodificadas sob demanda"""
+
+    def __init__(self, buffer, base: int, offsets: np.ndarray):
+        self._buffer = buffer
+        self._base = base
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _bytes(self, i: int) -> bytes:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._buffer[self._base + int(self._offsets[i]):self._base + int(self._offsets[i + 1])]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self._bytes(i).decode("utf-8")
+
+
+class VeiculosMapeados(TabelaStrings):
+    """Veículos do snapshot (um JSON compacto por veículo) decodificados sob demanda"""
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return Veiculo(orjson.loads(self._bytes(i)))
+
+    def bruto(self, i: int) -> bytes:
+        """JSON do veículo como está no arquivo (vai direto para a resposta)"""
+        return self._bytes(i)
+
+
+class _Escritor:
+    def __init__(self, f):
+        self.f = f
+        self.secoes: Dict[str, Dict[str, Any]] = {}
+
+    def alinhar(self):
+        resto = self.f.tell() % ALINHAMENTO
+        if resto:
+            self.f.write(b"\0" * (ALINHAMENTO - resto))
+
+    def array(self, nome: str, valores: np.ndarray):
+        valores = np.ascontiguousarray(valores)
+        self.alinhar()
+        self.secoes[nome] = {"offset": self.f.tell(), "dtype": valores.dtype.str, "shape": list(valores.shape)}
+        self.f.write(valores.tobytes())
+
+    def strings(self, nome: str, valores, codificar=lambda valor: valor.encode("utf-8")):
+        """Grava os itens um a um (sem montar o blob inteiro em memória) e depois os offsets"""
+        offsets = np.zeros(len(valores) + 1, dtype=np.uint64)
+        self.alinhar()
+        base = self.f.tell()
+        posicao = 0
+        for i, valor in enumerate(valores):
+            dados = codificar(valor)
+            self.f.write(dados)
+            posicao += len(dados)
+            offsets[i + 1] = posicao
+        self.secoes[nome + ".dados"] = {"offset": base, "dtype": "|u1", "shape": [posicao]}
+        self.array(nome + ".offsets", offsets)
+
+
+def _codificar_veiculo(veiculo: Dict[str, Any]) -> bytes:
+    return orjson.dumps(veiculo)
+
+
+def salvar_snapshot(veiculos, updated_at: Optional[str], versao: int, indice: SearchIndex, caminho: str):
+    """Grava o snapshot com os índices prontos; o arquivo só aparece completo (temp + rename)"""
+    temporario = caminho + ".tmp"
+    with open(temporario, "wb") as f:
+        f.write(MAGIC)
+        escritor = _Escritor(f)
+        escritor.strings("veiculos", veiculos, _codificar_veiculo)
+        escritor.strings("ids", indice.ids)
+
+        for campo, distintos in indice.distintos.items():
+            escritor.strings(f"texto.{campo}.distintos", distintos)
+            escritor.array(f"texto.{campo}.codigos", indice.codigos[campo])
+            ordem, inicio = indice.linhas_por_codigo[campo]
+            escritor.array(f"texto.{campo}.linhas", ordem)
+            escritor.array(f"texto.{campo}.inicio", inicio)
+
+        for campo, canonicos in indice.canonicos.items():
+            escritor.strings(f"atributo.{campo}.valores", canonicos)
+            escritor.array(f"atributo.{campo}.codigos", indice.codigos_atributo[campo])
+
+        for coluna, valores in indice.colunas.items():
+            escritor.array(f"coluna.{coluna}", valores)
+            ordenados, linhas = indice.ordenado[coluna]
+            escritor.array(f"coluna.{coluna}.ordenados", ordenados)
+            escritor.array(f"coluna.{coluna}.linhas", linhas)
+        escritor.array("preco_ordem", indice.preco_ordem)
+
+        escritor.alinhar()
+        posicao_cabecalho = f.tell()
+        f.write(json.dumps({
+            "formato": FORMATO,
+            "versao": versao,
+            "updated_at": updated_at,
+            "total": indice.total,
+            "campos": list(indice.distintos),
+            "colunas": list(indice.colunas),
+            "atributos": list(indice.canonicos),
+            "secoes": escritor.secoes,
+        }).encode("utf-8"))
+        f.write(struct.pack("<Q", posicao_cabecalho))
+        f.write(MAGIC)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+
+
+def carregar_snapshot(caminho: str) -> Optional[Tuple[VeiculosMapeados, Optional[str], int, SearchIndex]]:
+    """Mapeia o arquivo em memória e monta (veículos, updated_at, versão, índice) sem copiar os arrays"""
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    fim = len(buffer) - len(MAGIC) - 8
+    if fim < len(MAGIC) or buffer[:len(MAGIC)] != MAGIC or buffer[-len(MAGIC):] != MAGIC:
+        raise ValueError(f"{caminho} não é um snapshot válido")
+    (posicao_cabecalho,) = struct.unpack_from("<Q", buffer, fim)
+    cabecalho = json.loads(buffer[posicao_cabecalho:fim])
+    if cabecalho.get("formato") != FORMATO:
+        raise ValueError(f"Formato de snapshot não suportado: {cabecalho.get('formato')}")
+    secoes = cabecalho["secoes"]
+
+    def array(nome: str) -> np.ndarray:
+        secao = secoes[nome]
+        quantidade = int(np.prod(secao["shape"])) if secao["shape"] else 1
+        return np.frombuffer(buffer, dtype=np.dtype(secao["dtype"]), count=quantidade,
+                             offset=secao["offset"]).reshape(secao["shape"])
+
+    def tabela(nome: str, classe=TabelaStrings):
+        return classe(buffer, secoes[nome + ".dados"]["offset"], array(nome + ".offsets"))
+
+    campos: List[str] = cabecalho["campos"]
+    colunas: List[str] = cabecalho["colunas"]
+    atributos: List[str] = cabecalho["atributos"]
+    indice = SearchIndex.de_secoes(
+        total=cabecalho["total"],
+        distintos={campo: list(tabela(f"texto.{campo}.distintos")) for campo in campos},
+        codigos={campo: array(f"texto.{campo}.codigos") for campo in campos},
+        colunas={coluna: array(f"coluna.{coluna}") for coluna in colunas},
+        ids=tabela("ids"),
+        linhas_por_codigo={
+            campo: (array(f"texto.{campo}.linhas"), array(f"texto.{campo}.inicio")) for campo in campos
+        },
+        ordenado={
+            coluna: (array(f"coluna.{coluna}.ordenados"), array(f"coluna.{coluna}.linhas")) for coluna in colunas
+        },
+        preco_ordem=array("preco_ordem"),
+        canonicos={campo: list(tabela(f"atributo.{campo}.valores")) for campo in atributos},
+        codigos_atributo={campo: array(f"atributo.{campo}.codigos") for campo in atributos},
+    )
+    return tabela("veiculos", VeiculosMapeados), cabecalho.get("updated_at"), cabecalho.get("versao", 0), indice
+
+
+def gravar_versao(caminho: str, versao: int, updated_at: Optional[str]):
+    """Arquivo pequeno ao lado do snapshot que os seguidores consultam para saber se ele mudou"""
+    temporario = caminho + ".versao.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        f.write(f"{versao} {updated_at or ''}\n")
+    os.replace(temporario, caminho + ".versao")
+
+
+def ler_versao(caminho: str) -> Optional[str]:
+    try:
+        with open(caminho + ".versao", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
@@ -0,0 +1,175 @@
+import os, re
+import numpy as np
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from unidecode import unidecode
+from search_index import SearchIndex
+
+# Sugestões devolvidas quando a requisição não informa o limite (e o máximo aceito)
+SUGGEST_MAX = int(os.getenv("SUGGEST_MAX", "8"))
+SUGGEST_MAX_LIMITE = int(os.getenv("SUGGEST_MAX_LIMITE", "20"))
+
+# Prefixos com até esse tamanho têm as melhores sugestões já calculadas
+SUGGEST_PREFIXO_CACHE = int(os.getenv("SUGGEST_PREFIXO_CACHE", "3"))
+
+# Fração mínima dos trigramas da query que um termo precisa ter para sugestão com erro de digitação
+SUGGEST_SIMILARIDADE_MIN = float(os.getenv("SUGGEST_SIMILARIDADE_MIN", "0.6"))
+
+# Títulos entram no prefixo pelas primeiras palavras (marca/modelo entram por todas)
+PALAVRAS_TITULO = 3
+
+# Campos sugeridos, na ordem de desempate
+TIPOS = ("marca", "modelo", "titulo")
+
+PADRAO_PALAVRA = re.compile(r"[a-z0-9]+")
+
+
+def palavras(texto: str) -> List[str]:
+    return PADRAO_PALAVRA.findall(unidecode(texto).lower())
+
+
+def chave_de(texto: str) -> str:
+    """Texto sem acentos, maiúsculas, espaços e pontuação ("T-Cross" e "tcross" viram a mesma chave)"""
+    return "".join(palavras(texto))
+
+
+def trigramas(chave: str) -> List[str]:
+    # O espaço no começo faz o início do termo pesar (" co" de "corolla")
+    chave = " " + chave
+    return list(dict.fromkeys(chave[i:i + 3] for i in range(len(chave) - 2)))
+
+
+class SuggestIndex:
+    """Autocomplete sobre as marcas, modelos e títulos do snapshot.
+
+    Cada termo distinto entra num array ordenado de chaves (uma por início
+    de palavra), então um prefixo é um intervalo achado por busca binária;
+    prefixos curtos, cujos intervalos são grandes, já têm as melhores
+    sugestões prontas. Quando o prefixo não rende sugestões suficientes, um
+    índice de trigramas cobre erros de digitação ("corola"). A ordem é pela
+    quantidade de veículos em estoque.
+
+    Com `anterior`, os termos que já existiam reaproveitam rótulo, chaves e
+    trigramas; só os novos são processados. A tabela de trigramas guarda só
+    os dos termos atuais (os de termos que saíram do estoque são descartados).
+    """
+
+    def __init__(self, indice: SearchIndex, veiculos: Sequence[Dict[str, Any]], anterior: Optional["SuggestIndex"] = None):
+        self._por_termo: Dict[Tuple[str, str], Tuple[str, List[str], np.ndarray]] = {}
+        self._trigramas: Dict[str, int] = dict(anterior._trigramas) if anterior is not None else {}
+        reaproveitar = anterior._por_termo if anterior is not None else {}
+
+        rotulos, tipos, contagens, chaves, trigramas_por_termo, termos = [], [], [], [], [], []
+        for prioridade, campo in enumerate(TIPOS):
+            ordem, inicio = indice.linhas_por_codigo[campo]
+            quantidades = np.diff(inicio)
+            for codigo, normalizado in enumerate(indice.distintos[campo]):
+                if not normalizado or not quantidades[codigo]:
+                    continue
+                termo = reaproveitar.get((campo, normalizado))
+                if termo is None:
+                    termo = self._novo_termo(campo, veiculos[int(ordem[inicio[codigo]])].get(campo))
+                    if termo is None:
+                        continue
+                termos.append(((campo, normalizado), termo))
+                rotulo, chaves_termo, trigramas_termo = termo
+                entrada = len(rotulos)
+                rotulos.append(rotulo)
+                tipos.append(prioridade)
+                contagens.append(int(quantidades[codigo]))
+                chaves.extend((chave, entrada) for chave in chaves_termo)
+                trigramas_por_termo.append(trigramas_termo)
+
+        self.rotulos = rotulos
+        self.tipos = np.array(tipos, dtype=np.int8)
+        self.contagens = np.array(contagens, dtype=np.int64)
+
+        chaves.sort()
+        self.chaves = [chave for chave, _ in chaves]
+        self.entradas = np.array([entrada for _, entrada in chaves], dtype=np.int32)
+
+        # Índice invertido de trigramas em CSR: entradas agrupadas por trigrama
+        tamanhos = np.array([len(t) for t in trigramas_por_termo], dtype=np.int64)
+        todos = np.concatenate(trigramas_por_termo) if trigramas_por_termo else np.zeros(0, dtype=np.int32)
+
+        # Tabela refeita só com os trigramas dos termos atuais (ids renumerados de 0 em diante)
+        usados, todos = np.unique(todos, return_inverse=True)
+        todos = todos.astype(np.int32).ravel()
+        nomes = [""] * len(self._trigramas)
+        for trigrama, posicao in self._trigramas.items():
+            nomes[posicao] = trigrama
+        self._trigramas = {nomes[posicao]: novo for novo, posicao in enumerate(usados.tolist())}
+        for (chave_termo, (rotulo, chaves_termo, _)), ids in zip(termos, np.split(todos, np.cumsum(tamanhos)[:-1])):
+            self._por_termo[chave_termo] = (rotulo, chaves_termo, ids)
+
+        donos = np.repeat(np.arange(len(rotulos), dtype=np.int32), tamanhos)
+        ordem = np.argsort(todos, kind="stable")
+        self.postagens = donos[ordem]
+        self.inicio_trigrama = np.searchsorted(todos[ordem], np.arange(len(self._trigramas) + 1))
+
+        # Melhores sugestões dos prefixos curtos
+        self.topo: Dict[str, np.ndarray] = {}
+        for tamanho in range(1, SUGGEST_PREFIXO_CACHE + 1):
+            inicio_grupo = 0
+            while inicio_grupo < len(self.chaves):
+                prefixo = self.chaves[inicio_grupo][:tamanho]
+                if len(prefixo) < tamanho:
+                    # Chave mais curta que o prefixo: as que começam com ela vêm logo depois
+                    inicio_grupo += 1
+                    continue
+                fim_grupo = bisect_left(self.chaves, prefixo + "\x7f", inicio_grupo)
+                self.topo[prefixo] = self._ordenar(self.entradas[inicio_grupo:fim_grupo])[:SUGGEST_MAX_LIMITE]
+                inicio_grupo = fim_grupo
+
+    def _novo_termo(self, campo: str, original) -> Optional[Tuple[str, List[str], np.ndarray]]:
+        rotulo = str(original or "").strip()
+        partes = palavras(rotulo)
+        if not partes:
+            return None
+        inicios = range(min(len(partes), PALAVRAS_TITULO)) if campo == "titulo" else range(len(partes))
+        chaves = list(dict.fromkeys("".join(partes[i:]) for i in inicios))
+        ids = [self._trigramas.setdefault(trigrama, len(self._trigramas)) for trigrama in trigramas(chaves[0])]
+        return rotulo, chaves, np.array(ids, dtype=np.int32)
+
+    def _ordenar(self, entradas: np.ndarray) -> np.ndarray:
+        """Sem repetição; mais veículos primeiro, depois marca > modelo > título"""
+        entradas = np.unique(entradas)
+        return entradas[np.lexsort((entradas, self.tipos[entradas], -self.contagens[entradas]))]
+
+    def por_prefixo(self, chave: str) -> np.ndarray:
+        if len(chave) <= SUGGEST_PREFIXO_CACHE:
+            return self.topo.get(chave, np.zeros(0, dtype=np.int32))
+        inicio = bisect_left(self.chaves, chave)
+        fim = bisect_left(self.chaves, chave + "\x7f", inicio)
+        return self._ordenar(self.entradas[inicio:fim])
+
+    def por_trigramas(self, chave: str) -> np.ndarray:
+        """Termos com pelo menos SUGGEST_SIMILARIDADE_MIN dos trigramas da chave, mais parecidos primeiro"""
+        da_query = trigramas(chave)
+        ids = [self._trigramas[t] for t in da_query if t in self._trigramas]
+        if not ids:
+            return np.zeros(0, dtype=np.int32)
+        postagens = np.concatenate([self.postagens[self.inicio_trigrama[i]:self.inicio_trigrama[i + 1]] for i in ids])
+        acertos = np.bincount(postagens, minlength=len(self.rotulos))
+        entradas = np.flatnonzero(acertos >= SUGGEST_SIMILARIDADE_MIN * len(da_query))
+        return entradas[np.lexsort((entradas, self.tipos[entradas], -self.contagens[entradas], -acertos[entradas]))]
+
+    def sugerir(self, texto: str, limite: int = SUGGEST_MAX) -> List[Dict[str, Any]]:
+        chave = chave_de(texto)
+        if not chave:
+            return []
+        candidatas = [self.por_prefixo(chave)]
+        if len(candidatas[0]) < limite and len(chave) >= 3:
+            candidatas.append(self.por_trigramas(chave))
+
+        sugestoes, vistos = [], set()
+        for entradas in candidatas:
+            for entrada in entradas.tolist():
+                rotulo = self.rotulos[entrada]
+                if rotulo.lower() in vistos:
+                    continue
+                vistos.add(rotulo.lower())
+                sugestoes.append({"texto": rotulo, "tipo": TIPOS[self.tipos[entrada]], "total": int(self.contagens[entrada])})
+                if len(sugestoes) == limite:
+                    return sugestoes
+        return sugestoes
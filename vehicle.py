@@ -0,0 +1,27 @@
+from typing import Any, Dict, NoReturn
+
+
+class Veiculo(dict):
+    """Registro de veículo somente leitura.
+
+    Continua sendo um dict (serializa igual para JSON e para o snapshot), mas
+    recusa qualquer alteração: o mesmo objeto é compartilhado por todas as
+    buscas simultâneas e entre snapshots. Valores internos (fotos) também são
+    compartilhados e não devem ser alterados.
+    """
+
+    __slots__ = ()
+
+    def _somente_leitura(self, *args, **kwargs) -> NoReturn:
+        raise TypeError("Veiculo é somente leitura")
+
+    __setitem__ = __delitem__ = _somente_leitura
+    clear = pop = popitem = setdefault = update = _somente_leitura
+    __ior__ = _somente_leitura
+
+    def __reduce__(self):
+        return (Veiculo, (dict(self),))
+
+
+def como_veiculo(dados: Dict[str, Any]) -> Veiculo:
+    return dados if isinstance(dados, Veiculo) else Veiculo(dados)
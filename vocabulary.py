@@ -0,0 +1,198 @@
+import json, os, re
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+from keyword_automaton import TokenTrie
+from search_index import normalizar
+
+# Marcas/modelos curados que o parser sempre reconhece, além dos do estoque
+VOCABULARIO_ALIASES = os.getenv("VOCABULARIO_ALIASES", "database.json")
+
+PADRAO_NAO_PALAVRA = re.compile(r'[^\w]')
+
+# Mapeamento de categorias (mantido do código original)
+MAPEAMENTO_CATEGORIAS = {
+    # Hatch
+    "gol": "Hatch", "uno": "Hatch", "palio": "Hatch", "celta": "Hatch", "ka": "Hatch",
+    "fiesta": "Hatch", "march": "Hatch", "sandero": "Hatch", "onix": "Hatch", "hb20": "Hatch",
+    "i30": "Hatch", "golf": "Hatch", "polo": "Hatch", "fox": "Hatch", "up": "Hatch",
+    "fit": "Hatch", "city": "Hatch", "yaris": "Hatch", "etios": "Hatch", "clio": "Hatch",
+    "corsa": "Hatch", "bravo": "Hatch", "punto": "Hatch", "208": "Hatch", "argo": "Hatch",
+    "mobi": "Hatch", "c3": "Hatch", "picanto": "Hatch", "astra hatch": "Hatch", "stilo": "Hatch",
+    "focus hatch": "Hatch", "206": "Hatch", "c4 vtr": "Hatch", "kwid": "Hatch", "soul": "Hatch",
+    "agile": "Hatch", "sonic hatch": "Hatch", "fusca": "Hatch",
+
+    # Sedan
+    "civic": "Sedan", "corolla": "Sedan", "sentra": "Sedan", "versa": "Sedan", "jetta": "Sedan",
+    "prisma": "Sedan", "voyage": "Sedan", "siena": "Sedan", "grand siena": "Sedan", "cruze": "Sedan",
+    "cobalt": "Sedan", "logan": "Sedan", "fluence": "Sedan", "cerato": "Sedan", "elantra": "Sedan",
+    "virtus": "Sedan", "accord": "Sedan", "altima": "Sedan", "fusion": "Sedan", "mazda3": "Sedan",
+    "mazda6": "Sedan", "passat": "Sedan", "city sedan": "Sedan", "astra sedan": "Sedan", "vectra sedan": "Sedan",
+    "classic": "Sedan", "cronos": "Sedan", "linea": "Sedan", "focus sedan": "Sedan", "ka sedan": "Sedan",
+    "408": "Sedan", "c4 pallas": "Sedan", "polo sedan": "Sedan", "bora": "Sedan", "hb20s": "Sedan",
+    "lancer": "Sedan", "camry": "Sedan", "onix plus": "Sedan",
+
+    # SUV
+    "duster": "SUV", "ecosport": "SUV", "hrv": "SUV", "compass": "SUV", "renegade": "SUV",
+    "tracker": "SUV", "kicks": "SUV", "captur": "SUV", "creta": "SUV", "tucson": "SUV",
+    "santa fe": "SUV", "sorento": "SUV", "sportage": "SUV", "outlander": "SUV", "asx": "SUV",
+    "pajero": "SUV", "tr4": "SUV", "aircross": "SUV", "tiguan": "SUV", "t-cross": "SUV",
+    "rav4": "SUV", "cx5": "SUV", "forester": "SUV", "wrv": "SUV", 
+    "cherokee": "SUV", "grand cherokee": "SUV", "xtrail": "SUV", "murano": "SUV", "cx9": "SUV",
+    "edge": "SUV", "trailblazer": "SUV", "pulse": "SUV", "fastback": "SUV", "territory": "SUV",
+    "bronco sport": "SUV", "2008": "SUV", "3008": "SUV", "c4 cactus": "SUV", "taos": "SUV",
+    "cr-v": "SUV", "corolla cross": "SUV", "sw4": "SUV", "pajero sport": "SUV", "commander": "SUV",
+    "xv": "SUV", "xc60": "SUV", "tiggo 5x": "SUV", "haval h6": "SUV", "nivus": "SUV",
+
+    # Caminhonete
+    "hilux": "Caminhonete", "ranger": "Caminhonete", "s10": "Caminhonete", "l200": "Caminhonete", "triton": "Caminhonete",
+    "saveiro": "Utilitário", "strada": "Utilitário", "montana": "Utilitário", "oroch": "Utilitário", 
+    "toro": "Caminhonete", 
+    "frontier": "Caminhonete", "amarok": "Caminhonete", "gladiator": "Caminhonete", "maverick": "Caminhonete", "colorado": "Caminhonete",
+    "dakota": "Caminhonete", "montana (nova)": "Caminhonete", "f-250": "Caminhonete", "courier (pickup)": "Caminhonete", "hoggar": "Caminhonete",
+    "ram 1500": "Caminhonete",
+
+    # Utilitário
+    "kangoo": "Utilitário", "partner": "Utilitário", "doblo": "Utilitário", "fiorino": "Utilitário", "berlingo": "Utilitário",
+    "express": "Utilitário", "combo": "Utilitário", "kombi": "Utilitário", "doblo cargo": "Utilitário", "kangoo express": "Utilitário",
+
+    # Furgão
+    "master": "Furgão", "sprinter": "Furgão", "ducato": "Furgão", "daily": "Furgão", "jumper": "Furgão",
+    "boxer": "Furgão", "trafic": "Furgão", "transit": "Furgão", "vito": "Furgão", "expert (furgão)": "Furgão",
+    "jumpy (furgão)": "Furgão", "scudo (furgão)": "Furgão",
+
+    # Coupe
+    "camaro": "Coupe", "mustang": "Coupe", "tt": "Coupe", "supra": "Coupe", "370z": "Coupe",
+    "rx8": "Coupe", "challenger": "Coupe", "corvette": "Coupe", "veloster": "Coupe", "cerato koup": "Coupe",
+    "clk coupe": "Coupe", "a5 coupe": "Coupe", "gt86": "Coupe", "rcz": "Coupe", "brz": "Coupe",
+
+    # Conversível
+    "z4": "Conversível", "boxster": "Conversível", "miata": "Conversível", "beetle cabriolet": "Conversível", "slk": "Conversível",
+    "911 cabrio": "Conversível", "tt roadster": "Conversível", "a5 cabrio": "Conversível", "mini cabrio": "Conversível", "206 cc": "Conversível",
+    "eos": "Conversível",
+
+    # Minivan / Station Wagon
+    "spin": "Minivan", "livina": "Minivan", "caravan": "Minivan", "touran": "Minivan", "parati": "Station Wagon",
+    "quantum": "Station Wagon", "sharan": "Minivan", "zafira": "Minivan", "picasso": "Minivan", "grand c4": "Minivan",
+    "meriva": "Minivan", "scenic": "Minivan", "xsara picasso": "Minivan", "carnival": "Minivan", "idea": "Minivan",
+    "spacefox": "Station Wagon", "golf variant": "Station Wagon", "palio weekend": "Station Wagon", "astra sw": "Station Wagon", "206 sw": "Station Wagon",
+    "a4 avant": "Station Wagon", "fielder": "Station Wagon",
+
+    # Off-road
+    "wrangler": "Off-road", "troller": "Off-road", "defender": "Off-road", "bronco": "Off-road", "samurai": "Off-road",
+    "jimny": "Off-road", "land cruiser": "Off-road", "grand vitara": "Off-road", "jimny sierra": "Off-road", "bandeirante (ate 2001)": "Off-road"
+}
+
+# Marcas que o parser sempre reconhece
+MARCAS_CONHECIDAS = [
+    "toyota", "honda", "ford", "chevrolet", "volkswagen", "fiat", "nissan", "hyundai", 
+    "jeep", "renault", "peugeot", "citroën", "mitsubishi", "kia", "mazda", "subaru",
+    "suzuki", "audi", "bmw", "mercedes", "volvo", "land rover", "jaguar", "porsche",
+    "ferrari", "lamborghini", "bentley", "rolls royce", "maserati", "bugatti",
+    "tesla", "lexus", "infiniti", "acura", "cadillac", "lincoln", "buick", "gmc",
+    "dodge", "chrysler", "ram", "isuzu", "daihatsu", "great wall", "haval", "byd",
+    "chery", "geely", "mg", "jac", "lifan", "foton", "iveco", "scania", "volvo",
+    "mercedes-benz", "vw"
+]
+
+
+def tokenizar(texto: str) -> List[str]:
+    """Palavras sem pontuação (mesma limpeza usada na query e nas marcas/modelos)"""
+    return [PADRAO_NAO_PALAVRA.sub('', palavra) for palavra in texto.lower().split()]
+
+
+def carregar_aliases(caminho: str = VOCABULARIO_ALIASES) -> Tuple[List[str], List[str]]:
+    """(marcas, modelos) do database.json; arquivo ausente ou inválido não impede o start"""
+    if not caminho or not os.path.exists(caminho):
+        return [], []
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[AVISO] Falha ao ler {caminho}: {e}")
+        return [], []
+    return [str(m) for m in data.get("marcas", [])], [str(m) for m in data.get("modelos", [])]
+
+
+# Lidos uma vez na importação; cada vocabulário montado reaproveita
+ALIASES = carregar_aliases()
+
+
+def modelo_reconhecivel(tokens: List[str]) -> bool:
+    """Modelos do estoque que só casariam com números soltos da query ("ate 500 mil") ficam de fora"""
+    tokens = [token for token in tokens if token]
+    return bool(tokens) and not all(token.isdigit() for token in tokens) and len("".join(tokens)) >= 2
+
+
+class Vocabulario:
+    """Marcas e modelos reconhecidos pelo parser, compilados em tries.
+
+    A ordem de registro é a prioridade: para a mesma sequência de palavras
+    vale o primeiro valor (listas fixas, depois aliases, depois o estoque).
+    """
+
+    def __init__(self, marcas: Iterable[str], modelos: Iterable[str], categoria_por_modelo: Dict[str, str],
+                 versao: int = 0):
+        marcas = [marca.lower() for marca in marcas if marca and marca.strip()]
+        modelos = [modelo.lower() for modelo in modelos if modelo and modelo.strip()]
+        # Versão do estoque de onde saiu (0 = só listas fixas e aliases)
+        self.versao = versao
+        # Nomes distintos na ordem de prioridade (padrões do parser spaCy)
+        self.nomes_marcas = list(dict.fromkeys(marcas))
+        self.nomes_modelos = list(dict.fromkeys(modelos))
+        self.marcas = TokenTrie((tokenizar(marca), marca) for marca in marcas)
+        self.modelos = TokenTrie((tokenizar(modelo), modelo) for modelo in modelos)
+        self.categoria_por_modelo = categoria_por_modelo
+        self.total_marcas = len(self.nomes_marcas)
+        self.total_modelos = len(self.nomes_modelos)
+
+
+def termos_do_estoque(snapshot) -> Tuple[List[str], List[str], Dict[str, str]]:
+    """Marcas e modelos distintos do snapshot e a categoria canônica mais comum de cada modelo"""
+    facetas = snapshot.facetas
+    marcas = [rotulo for rotulo in facetas.rotulos["marca"] if rotulo]
+    nomes_marcas = {normalizar(marca) for marca in marcas}
+    modelos = [
+        rotulo for rotulo in facetas.rotulos["modelo"]
+        if rotulo and modelo_reconhecivel(tokenizar(rotulo)) and normalizar(rotulo) not in nomes_marcas
+    ]
+
+    categoria_por_modelo: Dict[str, str] = {}
+    canonicos = snapshot.indice.canonicos["categoria"]
+    codigos_modelo = facetas.codigos["modelo"]
+    codigos_categoria = snapshot.indice.codigos_atributo["categoria"]
+    validos = (codigos_modelo >= 0) & (codigos_categoria >= 0)
+    if canonicos and validos.any():
+        pares = np.bincount(
+            codigos_modelo[validos].astype(np.int64) * len(canonicos) + codigos_categoria[validos],
+            minlength=len(facetas.rotulos["modelo"]) * len(canonicos),
+        ).reshape(-1, len(canonicos))
+        for codigo in np.flatnonzero(pares.sum(axis=1)):
+            categoria_por_modelo[normalizar(facetas.rotulos["modelo"][codigo])] = canonicos[int(pares[codigo].argmax())]
+    return marcas, modelos, categoria_por_modelo
+
+
+def montar_vocabulario(marcas_base: Iterable[str], categorias_base: Dict[str, str],
+                       snapshot=None, aliases: Optional[Tuple[List[str], List[str]]] = None) -> Vocabulario:
+    """Listas fixas + aliases do database.json + (opcional) o que está no estoque"""
+    marcas_alias, modelos_alias = aliases if aliases is not None else ALIASES
+    marcas = list(marcas_base) + marcas_alias
+    modelos = list(categorias_base) + modelos_alias
+    categoria_por_modelo: Dict[str, str] = {}
+    versao = 0
+    if snapshot is not None and snapshot.versao:
+        marcas_estoque, modelos_estoque, categoria_por_modelo = termos_do_estoque(snapshot)
+        marcas += marcas_estoque
+        modelos += modelos_estoque
+        versao = snapshot.versao
+    return Vocabulario(marcas, modelos, categoria_por_modelo, versao)
+
+
+# Só listas fixas e aliases (queries sem snapshot e estoque vazio)
+VOCABULARIO_BASE = montar_vocabulario(MARCAS_CONHECIDAS, MAPEAMENTO_CATEGORIAS)
+
+
+def vocabulario_do_snapshot(snapshot) -> Vocabulario:
+    """Listas fixas + aliases + marcas e modelos do estoque do snapshot"""
+    if not snapshot.versao:
+        return VOCABULARIO_BASE
+    return montar_vocabulario(MARCAS_CONHECIDAS, MAPEAMENTO_CATEGORIAS, snapshot)
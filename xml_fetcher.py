@@ -1,55 +1,454 @@
-import requests, xmltodict, json, os
+import requests, asyncio, hashlib, json, os, queue, re, time
+import httpx
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+from inventory import estoque
+from search_index import normalizar
+from vehicle import Veiculo
+from metrics import ETAPAS_INGESTAO, INGESTOES, INGESTOES_FEED, etapa
 
 XML_URL = os.getenv("XML_URL")
-JSON_FILE = "data.json"
+# Vários feeds num estoque só, separados por vírgula: "loja1=https://...,https://...".
+# Cada veículo recebe a origem (o nome, ou o host da URL sem nome).
+XML_URLS = os.getenv("XML_URLS")
+JSON_FILE = "data.json"  # formato antigo, só lido na migração
+SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", "data.snap")
+
+# Tamanho dos blocos lidos do corpo HTTP
+CHUNK_SIZE = 64 * 1024
+
+# Timeouts (segundos) e novas tentativas com espera exponencial
+FEED_CONNECT_TIMEOUT = float(os.getenv("FEED_CONNECT_TIMEOUT", "5"))
+FEED_READ_TIMEOUT = float(os.getenv("FEED_READ_TIMEOUT", "60"))
+FEED_TENTATIVAS = int(os.getenv("FEED_TENTATIVAS", "3"))
+FEED_BACKOFF = float(os.getenv("FEED_BACKOFF", "2"))
+
+# Prazo total de cada feed no ciclo (conexão, novas tentativas e download):
+# o timeout de leitura vale por leitura do socket, então um feed que manda
+# poucos bytes de cada vez só para pelo prazo
+FEED_PRAZO = float(os.getenv("FEED_PRAZO", "120"))
+
+# Com vários feeds: conexões do pool, conexões simultâneas por host e threads de parse
+FEED_CONEXOES = int(os.getenv("FEED_CONEXOES", "20"))
+FEED_CONEXOES_POR_HOST = int(os.getenv("FEED_CONEXOES_POR_HOST", "2"))
+FEED_PARSE_WORKERS = int(os.getenv("FEED_PARSE_WORKERS", "4"))
+# Blocos baixados esperando o parse de cada feed (o download espera quando a fila enche)
+FEED_BLOCOS_PENDENTES = int(os.getenv("FEED_BLOCOS_PENDENTES", "16"))
+
+# Estado da última leitura do feed: validadores HTTP e, por ID do anúncio,
+# (hash do conteúdo, veículo convertido) para reaproveitar o que não mudou
+estado_feed: Dict[str, Any] = {
+    "etag": None,
+    "last_modified": None,
+    "anuncios": {},
+}
+
+# O mesmo estado por origem, no modo com vários feeds (mais os veículos da
+# última leitura boa, usados enquanto o feed estiver fora)
+estados_feeds: Dict[str, Dict[str, Any]] = {}
+
+def abrir_feed(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+               prazo: Optional[float] = None) -> requests.Response:
+    """GET condicional do feed (a resposta pode ser 304 Not Modified).
+
+    Falhas de conexão, timeouts e erros 5xx são tentados de novo até
+    FEED_TENTATIVAS vezes, esperando FEED_BACKOFF * 2^n segundos entre elas,
+    desde que a espera não passe do `prazo` (time.monotonic()).
+    """
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    for tentativa in range(FEED_TENTATIVAS):
+        try:
+            response = requests.get(
+                url, stream=True, headers=headers,
+                timeout=(FEED_CONNECT_TIMEOUT, FEED_READ_TIMEOUT)
+            )
+            if response.status_code != 304:
+                response.raise_for_status()
+            return response
+        except requests.RequestException as e:
+            resposta = getattr(e, "response", None)
+            temporario = resposta is None or resposta.status_code >= 500
+            espera = FEED_BACKOFF * 2 ** tentativa
+            if not temporario or tentativa == FEED_TENTATIVAS - 1 or (prazo and time.monotonic() + espera > prazo):
+                raise
+            print(f"[AVISO] Falha ao baixar o feed ({e}), nova tentativa em {espera:.1f}s")
+            time.sleep(espera)
+
+def baixar_feed(response: requests.Response, prazo: Optional[float] = None) -> Iterator[bytes]:
+    """Corpo do feed em blocos, sem carregar a resposta inteira na memória.
+
+    Com `prazo` (time.monotonic()), cada leitura é uma chamada só ao socket
+    (read1) e o download é interrompido com TimeoutError quando o prazo passa.
+    """
+    with response:
+        if prazo is None or not hasattr(response.raw, "read1"):
+            chunks = response.iter_content(chunk_size=CHUNK_SIZE)
+        else:
+            chunks = iter(lambda: response.raw.read1(CHUNK_SIZE, decode_content=True), b"")
+        for chunk in chunks:
+            if prazo is not None and time.monotonic() > prazo:
+                raise TimeoutError(f"prazo de {FEED_PRAZO:g}s esgotado")
+            if chunk:
+                yield chunk
+
+def iterar_anuncios(chunks: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    """Parser incremental do XML: devolve um ADS/AD por vez já como dict.
+
+    Cada AD vira {TAG: texto} (no mesmo formato que o xmltodict gerava, com
+    IMAGES -> {"IMAGE_URL": [...]}) e é descartado da árvore logo em seguida.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    abertos = []
+    for chunk in chunks:
+        parser.feed(chunk)
+        for evento, elemento in parser.read_events():
+            if evento == "start":
+                abertos.append(elemento)
+                continue
+            abertos.pop()
+            if elemento.tag != "AD":
+                continue
+
+            anuncio: Dict[str, Any] = {}
+            for campo in elemento:
+                if campo.tag == "IMAGES":
+                    anuncio["IMAGES"] = {
+                        "IMAGE_URL": [img.text.strip() for img in campo if img.tag == "IMAGE_URL" and img.text]
+                    }
+                else:
+                    texto = (campo.text or "").strip()
+                    anuncio[campo.tag] = texto or None
+            yield anuncio
+
+            # Libera o AD já processado e o tira do elemento pai (ADS)
+            elemento.clear()
+            if abertos:
+                abertos[-1].remove(elemento)
+    parser.close()
+
+def hash_anuncio(anuncio: Dict[str, Any]) -> str:
+    conteudo = json.dumps(anuncio, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.blake2b(conteudo, digest_size=16).hexdigest()
+
+def converter_veiculo(v: Dict[str, Any], origem: Optional[str] = None) -> Veiculo:
+    dados = {
+        "id": v.get("ID"),
+        "titulo": v.get("TITLE"),
+        "marca": v.get("MAKE"),
+        "modelo": v.get("MODEL"),
+        "ano": v.get("YEAR"),
+        "ano_fabricacao": v.get("FABRIC_YEAR"),
+        "km": v.get("MILEAGE"),
+        "cor": v.get("COLOR"),
+        "combustivel": v.get("FUEL"),
+        "cambio": v.get("GEAR"),
+        "motor": v.get("MOTOR"),
+        "portas": v.get("DOORS"),
+        "categoria": v.get("BODY_TYPE"),
+        "preco": float(v.get("PRICE", "0").replace(",", "").strip()),
+        "opcionais": v.get("ACCESSORIES"),
+        "fotos": {
+            "url_fotos": v.get("IMAGES", {}).get("IMAGE_URL", [])
+        }
+    }
+    if origem is not None:
+        dados["origem"] = origem
+    return Veiculo(dados)
+
+def converter_anuncios(anuncios_xml: Iterable[Dict[str, Any]], anteriores: Dict[str, Tuple[str, Dict[str, Any]]],
+                       origem: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Tuple[str, Dict[str, Any]]], int, int]:
+    """(veículos, (hash, veículo) por ID, adicionados, alterados).
+
+    Anúncios com o mesmo conteúdo da leitura anterior reaproveitam o veículo já convertido.
+    """
+    anuncios: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+    parsed_vehicles = []
+    adicionados = alterados = 0
+    for v in anuncios_xml:
+        conteudo = hash_anuncio(v)
+        anterior = anteriores.get(v.get("ID"))
+        if anterior is not None and anterior[0] == conteudo:
+            # Mesmo objeto do snapshot atual: o índice reaproveita a linha
+            parsed = anterior[1]
+        else:
+            try:
+                parsed = converter_veiculo(v, origem)
+            except Exception as e:
+                print(f"[ERRO ao converter veículo ID {v.get('ID')}] {e}")
+                continue
+            if anterior is None:
+                adicionados += 1
+            else:
+                alterados += 1
+        anuncios[v.get("ID")] = (conteudo, parsed)
+        parsed_vehicles.append(parsed)
+    return parsed_vehicles, anuncios, adicionados, alterados
 
 def fetch_and_convert_xml():
+    with etapa("total", ETAPAS_INGESTAO):
+        if XML_URLS:
+            return _atualizar_feeds(listar_feeds(XML_URLS))
+        return _atualizar_feed()
+
+def _atualizar_feed():
     try:
         if not XML_URL:
             raise ValueError("Variável XML_URL não definida")
-        response = requests.get(XML_URL)
-        data_dict = xmltodict.parse(response.content)
 
-        parsed_vehicles = []
+        prazo = time.monotonic() + FEED_PRAZO
+        response = abrir_feed(XML_URL, estado_feed["etag"], estado_feed["last_modified"], prazo)
+        if response.status_code == 304:
+            response.close()
+            INGESTOES.incrementar("nao_modificado")
+            print("[OK] Feed sem alterações (304).")
+            return {}
 
-        for v in data_dict["ADS"]["AD"]:
-            try:
-                parsed = {
-    "id": v.get("ID"),
-    "titulo": v.get("TITLE"),
-    "marca": v.get("MAKE"),
-    "modelo": v.get("MODEL"),
-    "ano": v.get("YEAR"),
-    "ano_fabricacao": v.get("FABRIC_YEAR"),
-    "km": v.get("MILEAGE"),
-    "cor": v.get("COLOR"),
-    "combustivel": v.get("FUEL"),
-    "cambio": v.get("GEAR"),
-    "motor": v.get("MOTOR"),
-    "portas": v.get("DOORS"),
-    "categoria": v.get("BODY_TYPE"),
-    "preco": float(v.get("PRICE", "0").replace(",", "").strip()),
-    "opcionais": v.get("ACCESSORIES"),
-    "fotos": {
-        "url_fotos": v.get("IMAGES", {}).get("IMAGE_URL", [])
+        anteriores: Dict[str, Tuple[str, Dict[str, Any]]] = estado_feed["anuncios"]
+        with etapa("download_parse", ETAPAS_INGESTAO):
+            parsed_vehicles, anuncios, adicionados, alterados = converter_anuncios(
+                iterar_anuncios(baixar_feed(response, prazo)), anteriores
+            )
+
+        removidos = len(set(anteriores) - set(anuncios))
+        resumo = f"+{adicionados} ~{alterados} -{removidos} de {len(parsed_vehicles)}"
+        resultado = publicar_veiculos(parsed_vehicles, resumo)
+
+        # Validadores só depois de publicar e gravar: se algo falhou, o próximo
+        # ciclo não recebe 304 e baixa o feed de novo
+        estado_feed["etag"] = response.headers.get("ETag")
+        estado_feed["last_modified"] = response.headers.get("Last-Modified")
+        estado_feed["anuncios"] = anuncios
+        return resultado
+
+    except Exception as e:
+        INGESTOES.incrementar("erro")
+        print(f"[ERRO] Falha ao converter XML: {e}")
+        return {}
+
+def publicar_veiculos(parsed_vehicles: List[Dict[str, Any]], resumo: str) -> Dict[str, Any]:
+    """Publica e grava o novo estoque, a não ser que nada tenha mudado"""
+    # Nada mudou (nem a ordem): mantém o snapshot e o arquivo atuais
+    atuais = estoque.atual().veiculos
+    if len(atuais) == len(parsed_vehicles) and all(a is b for a, b in zip(atuais, parsed_vehicles)):
+        INGESTOES.incrementar("sem_alteracao")
+        print("[OK] Feed baixado, nenhum veículo alterado.")
+        return {}
+
+    # Troca o snapshot em memória só depois que o novo estoque está completo
+    updated_at = datetime.now().isoformat()
+    with etapa("indice", ETAPAS_INGESTAO):
+        snapshot = estoque.publicar(parsed_vehicles, updated_at)
+
+    # Arquivo binário com os índices prontos (gravação atômica)
+    with etapa("gravacao", ETAPAS_INGESTAO):
+        estoque.salvar_snapshot(SNAPSHOT_FILE, snapshot)
+    # Autocomplete pronto antes da primeira sugestão (reaproveita os termos do anterior)
+    with etapa("sugestoes", ETAPAS_INGESTAO):
+        snapshot.sugestoes
+    # Vocabulário do parser pronto antes da primeira busca
+    with etapa("vocabulario", ETAPAS_INGESTAO):
+        snapshot.vocabulario
+    INGESTOES.incrementar("atualizado")
+
+    print(f"[OK] Dados atualizados com sucesso. ({resumo})")
+    return {
+        "veiculos": parsed_vehicles,
+        "_updated_at": updated_at
     }
-}
-                parsed_vehicles.append(parsed)
-            except Exception as e:
-                print(f"[ERRO ao converter veículo ID {v.get('ID')}] {e}")
 
-        data_dict = {
-            "veiculos": parsed_vehicles,
-            "_updated_at": datetime.now().isoformat()
-        }
+def listar_feeds(valor: Optional[str]) -> List[Tuple[str, str]]:
+    """[(origem, url)] do XML_URLS; origens repetidas ganham sufixo -2, -3, ..."""
+    feeds = []
+    nomes = set()
+    for item in re.split(r"[,\s]+", valor or ""):
+        if not item:
+            continue
+        nome, separador, url = item.partition("=")
+        if not separador or "://" in nome:
+            # Sem nome (o "=" é da query string da URL): a origem é o host
+            nome, url = urlsplit(item).hostname or item, item
+        base, sufixo = nome, 2
+        while nome in nomes:
+            nome, sufixo = f"{base}-{sufixo}", sufixo + 1
+        nomes.add(nome)
+        feeds.append((nome, url))
+    return feeds
+
+def _entregar(blocos: queue.Queue, bloco: Optional[bytes], parse) -> bool:
+    """Põe o bloco na fila cheia assim que o parser abrir espaço; False se o parser já terminou"""
+    while not parse.done():
+        try:
+            blocos.put(bloco, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _encerrar_parse(blocos: queue.Queue):
+    """Download interrompido: descarta os blocos pendentes e avisa o parser que acabou"""
+    while True:
+        try:
+            blocos.put_nowait(None)
+            return
+        except queue.Full:
+            try:
+                blocos.get_nowait()
+            except queue.Empty:
+                pass
+
+async def converter_resposta(response: httpx.Response, estado: Dict[str, Any], origem: str,
+                             executor: ThreadPoolExecutor):
+    """Parse e conversão numa thread, consumindo os blocos à medida que chegam.
+
+    A fila entre o download e o parse tem no máximo FEED_BLOCOS_PENDENTES
+    blocos, então a memória continua limitada quando o parse fica para trás;
+    se o parse falha, o download para.
+    """
+    loop = asyncio.get_running_loop()
+    blocos: queue.Queue = queue.Queue(maxsize=FEED_BLOCOS_PENDENTES)
+    parse = executor.submit(
+        lambda: converter_anuncios(iterar_anuncios(iter(blocos.get, None)), estado["anuncios"], origem)
+    )
+
+    async def enfileirar(bloco: Optional[bytes]) -> bool:
+        try:
+            blocos.put_nowait(bloco)
+            return True
+        except queue.Full:
+            return await loop.run_in_executor(None, _entregar, blocos, bloco, parse)
+
+    try:
+        async for bloco in response.aiter_bytes(CHUNK_SIZE):
+            if parse.done() or not await enfileirar(bloco):
+                break
+        else:
+            await enfileirar(None)
+    except BaseException:
+        _encerrar_parse(blocos)
+        raise
+    # Com break, o parse já terminou (o erro dele é o resultado)
+    return await asyncio.wrap_future(parse)
+
+async def baixar_feed_async(cliente: httpx.AsyncClient, limite_host: asyncio.Semaphore, url: str,
+                            estado: Dict[str, Any], origem: str, executor: ThreadPoolExecutor):
+    """Leitura de um feed no modo com vários feeds.
+
+    None com 304; senão (veículos, anúncios, adicionados, alterados, headers).
+    Mesmas novas tentativas de `abrir_feed`, sem segurar a vaga do host na espera.
+    """
+    headers = {}
+    if estado["etag"]:
+        headers["If-None-Match"] = estado["etag"]
+    if estado["last_modified"]:
+        headers["If-Modified-Since"] = estado["last_modified"]
+
+    for tentativa in range(FEED_TENTATIVAS):
+        try:
+            async with limite_host:
+                async with cliente.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304:
+                        return None
+                    response.raise_for_status()
+                    return await converter_resposta(response, estado, origem, executor) + (response.headers,)
+        except httpx.HTTPError as e:
+            temporario = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code >= 500
+            if not temporario or tentativa == FEED_TENTATIVAS - 1:
+                raise
+            espera = FEED_BACKOFF * 2 ** tentativa
+            print(f"[AVISO] Falha ao baixar o feed {origem} ({e}), nova tentativa em {espera:.1f}s")
+            await asyncio.sleep(espera)
+
+async def baixar_feeds(feeds: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """Todos os feeds ao mesmo tempo num cliente HTTP só; por origem, o resultado ou a exceção.
+
+    Cada feed tem FEED_PRAZO segundos: um feed lento ou fora do ar vira
+    exceção sem atrasar os outros.
+    """
+    limites = httpx.Limits(max_connections=FEED_CONEXOES, max_keepalive_connections=FEED_CONEXOES)
+    timeout = httpx.Timeout(FEED_READ_TIMEOUT, connect=FEED_CONNECT_TIMEOUT)
+    por_host: Dict[str, asyncio.Semaphore] = {}
+
+    with ThreadPoolExecutor(FEED_PARSE_WORKERS, thread_name_prefix="feed") as executor:
+        async with httpx.AsyncClient(limits=limites, timeout=timeout, follow_redirects=True) as cliente:
+            async def ler(origem: str, url: str):
+                limite_host = por_host.setdefault(urlsplit(url).netloc, asyncio.Semaphore(FEED_CONEXOES_POR_HOST))
+                return await asyncio.wait_for(
+                    baixar_feed_async(cliente, limite_host, url, estados_feeds[origem], origem, executor), FEED_PRAZO
+                )
+
+            resultados = await asyncio.gather(*(ler(origem, url) for origem, url in feeds), return_exceptions=True)
+    return {origem: resultado for (origem, _), resultado in zip(feeds, resultados)}
+
+def veiculos_da_origem(origem: str) -> List[Dict[str, Any]]:
+    """Veículos da origem no snapshot atual (feed que falhou antes de qualquer leitura boa neste processo)"""
+    snapshot = estoque.atual()
+    if not snapshot.versao or "origem" not in snapshot.indice.codigos:
+        return []
+    return [snapshot.veiculos[i] for i in snapshot.indice.mascara("origem", normalizar(origem)).nonzero()[0].tolist()]
+
+def _atualizar_feeds(feeds: List[Tuple[str, str]]):
+    """Modo com vários feeds: lê todos em paralelo e publica um estoque só.
+
+    Um feed com erro ou fora do prazo mantém os veículos da última leitura boa.
+    """
+    try:
+        if not feeds:
+            raise ValueError("Nenhuma URL válida em XML_URLS")
+        for origem, _ in feeds:
+            estados_feeds.setdefault(origem, {"etag": None, "last_modified": None, "anuncios": {}, "veiculos": None})
+
+        with etapa("download_parse", ETAPAS_INGESTAO):
+            resultados = asyncio.run(baixar_feeds(feeds))
+
+        parsed_vehicles = []
+        atualizados: Dict[str, Dict[str, Any]] = {}
+        adicionados = alterados = removidos = falhas = 0
+        for origem, _ in feeds:
+            estado = estados_feeds[origem]
+            resultado = resultados[origem]
+            if isinstance(resultado, BaseException):
+                falhas += 1
+                INGESTOES_FEED.incrementar(origem, "erro")
+                if isinstance(resultado, asyncio.TimeoutError):
+                    motivo = f"prazo de {FEED_PRAZO:g}s esgotado"
+                else:
+                    motivo = (str(resultado).splitlines() or [type(resultado).__name__])[0]
+                print(f"[ERRO] Feed {origem}: {motivo}; mantendo os veículos da última leitura.")
+            elif resultado is None:
+                INGESTOES_FEED.incrementar(origem, "nao_modificado")
+            else:
+                veiculos, anuncios, novos, mudados, headers = resultado
+                removidos += len(set(estado["anuncios"]) - set(anuncios))
+                adicionados, alterados = adicionados + novos, alterados + mudados
+                atualizados[origem] = dict(etag=headers.get("ETag"), last_modified=headers.get("Last-Modified"),
+                                           anuncios=anuncios, veiculos=veiculos)
+                INGESTOES_FEED.incrementar(origem, "atualizado")
+                parsed_vehicles.extend(veiculos)
+                continue
+            if estado["veiculos"] is None:
+                estado["veiculos"] = veiculos_da_origem(origem)
+            parsed_vehicles.extend(estado["veiculos"])
 
-        with open(JSON_FILE, "w", encoding="utf-8") as f:
-            json.dump(data_dict, f, ensure_ascii=False, indent=2)
+        if falhas == len(feeds):
+            raise RuntimeError("nenhum feed pôde ser lido")
+        resumo = (f"+{adicionados} ~{alterados} -{removidos} de {len(parsed_vehicles)}, "
+                  f"{len(feeds) - falhas}/{len(feeds)} feeds")
+        resultado = publicar_veiculos(parsed_vehicles, resumo)
 
-        print("[OK] Dados atualizados com sucesso.")
-        return data_dict
+        # Como em `_atualizar_feed`: validadores só depois de publicar e gravar
+        for origem, atualizacao in atualizados.items():
+            estados_feeds[origem].update(atualizacao)
+        return resultado
 
     except Exception as e:
+        INGESTOES.incrementar("erro")
         print(f"[ERRO] Falha ao converter XML: {e}")
         return {}